@@ -0,0 +1,60 @@
+import asyncio
+from threading import Thread, Lock
+
+class AsyncWorker:
+    """A single long-lived asyncio event loop running on a background thread.
+
+    All provider requests are scheduled onto this loop, so HTTP clients can keep
+    their connections alive between turns and no event loops are leaked.
+    """
+    loops_created = 0
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        AsyncWorker.loops_created += 1
+        self.lock = Lock()
+        self.futures = set()
+        self.submitted_count = 0
+        self.thread = Thread(target=self.run, name="async-worker", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the worker loop. Returns a concurrent.futures.Future."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        with self.lock:
+            self.futures.add(future)
+            self.submitted_count += 1
+        future.add_done_callback(self.on_future_done)
+        return future
+
+    def on_future_done(self, future):
+        with self.lock:
+            self.futures.discard(future)
+
+    def cancel(self, future):
+        # Cancelling the concurrent future cancels the underlying asyncio task
+        if future is not None:
+            future.cancel()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "loops_created": AsyncWorker.loops_created,
+                "active_tasks": len(self.futures),
+                "submitted_tasks": self.submitted_count,
+                "running": self.loop.is_running(),
+            }
+
+    def shutdown(self, timeout=2):
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.cancel()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        if not self.loop.is_running():
+            self.loop.close()
@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+import json
+import os
+import random
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from constants import AUTOSAVE_INTERVAL_MS, AUTOSAVE_MAX_SNAPSHOTS, AUTOSAVE_MAX_AGE_DAYS, AUTOSAVE_MAX_BYTES
+
+SNAPSHOT_SUFFIX = ".json.gz"
+ACTIVE_SUFFIX = ".active"
+
+def list_snapshots(backup_dir):
+    """Return the snapshot and legacy backup files in `backup_dir`, newest first (names start with a timestamp)."""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [name for name in os.listdir(backup_dir) if name.endswith((SNAPSHOT_SUFFIX, ".json"))]
+    return sorted(names, reverse=True)
+
+def process_alive(pid):
+    """True if a process with this PID is running."""
+    if os.name == 'nt':
+        import ctypes
+        # os.kill would terminate the process on Windows, so ask for its exit code instead
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True  # running, as another user
+    except OSError:
+        return False
+    return True
+
+def read_marker_pid(path):
+    """The PID written into a session marker, or None for markers without one."""
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def read_snapshot(path):
+    """Return the {"system_message", "chat_history", "model"} data of a snapshot or legacy backup."""
+    if path.endswith(SNAPSHOT_SUFFIX):
+        with gzip.open(path, "rt", encoding='utf-8') as f:
+            return json.load(f)
+    with open(path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+class Autosave:
+    """Periodically snapshots one window's conversation to `backup_dir`, but only when it changed.
+
+    mark_dirty() is called on every change; every `interval_ms` a dirty
+    conversation is read on the UI thread, then hashed, compressed and written
+    on a background thread. A snapshot whose content hash matches one of this
+    session's earlier snapshots just renames that file instead of writing a copy. After each write the
+    oldest snapshots are pruned so that at most `max_snapshots`, none older
+    than `max_age_days` and at most `max_bytes` in total are kept (the newest
+    always survives). While the window is open it keeps a `<session>.active`
+    marker holding the app's PID; a marker whose process is gone means a
+    session ended without closing, and its latest snapshot can be restored.
+    Markers of other copies of the app that are still running are left alone.
+    """
+    def __init__(self, root, get_chat_data, backup_dir=os.path.join("temp", "backup"), interval_ms=AUTOSAVE_INTERVAL_MS,
+                 max_snapshots=AUTOSAVE_MAX_SNAPSHOTS, max_age_days=AUTOSAVE_MAX_AGE_DAYS, max_bytes=AUTOSAVE_MAX_BYTES):
+        self.root = root
+        self.get_chat_data = get_chat_data
+        self.backup_dir = backup_dir
+        self.interval_ms = interval_ms
+        self.max_snapshots = max_snapshots
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S") + "_" + "".join(random.choices(string.ascii_letters + string.digits, k=6))
+        self.dirty = False
+        self.last_hash = None
+        self.tick_id = None
+        self.snapshots_written = 0
+        self.snapshots_deduplicated = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+
+    def marker_path(self):
+        return os.path.join(self.backup_dir, self.session_id + ACTIVE_SUFFIX)
+
+    def start(self):
+        self.tick_id = self.root.after(self.interval_ms, self.tick)
+
+    def mark_dirty(self, *args):
+        self.dirty = True
+
+    def tick(self):
+        self.tick_id = self.root.after(self.interval_ms, self.tick)
+        if self.dirty:
+            self.dirty = False
+            self.executor.submit(self.save, self.get_chat_data())
+
+    def save(self, chat_data):
+        """Write a snapshot of `chat_data` unless it is empty or unchanged. Returns its path, or None."""
+        if not chat_data["system_message"] and not any(message["content"] for message in chat_data["chat_history"]):
+            return None
+        data = json.dumps(chat_data, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()[:16]
+        if content_hash == self.last_hash:
+            return None
+        if not os.path.exists(self.backup_dir):
+            os.makedirs(self.backup_dir, exist_ok=True)
+        marker = self.marker_path()
+        if not os.path.exists(marker):
+            with open(marker, "w") as f:
+                f.write(str(os.getpid()))
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{self.session_id[-6:]}_{content_hash}{SNAPSHOT_SUFFIX}"
+        path = os.path.join(self.backup_dir, name)
+        # Only this session's own snapshots; another session's, possibly the one a crash left to restore, keeps its name
+        duplicate = next((existing for existing in list_snapshots(self.backup_dir)
+                          if existing.endswith(f"_{self.session_id[-6:]}_{content_hash}{SNAPSHOT_SUFFIX}")), None)
+        if duplicate is not None:
+            # Same content as an older snapshot: move it up to now instead of storing it twice
+            os.replace(os.path.join(self.backup_dir, duplicate), path)
+            self.snapshots_deduplicated += 1
+        else:
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=6))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            self.snapshots_written += 1
+        self.last_hash = content_hash
+        self.prune()
+        return path
+
+    def prune(self):
+        """Delete the oldest snapshots beyond the count, age and size limits."""
+        cutoff = time.time() - self.max_age_days * 86400
+        total_bytes = 0
+        for i, name in enumerate(list_snapshots(self.backup_dir)):
+            path = os.path.join(self.backup_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            total_bytes += stat.st_size
+            if i > 0 and (i >= self.max_snapshots or stat.st_mtime < cutoff or total_bytes > self.max_bytes):
+                os.remove(path)
+
+    def close(self):
+        """Take a final snapshot and remove the session marker, so the next start knows this session closed cleanly."""
+        if self.tick_id is not None:
+            self.root.after_cancel(self.tick_id)
+            self.tick_id = None
+        chat_data = self.get_chat_data()
+        self.executor.shutdown(wait=True)
+        self.save(chat_data)
+        if os.path.exists(self.marker_path()):
+            os.remove(self.marker_path())
+
+    def find_unclosed_session_snapshot(self):
+        """Return the newest snapshot if a previous session ended without closing, and forget those sessions.
+
+        Markers are stale once the process that wrote them is gone; markers from before they held a PID count as stale.
+        """
+        if not os.path.isdir(self.backup_dir):
+            return None
+        markers = []
+        for name in os.listdir(self.backup_dir):
+            if not name.endswith(ACTIVE_SUFFIX) or name == self.session_id + ACTIVE_SUFFIX:
+                continue
+            pid = read_marker_pid(os.path.join(self.backup_dir, name))
+            if pid is None or not process_alive(pid):
+                markers.append(name)
+        if not markers:
+            return None
+        for name in markers:
+            os.remove(os.path.join(self.backup_dir, name))
+        # Snapshot names carry the random part of their session id
+        tags = tuple(f"_{name[:-len(ACTIVE_SUFFIX)][-6:]}_" for name in markers)
+        snapshot = next((name for name in list_snapshots(self.backup_dir) if any(tag in name for tag in tags)), None)
+        return os.path.join(self.backup_dir, snapshot) if snapshot else None
@@ -0,0 +1,338 @@
+"""
+Headless batch completions for Chat Completions GUI
+
+Usage:
+    python src/batch.py <requests.jsonl> <results.jsonl> [options]
+
+Every line of the input file is one chat request:
+
+    {"id": "q1", "model": "gpt-4o", "messages": [{"role": "user", "content": "Hi"}], "temperature": 0.7, "max_tokens": 500}
+
+A saved chat log ({"system_message": ..., "chat_history": [...]}) can be used in
+place of "messages". Lines without an id are named after their line number.
+
+Requests are sent with a bounded number in flight per provider, optionally
+rate limited (requests and tokens per minute), and retried with exponential
+backoff on rate limits, server errors and connection failures. Each result is
+appended to the output file as soon as it finishes. Running the same command
+again skips every request that already has a successful result, so a crashed
+or interrupted run picks up where it stopped.
+
+API keys and custom servers are read from config.ini, the same as the app.
+--base-url adds an OpenAI-compatible server for every model no other provider
+serves, e.g. the mock server in src/mock_server.py.
+"""
+
+import argparse
+import asyncio
+import configparser
+import json
+import os
+import random
+import sys
+import time
+
+from constants import OPENAI_MODELS, ANTHROPIC_MODELS, GOOGLE_MODELS
+from token_bucket import TokenBucket
+from token_counter import token_counter
+from metrics import RequestMetrics, metrics_store
+from providers import ADAPTERS, CustomServerAdapter, ProviderRegistry
+
+# Connection and timeout errors of the OpenAI and Anthropic SDKs don't carry a status code
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "RemoteProtocolError"}
+CHARS_PER_TOKEN = 4  # rough size of a token, for token bucket estimates when the model's tokenizer can't be loaded
+
+def read_requests(path, default_model=None, default_temperature=0.7, default_max_tokens=1000):
+    """Parse the input file into a list of request dicts with id, model, messages, temperature and max_tokens."""
+    requests = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if "messages" in data:
+                messages = data["messages"]
+            else:
+                messages = [{"role": "system", "content": data.get("system_message", "")}]
+                messages += [{"role": message["role"], "content": message["content"]} for message in data.get("chat_history", [])]
+            requests.append({
+                "id": str(data.get("id", f"line-{line_number}")),
+                "model": data.get("model") or default_model,
+                "messages": messages,
+                "temperature": data.get("temperature", default_temperature),
+                "max_tokens": data.get("max_tokens", default_max_tokens),
+            })
+    return requests
+
+def read_finished_ids(path):
+    """Return the ids that already have a successful result in `path`, ignoring a torn last line."""
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get("status") == "ok":
+                finished.add(result["id"])
+    return finished
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is None and isinstance(getattr(error, "code", None), int):
+        status = error.code  # google.api_core exceptions
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)) or type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if it sent a Retry-After header."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def message_text(content):
+    """The text of a message's content, which is a string or a list of parts (text, image_url, ...)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict) and isinstance(part.get("text"), str))
+    return ""
+
+def estimate_tokens(request):
+    """Tokens to take from a token bucket for `request`: its prompt's text plus the reply's max_tokens.
+
+    Images and other non-text parts are not counted. Without a tokenizer for
+    the model, the text is estimated at CHARS_PER_TOKEN characters per token.
+    """
+    messages = [{"role": str(message.get("role", "")), "content": message_text(message.get("content"))} for message in request["messages"]]
+    try:
+        prompt_tokens = token_counter.count_messages(messages, request["model"] or "")
+    except Exception:
+        prompt_tokens = sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN + 4 * len(messages)
+    return prompt_tokens + request["max_tokens"]
+
+class Provider:
+    """One API endpoint with its own adapter, concurrency limit and rate limits."""
+    def __init__(self, name, kind, api_key, base_url=None, organization=None, models=None, concurrency=4,
+                 requests_per_minute=None, tokens_per_minute=None):
+        self.name = name
+        self.kind = kind  # "openai", "custom" (an OpenAI-compatible server), "anthropic" or "google"
+        self.models = models  # None serves any model
+        self.concurrency = concurrency
+        self.request_bucket = TokenBucket(requests_per_minute / 60, max(1, requests_per_minute / 60)) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        # One pooled keep-alive connection per concurrent request; retries are handled by BatchRunner
+        adapter_class = CustomServerAdapter if kind == "custom" else ADAPTERS[kind]
+        self.adapter = adapter_class(name, models, lambda: (api_key, base_url, organization), max_connections=concurrency, max_retries=0)
+
+    def convert_messages(self, request):
+        return self.adapter.convert_messages(request["model"], request["messages"])
+
+    def stream(self, request, messages, system_message, usage=None, metrics=None):
+        """Yield the text deltas of one completion."""
+        return self.adapter.stream(request["model"], messages, system_message, request["temperature"], request["max_tokens"], usage, metrics)
+
+def load_providers(config, concurrency=4, requests_per_minute=None, tokens_per_minute=None, base_url=None, api_key=None):
+    """Create the providers configured in `config` (a ConfigParser), in the order models are matched."""
+    limits = {"concurrency": concurrency, "requests_per_minute": requests_per_minute, "tokens_per_minute": tokens_per_minute}
+    providers = []
+    if config.get("openai", "api_key", fallback=""):
+        providers.append(Provider("openai", "openai", config.get("openai", "api_key"), organization=config.get("openai", "organization", fallback=""),
+                                  models=OPENAI_MODELS, **limits))
+    if config.get("anthropic", "api_key", fallback=""):
+        providers.append(Provider("anthropic", "anthropic", config.get("anthropic", "api_key"), models=ANTHROPIC_MODELS, **limits))
+    if config.get("google", "api_key", fallback=""):
+        providers.append(Provider("google", "google", config.get("google", "api_key"), models=GOOGLE_MODELS, **limits))
+    i = 0
+    while config.has_section(f"custom_server_{i}"):
+        section = f"custom_server_{i}"
+        models = [model.strip() for model in config.get(section, "models", fallback="").split(",") if model.strip()]
+        if config.get(section, "base_url", fallback="") and models:
+            providers.append(Provider(section, "custom", config.get(section, "api_key", fallback="") or "none",
+                                      base_url=config.get(section, "base_url"), models=models, **limits))
+        i += 1
+    if base_url:
+        providers.append(Provider("base_url", "custom", api_key or "none", base_url=base_url, models=None, **limits))
+    return providers
+
+class BatchRunner:
+    """Runs a list of requests against the providers and appends a result line per request."""
+    fsync_every = 20  # results between fsyncs of the output file
+
+    def __init__(self, providers, max_retries=5, timeout=120, backoff_base=1.0, backoff_max=30.0, metrics_store=None):
+        self.providers = providers
+        self.metrics_store = metrics_store  # every attempt is recorded here, if given
+        self.registry = ProviderRegistry(providers)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.completed = 0
+        self.failed = 0
+        self.total = 0
+
+    def resolve(self, model):
+        return self.registry.resolve(model)
+
+    async def run(self, requests, output_path):
+        finished = read_finished_ids(output_path)
+        pending = []
+        seen = set()
+        for request in requests:
+            if request["id"] in seen:
+                print(f"Warning: skipping duplicate request id '{request['id']}'")
+                continue
+            seen.add(request["id"])
+            if request["id"] not in finished:
+                pending.append(request)
+        self.total = len(pending)
+        print(f"{len(requests)} requests, {len(requests) - len(pending)} already done, {len(pending)} to run")
+
+        # A crash may have left half a line at the end of the file
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        else:
+            torn = False
+        with open(output_path, "a", encoding="utf-8") as output:
+            if torn:
+                output.write("\n")
+            self.output = output
+            self.unsynced = 0
+            queues = {}
+            for request in pending:
+                provider = self.resolve(request["model"])
+                if provider is None:
+                    self.write_result(request, None, error=f"No provider configured for model '{request['model']}'")
+                    continue
+                queues.setdefault(provider, asyncio.Queue()).put_nowait(request)
+            workers = [self.worker(provider, queue) for provider, queue in queues.items() for _ in range(provider.concurrency)]
+            await asyncio.gather(*workers)
+            output.flush()
+            os.fsync(output.fileno())
+        print(f"Done: {self.completed} succeeded, {self.failed} failed")
+        return self.failed == 0
+
+    async def worker(self, provider, queue):
+        while not queue.empty():
+            request = queue.get_nowait()
+            await self.run_request(provider, request)
+
+    async def run_request(self, provider, request):
+        loop = asyncio.get_event_loop()
+        start = time.perf_counter()
+        try:
+            # Converting may probe image URLs over the network
+            messages, system_message = await loop.run_in_executor(None, provider.convert_messages, request)
+        except Exception as e:
+            self.write_result(request, provider, error=f"Could not convert messages: {e}")
+            return
+        estimate = estimate_tokens(request) if provider.token_bucket is not None else None
+        attempt = 0
+        while True:
+            attempt += 1
+            # Waiting for the rate limits counts as queue time
+            metrics = RequestMetrics()
+            if provider.request_bucket is not None:
+                await provider.request_bucket.acquire()
+            if provider.token_bucket is not None:
+                await provider.token_bucket.acquire(estimate)
+            attempt_start = time.perf_counter()
+            usage = {}
+            try:
+                parts, first_token_time = await asyncio.wait_for(self.collect(provider, request, messages, system_message, usage, metrics), self.timeout)
+            except Exception as e:
+                self.record_metrics(metrics, "error", f"{type(e).__name__}: {e}")
+                if attempt <= self.max_retries and is_retryable(e):
+                    delay = retry_after(e)
+                    if delay is None:
+                        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                    print(f"  {request['id']}: {type(e).__name__}, retrying in {delay:.1f} s (attempt {attempt} of {self.max_retries + 1})")
+                    await asyncio.sleep(delay)
+                    continue
+                self.write_result(request, provider, error=f"{type(e).__name__}: {e}", attempts=attempt, latency=time.perf_counter() - start)
+                return
+            end = time.perf_counter()
+            self.record_metrics(metrics, "ok", usage=usage or None)
+            ttft = first_token_time - attempt_start if first_token_time is not None else None
+            self.write_result(request, provider, content="".join(parts), attempts=attempt, ttft=ttft, latency=end - start)
+            return
+
+    async def collect(self, provider, request, messages, system_message, usage=None, metrics=None):
+        first_token_time = None
+        parts = []
+        async for text in provider.stream(request, messages, system_message, usage, metrics):
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+            parts.append(text)
+        return parts, first_token_time
+
+    def record_metrics(self, metrics, status, error=None, usage=None):
+        if self.metrics_store is not None:
+            metrics.finish(status, error, usage)
+            asyncio.get_event_loop().run_in_executor(None, self.metrics_store.record, metrics)
+
+    def write_result(self, request, provider, content=None, error=None, attempts=0, ttft=None, latency=None):
+        result = {
+            "id": request["id"],
+            "model": request["model"],
+            "provider": provider.name if provider is not None else None,
+            "status": "error" if error is not None else "ok",
+            "content": content,
+            "error": error,
+            "attempts": attempts,
+            "ttft": round(ttft, 4) if ttft is not None else None,
+            "latency": round(latency, 4) if latency is not None else None,
+        }
+        self.output.write(json.dumps(result) + "\n")
+        self.output.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            os.fsync(self.output.fileno())
+            self.unsynced = 0
+        if error is None:
+            self.completed += 1
+        else:
+            self.failed += 1
+        done = self.completed + self.failed
+        status = f"ok in {latency:.2f} s" if error is None else f"failed: {error}"
+        print(f"[{done}/{self.total}] {request['id']} ({request['model']}) {status}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run chat completion requests from a JSONL file without the GUI")
+    parser.add_argument("input", help="JSONL file with one request per line")
+    parser.add_argument("output", help="JSONL file the results are appended to; existing successful results are skipped")
+    parser.add_argument("--config", default="config.ini", help="config file with the API keys and custom servers")
+    parser.add_argument("--base-url", help="OpenAI-compatible server for models no other provider serves")
+    parser.add_argument("--api-key", help="API key for --base-url")
+    parser.add_argument("--model", help="model for requests that don't name one")
+    parser.add_argument("--temperature", type=float, default=0.7, help="temperature for requests that don't set one")
+    parser.add_argument("--max-tokens", type=int, default=1000, help="max_tokens for requests that don't set one")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight per provider")
+    parser.add_argument("--rpm", type=float, help="requests per minute per provider")
+    parser.add_argument("--tpm", type=float, help="tokens per minute per provider (prompt plus max_tokens)")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per attempt")
+    parser.add_argument("--no-metrics", action="store_true", help="don't record the requests' latency in temp/metrics.sqlite")
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    providers = load_providers(config, args.concurrency, args.rpm, args.tpm, args.base_url, args.api_key)
+    requests = read_requests(args.input, args.model, args.temperature, args.max_tokens)
+    runner = BatchRunner(providers, max_retries=args.max_retries, timeout=args.timeout, metrics_store=None if args.no_metrics else metrics_store)
+    try:
+        success = asyncio.run(runner.run(requests, args.output))
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume")
+        return 1
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,564 @@
+"""
+Benchmarks for Chat Completions GUI
+
+Usage:
+    python src/benchmarks.py <benchmark> [options]
+
+Run with no arguments to list the available benchmarks. Benchmarks run headless
+unless noted otherwise and print their results to stdout.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from height_tracker import HeightTracker
+
+def generate_reply(num_chars, seed=0):
+    """Generate assistant-like text split into small streamed chunks."""
+    rng = random.Random(seed)
+    words = ["the", "model", "stream", "token", "window", "message", "height", "quickly", "a", "of", "to", "and"]
+    text = []
+    length = 0
+    while length < num_chars:
+        if rng.random() < 0.08:
+            piece = "\n" if rng.random() < 0.7 else "\n\n"
+        else:
+            piece = rng.choice(words) + " "
+        text.append(piece)
+        length += len(piece)
+    text = "".join(text)[:num_chars]
+    chunks = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 8)
+        chunks.append(text[i:i + size])
+        i += size
+    return chunks
+
+def full_rescan_height(text, width):
+    # The pre-HeightTracker algorithm: re-split and re-measure the whole message
+    wrapped_lines = 0
+    for line in text.split("\n"):
+        if line == "":
+            wrapped_lines += 1
+        else:
+            wrapped_lines += -(-len(line) // width)
+    return wrapped_lines
+
+def bench_heights(args):
+    chunks = generate_reply(args.chars)
+    width = args.width
+    print(f"Streaming {args.chars} characters in {len(chunks)} chunks (width {width})")
+
+    text = ""
+    rescan_time = 0.0
+    rescan_heights = []
+    for chunk in chunks:
+        text += chunk
+        start = time.perf_counter()
+        rescan_heights.append(full_rescan_height(text, width))
+        rescan_time += time.perf_counter() - start
+
+    tracker = HeightTracker(width)
+    tracker_time = 0.0
+    tracker_heights = []
+    for chunk in chunks:
+        start = time.perf_counter()
+        tracker.append(chunk)
+        tracker_heights.append(tracker.height)
+        tracker_time += time.perf_counter() - start
+
+    assert tracker_heights == rescan_heights, "HeightTracker disagrees with a full re-scan"
+    print(f"  full re-scan:   {rescan_time * 1000:9.2f} ms total")
+    print(f"  HeightTracker:  {tracker_time * 1000:9.2f} ms total")
+    print(f"  final height:   {tracker.height} lines")
+
+class StubContentTypeHandler(BaseHTTPRequestHandler):
+    """Answers HEAD requests with an image or HTML content type after a fixed delay."""
+    delay = 0.2
+
+    def do_HEAD(self):
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png" if self.path.endswith(".png") else "text/html")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def bench_urls(args):
+    import requests
+    from url_classifier import UrlClassifier
+
+    StubContentTypeHandler.delay = args.delay
+    server = start_stub_server(StubContentTypeHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base_url}/file{i}.{'png' if i % 2 else 'html'}" for i in range(args.urls)]
+    expected = {url for url in urls if url.endswith(".png")}
+    print(f"Classifying {len(urls)} URLs against a stub server with {args.delay * 1000:.0f} ms latency")
+
+    start = time.perf_counter()
+    sequential = {url for url in urls if 'image' in requests.head(url, timeout=5).headers.get('Content-Type', '')}
+    sequential_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        classifier = UrlClassifier(cache_path=os.path.join(temp_dir, "url_cache.json"))
+        start = time.perf_counter()
+        cold = classifier.image_urls(urls)
+        cold_time = time.perf_counter() - start
+        cold_probes = classifier.probe_count
+
+        start = time.perf_counter()
+        warm = classifier.image_urls(urls)
+        warm_time = time.perf_counter() - start
+
+        # A fresh classifier must pick the results up from the persisted cache
+        reloaded = UrlClassifier(cache_path=classifier.cache_path)
+        reloaded_result = reloaded.image_urls(urls)
+    server.shutdown()
+
+    assert sequential == cold == warm == reloaded_result == expected, "URL classification mismatch"
+    assert classifier.probe_count == cold_probes and reloaded.probe_count == 0, "cached URLs were probed again"
+    print(f"  sequential HEAD:   {sequential_time * 1000:9.2f} ms")
+    print(f"  parallel (cold):   {cold_time * 1000:9.2f} ms")
+    print(f"  cached (warm):     {warm_time * 1000:9.2f} ms")
+
+def generate_chat_logs(log_dir, num_logs, messages_per_log, seed=0):
+    """Write `num_logs` chat logs in the save_chat_history format, returns the vocabulary used."""
+    rng = random.Random(seed)
+    vocabulary = [f"{rng.choice(['al', 'be', 'co', 'de', 'ex', 'fi', 'go', 'hy'])}{rng.choice(['ta', 'ri', 'mo', 'lu', 'ne'])}{i}" for i in range(5000)]
+    os.makedirs(log_dir, exist_ok=True)
+    for i in range(num_logs):
+        chat_data = {
+            "system_message": "You are a helpful assistant.",
+            "chat_history": [
+                {"role": "user" if j % 2 == 0 else "assistant", "content": " ".join(rng.choices(vocabulary, k=rng.randint(20, 120)))}
+                for j in range(messages_per_log)
+            ]
+        }
+        with open(os.path.join(log_dir, f"log_{i:05d}.json"), "w", encoding='utf-8') as f:
+            json.dump(chat_data, f, indent=4)
+    return vocabulary
+
+def bench_search(args):
+    from chat_log_index import ChatLogIndex
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_dir = os.path.join(temp_dir, "chat_logs")
+        print(f"Generating {args.logs} chat logs with {args.messages} messages each...")
+        vocabulary = generate_chat_logs(log_dir, args.logs, args.messages)
+        index = ChatLogIndex(log_dir, os.path.join(temp_dir, "index.sqlite"), count_tokens=False)
+
+        start = time.perf_counter()
+        index.refresh()
+        print(f"  initial index build:      {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+        start = time.perf_counter()
+        index.refresh()
+        print(f"  refresh with no changes:  {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+        rng = random.Random(1)
+        queries = [rng.choice(vocabulary) for _ in range(args.queries // 2)]
+        queries += [f"{rng.choice(vocabulary)} {rng.choice(vocabulary)[:3]}" for _ in range(args.queries - len(queries))]
+        timings = []
+        matches = 0
+        for query in queries:
+            start = time.perf_counter()
+            matches += len(index.search(query, limit=100))
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"  {len(queries)} queries ({matches} matches): median {timings[len(timings) // 2] * 1000:.2f} ms, "
+              f"max {timings[-1] * 1000:.2f} ms")
+
+        # Simulate save_chat_history rewriting one log
+        path = os.path.join(log_dir, "log_00000.json")
+        with open(path, "r", encoding='utf-8') as f:
+            chat_data = json.load(f)
+        chat_data["chat_history"].append({"role": "user", "content": "a freshly saved needle message"})
+        with open(path, "w", encoding='utf-8') as f:
+            json.dump(chat_data, f, indent=4)
+        start = time.perf_counter()
+        index.update_file(path)
+        print(f"  re-index one saved log:   {(time.perf_counter() - start) * 1000:9.2f} ms")
+        results = index.search("needle")
+        assert [(result["name"], result["position"]) for result in results] == [("log_00000.json", args.messages + 1)], results
+
+def bench_transcript(args):
+    # Needs a display: the rows are real Tk widgets
+    import tkinter as tk
+    from transcript import TranscriptView
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"The transcript benchmark needs a display: {e}")
+        return
+    root.geometry("800x600")
+    canvas = tk.Canvas(root, highlightthickness=0)
+    canvas.pack(fill="both", expand=True)
+    noop = lambda *args: None
+    view = TranscriptView(canvas, on_add=noop, on_insert=noop, on_move=noop, on_toggle_role=noop, on_delete=noop, on_edit=noop)
+    contents = ["".join(generate_reply(random.Random(i).randint(50, 2000), seed=i)) for i in range(args.messages)]
+    print(f"Transcript with {args.messages} messages")
+
+    def timed(label, func):
+        start = time.perf_counter()
+        func()
+        root.update()
+        print(f"  {label:<28}{(time.perf_counter() - start) * 1000:9.2f} ms")
+
+    def load():
+        for i, content in enumerate(contents):
+            view.append("user" if i % 2 == 0 else "assistant", content)
+
+    def delete_each():
+        while view.messages:
+            view.remove(view.messages[0])
+
+    def insert_middle():
+        for i in range(100):
+            view.insert(len(view.messages) // 2, "user", contents[i])
+
+    def move_around():
+        for i in range(100):
+            view.move(view.messages[i], len(view.messages) - 1 - i)
+
+    root.update()
+    timed("load", load)
+    timed("clear", view.clear)
+    timed("load again", load)
+    timed("delete one at a time", delete_each)
+    load()
+    root.update()
+    timed("100 inserts in the middle", insert_middle)
+    timed("100 moves", move_around)
+    view.scroll_to(len(view.messages) // 2)
+    timed("scroll to the middle", root.update)
+    timed("clear", view.clear)
+    assert not view.messages and view.offsets == [0]
+    print(f"  widget rows created: {len(view.rows) + len(view.free_rows)}")
+    root.destroy()
+
+def bench_streams(args):
+    import asyncio
+    import httpx
+    from mock_server import start_mock_server
+    from streaming import STREAMERS
+
+    server = start_mock_server(ttft=args.ttft, tokens_per_second=args.tokens_per_second, reply_tokens=args.tokens)
+    root_url = server.base_url[:-len("v1/")]
+
+    def make_client(kind):
+        http_client = httpx.AsyncClient(timeout=httpx.Timeout(60, connect=5))
+        if kind == "anthropic":
+            import anthropic
+            return anthropic.AsyncAnthropic(api_key="mock", base_url=root_url, max_retries=0, http_client=http_client)
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key="mock", base_url=server.base_url, max_retries=0, http_client=http_client)
+
+    async def consume(kind, client, tag, arrivals, max_tokens):
+        messages = [{"role": "user", "content": f"stream {tag}"}]
+        async for _ in STREAMERS[kind](client, "mock-model", messages, "", 0.7, max_tokens):
+            arrivals.append(tag)
+
+    async def interleave(kind):
+        client = make_client(kind)
+        arrivals = []
+        start = time.perf_counter()
+        await consume(kind, client, "a", arrivals, args.tokens)
+        single = time.perf_counter() - start
+        arrivals.clear()
+        start = time.perf_counter()
+        await asyncio.gather(consume(kind, client, "a", arrivals, args.tokens), consume(kind, client, "b", arrivals, args.tokens))
+        both = time.perf_counter() - start
+        switches = sum(1 for previous, current in zip(arrivals, arrivals[1:]) if previous != current)
+        assert arrivals.count("a") == arrivals.count("b") == args.tokens, arrivals
+        assert switches >= args.tokens // 2, f"streams did not interleave: {''.join(arrivals)}"
+        print(f"  {kind:<10} one stream {single * 1000:7.1f} ms, two concurrent {both * 1000:7.1f} ms, {switches} switches between them")
+
+    async def cancel(kind):
+        client = make_client(kind)
+        arrivals = []
+        task = asyncio.ensure_future(consume(kind, client, "a", arrivals, 100000))
+        while len(arrivals) < 5:
+            await asyncio.sleep(0.005)
+        disconnects = server.stats.snapshot()["disconnects"]
+        start = time.perf_counter()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        cancelled = time.perf_counter() - start
+        # The server notices the closed socket the next time it writes a token
+        while server.stats.snapshot()["disconnects"] == disconnects and time.perf_counter() - start < 5:
+            await asyncio.sleep(0.001)
+        closed = time.perf_counter() - start
+        assert closed < 5, "the connection was not closed after cancelling"
+        print(f"  {kind:<10} cancelled in {cancelled * 1000:6.2f} ms, server saw the connection close after {closed * 1000:6.1f} ms")
+
+    async def run():
+        print(f"Streaming {args.tokens} tokens per reply from the mock server ({args.tokens_per_second:.0f} tokens/s)")
+        for kind in ("openai", "anthropic"):
+            await interleave(kind)
+        for kind in ("openai", "anthropic"):
+            await cancel(kind)
+        print("  google     not timed: google-generativeai talks gRPC, which the mock server doesn't speak (tests/test_streaming.py uses a stand-in)")
+
+    asyncio.run(run())
+    server.shutdown()
+
+def bench_connections(args):
+    import asyncio
+    from mock_server import start_mock_server
+    from providers import AnthropicAdapter, CustomServerAdapter, ProviderRegistry
+
+    # Every new connection pays a simulated handshake, as a TLS connection to a real provider would
+    server = start_mock_server(ttft=args.ttft, tokens_per_second=1000, reply_tokens=5, handshake_delay=args.handshake)
+    root_url = server.base_url[:-len("v1/")]
+
+    def make_adapter(kind):
+        if kind == "anthropic":
+            return AnthropicAdapter("anthropic", ["mock-model"], lambda: ("mock", root_url, None), max_retries=0)
+        return CustomServerAdapter("custom_server", ["mock-model"], lambda: ("mock", server.base_url, None), max_retries=0)
+
+    async def turn(adapter, i):
+        messages, system_message = adapter.convert_messages("mock-model", [{"role": "user", "content": f"turn {i}"}])
+        start = time.perf_counter()
+        ttft = None
+        async for _ in adapter.stream("mock-model", messages, system_message, 0.7, 5):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        return ttft
+
+    async def conversation(kind, pooled):
+        adapter = make_adapter(kind)
+        opened = server.stats.snapshot()["connections_opened"]
+        ttfts = []
+        for i in range(args.turns):
+            if not pooled:
+                adapter = make_adapter(kind)  # what rebuilding the client on every change used to cost
+            ttfts.append(await turn(adapter, i))
+            await asyncio.sleep(args.think)
+        connections = server.stats.snapshot()["connections_opened"] - opened
+        later = sorted(ttfts[1:])
+        print(f"  {kind:<10} {'pooled adapter' if pooled else 'new client per turn':<20} first turn {ttfts[0] * 1000:6.1f} ms, "
+              f"later turns median {later[len(later) // 2] * 1000:6.1f} ms, {connections} connections")
+        return later[len(later) // 2], connections
+
+    async def run():
+        print(f"{args.turns} turns {args.think:.1f} s apart, {args.handshake * 1000:.0f} ms simulated handshake, {args.ttft * 1000:.0f} ms server TTFT")
+        for kind in ("openai", "anthropic"):
+            fresh, _ = await conversation(kind, False)
+            pooled, connections = await conversation(kind, True)
+            assert connections == 1, f"the pooled {kind} adapter opened {connections} connections"
+            assert pooled < fresh, f"connection reuse did not lower the {kind} time to first token"
+
+    asyncio.run(run())
+    server.shutdown()
+
+    # Resolving a model: the registry's dict against the list scans it replaced
+    servers = [CustomServerAdapter(f"server_{i}", [f"model-{i}-{j}" for j in range(args.models)], lambda: ("", "", None)) for i in range(args.servers)]
+    registry = ProviderRegistry(servers)
+    models = [model for server in servers for model in server.models]
+    start = time.perf_counter()
+    for model in models:
+        assert registry.resolve(model).models is not None
+    dict_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for model in models:
+        next(server for server in servers if model in server.models)
+    scan_time = time.perf_counter() - start
+    print(f"Resolving {len(models)} models over {args.servers} servers: registry {dict_time / len(models) * 1e6:.2f} us, "
+          f"list scan {scan_time / len(models) * 1e6:.2f} us per model")
+
+def random_history(rng, num_messages, long_runs=False):
+    """Random roles (in runs of the same role if `long_runs`) and contents, some empty."""
+    messages = []
+    while len(messages) < num_messages:
+        role = rng.choice(["user", "assistant", "assistant", "user", "system"])
+        for _ in range(rng.randint(1, 6) if long_runs else 1):
+            content = rng.choice(["", "hi", "a longer message", "x" * rng.randint(0, 3000)])
+            messages.append({"role": role, "content": content})
+    return messages[:num_messages]
+
+def bench_normalize(args):
+    from message_normalizer import AnthropicNormalizer, GoogleNormalizer, NormalizerCache
+
+    # The output is checked against the conversion from before message_normalizer.py in tests/test_message_normalizer.py
+    formats = [("anthropic", AnthropicNormalizer), ("google", GoogleNormalizer)]
+    def timed(func, runs=5):
+        best = float("inf")
+        for _ in range(runs):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    for long_runs in (False, True):
+        messages = random_history(random.Random(args.seed), args.messages, long_runs)
+        print(f"{args.messages} messages{', in runs of the same role' if long_runs else ''}:")
+        for name, normalizer_class in formats:
+            new = timed(lambda: normalizer_class().convert(messages))
+            # The next turns: a reply and a new question appended to the conversation converted before
+            turns = []
+            for i in range(1, 11):
+                turns.append((turns[-1] if turns else messages) + [{"role": "assistant", "content": f"reply {i}"}, {"role": "user", "content": f"question {i}"}])
+            def extend():
+                cache = NormalizerCache(normalizer_class)
+                cache.convert(messages)
+                start = time.perf_counter()
+                for conversation in turns:
+                    cache.convert(conversation)
+                return (time.perf_counter() - start) / len(turns)
+            incremental = min(extend() for _ in range(5))
+            print(f"  {name:<10} single pass {new * 1000:7.2f} ms, extending the last conversion {incremental * 1000:6.2f} ms")
+
+def bench_load(args):
+    import asyncio
+    from load_test import LoadTest, format_report
+    from mock_server import start_mock_server
+    from providers import CustomServerAdapter
+
+    server = start_mock_server(ttft=args.ttft, tokens_per_second=args.tokens_per_second, reply_tokens=args.tokens, error_rate=args.error_rate)
+    corpus = [[{"role": "system", "content": "You are a load test."}, {"role": "user", "content": f"Question {i}"}] for i in range(20)]
+
+    def run(**load):
+        adapter = CustomServerAdapter("load_test", ["mock-model"], lambda: ("mock", server.base_url, None),
+                                      max_connections=load.get("concurrency") or 64, max_retries=0)
+        return asyncio.run(LoadTest(adapter, "mock-model", corpus, total_requests=args.requests, **load).run())
+
+    request_seconds = args.ttft + (args.tokens - 1) / args.tokens_per_second
+    print(f"Mock server: {args.ttft * 1000:.0f} ms TTFT, {args.tokens} tokens at {args.tokens_per_second:.0f} tokens/s "
+          f"(~{request_seconds * 1000:.0f} ms per request), {args.error_rate * 100:.0f}% errors; {args.requests} requests per run")
+    print(f"  {'load':<16} {'requests/s':>10} {'TTFT p50':>9} {'TTFT p99':>9} {'latency p50':>12} {'latency p99':>12} {'errors':>7}")
+    reports = {}
+    for concurrency in (1, 4, 16):
+        reports[concurrency] = report = run(concurrency=concurrency)
+        print(f"  {f'{concurrency} concurrent':<16} {report['requests_per_second']:>10.2f} {report['ttft_ms']['p50']:>9.1f} {report['ttft_ms']['p99']:>9.1f} "
+              f"{report['latency_ms']['p50']:>12.1f} {report['latency_ms']['p99']:>12.1f} {report['error_rate'] * 100:>6.1f}%")
+    # The mock server handles every request on its own thread, so throughput should grow with concurrency
+    assert reports[16]["requests_per_second"] > 4 * reports[1]["requests_per_second"], "throughput did not scale with concurrency"
+    rate = 4 * reports[1]["requests_per_second"]
+    report = run(rate=rate)
+    print(f"  {f'{rate:.1f} requests/s':<16} {report['requests_per_second']:>10.2f} {report['ttft_ms']['p50']:>9.1f} {report['ttft_ms']['p99']:>9.1f} "
+          f"{report['latency_ms']['p50']:>12.1f} {report['latency_ms']['p99']:>12.1f} {report['error_rate'] * 100:>6.1f}%")
+    assert abs(report["sent_per_second"] - rate) < 0.1 * rate, f"sent {report['sent_per_second']:.2f} requests/s instead of {rate:.2f}"
+    total = sum(report["requests"] for report in [*reports.values(), report])
+    errors = sum(report["errors"] for report in [*reports.values(), report])
+    assert total == 4 * args.requests
+    print(f"  error rate over all runs {errors / total * 100:.1f}% (the mock server fails {args.error_rate * 100:.0f}%)")
+    print()
+    print(format_report(reports[16]))
+    server.shutdown()
+
+IMPORT_TIMER = "import sys, time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+EAGER_CHECK = "import sys, chat_window, startup; print(','.join(m for m in startup.DEFERRED_MODULES if m in sys.modules))"
+
+def bench_startup(args):
+    from startup import DEFERRED_MODULES
+
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    print(f"Import cost in a fresh interpreter (median of {args.runs} runs)")
+    for module in ["chat_window"] + DEFERRED_MODULES:
+        timings = []
+        for _ in range(args.runs):
+            result = subprocess.run([sys.executable, "-c", IMPORT_TIMER.format(module=module)], cwd=src_dir, capture_output=True, text=True)
+            if result.returncode != 0:
+                break
+            timings.append(float(result.stdout))
+        if not timings:
+            print(f"  {module:<22}  not installed")
+            continue
+        timings.sort()
+        print(f"  {module:<22}{timings[len(timings) // 2] * 1000:9.2f} ms")
+
+    result = subprocess.run([sys.executable, "-c", EAGER_CHECK], cwd=src_dir, capture_output=True, text=True, check=True)
+    eager = result.stdout.strip()
+    print(f"  slow modules imported by chat_window: {eager or 'none'}")
+    assert not eager, f"chat_window imports {eager} at startup"
+
+    # Time to first frame needs a display; run the app in an empty directory so it doesn't touch the user's files
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = dict(os.environ, CHAT_GUI_STARTUP_REPORT="1")
+        result = subprocess.run([sys.executable, os.path.join(src_dir, "main.py")], cwd=temp_dir, env=env, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0 or "Startup report" not in result.stdout:
+        error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+        print(f"Time to first frame skipped, the app could not be started: {error}")
+        return
+    print(result.stdout[result.stdout.index("Startup report"):].rstrip())
+
+BENCHMARKS = {
+    "connections": (bench_connections, "time to first token on consecutive turns with pooled and fresh provider clients", [
+        (("--turns",), {"type": int, "default": 8}),
+        (("--think",), {"type": float, "default": 0.2}),
+        (("--handshake",), {"type": float, "default": 0.05}),
+        (("--ttft",), {"type": float, "default": 0.02}),
+        (("--servers",), {"type": int, "default": 20}),
+        (("--models",), {"type": int, "default": 50}),
+    ]),
+    "heights": (bench_heights, "height updates while streaming a long reply", [
+        (("--chars",), {"type": int, "default": 50000}),
+        (("--width",), {"type": int, "default": 80}),
+    ]),
+    "urls": (bench_urls, "image URL detection against a local stub HTTP server", [
+        (("--urls",), {"type": int, "default": 20}),
+        (("--delay",), {"type": float, "default": 0.2}),
+    ]),
+    "load": (bench_load, "the load generator against the mock server at several concurrencies and a fixed request rate", [
+        (("--requests",), {"type": int, "default": 64}),
+        (("--tokens",), {"type": int, "default": 20}),
+        (("--tokens-per-second",), {"type": float, "default": 200.0}),
+        (("--ttft",), {"type": float, "default": 0.05}),
+        (("--error-rate",), {"type": float, "default": 0.05}),
+    ]),
+    "normalize": (bench_normalize, "converting long histories to the Anthropic and Google formats, at once and extending the last conversion", [
+        (("--messages",), {"type": int, "default": 10000}),
+        (("--seed",), {"type": int, "default": 0}),
+    ]),
+    "search": (bench_search, "full-text search over a generated corpus of chat logs", [
+        (("--logs",), {"type": int, "default": 10000}),
+        (("--messages",), {"type": int, "default": 10}),
+        (("--queries",), {"type": int, "default": 200}),
+    ]),
+    "startup": (bench_startup, "per-import cost and time to first frame (the latter needs a display)", [
+        (("--runs",), {"type": int, "default": 5}),
+    ]),
+    "streams": (bench_streams, "concurrent and cancelled OpenAI and Anthropic streams against the mock server", [
+        (("--tokens",), {"type": int, "default": 40}),
+        (("--tokens-per-second",), {"type": float, "default": 100.0}),
+        (("--ttft",), {"type": float, "default": 0.05}),
+    ]),
+    "transcript": (bench_transcript, "loading, clearing and editing a long chat transcript (needs a display)", [
+        (("--messages",), {"type": int, "default": 500}),
+    ]),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat Completions GUI benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark")
+    for name, (_, help_text, options) in BENCHMARKS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        for flags, kwargs in options:
+            subparser.add_argument(*flags, **kwargs)
+    args = parser.parse_args()
+    if not args.benchmark:
+        parser.print_help()
+        return
+    BENCHMARKS[args.benchmark][0](args)
+
+if __name__ == "__main__":
+    main()
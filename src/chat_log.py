@@ -0,0 +1,238 @@
+"""
+Append-only chat logs
+
+A `.jsonl` chat log is a list of events, one JSON object per line:
+
+    {"op": "system", "content": "..."}                         set the system message
+    {"op": "model", "model": "..."}                            set the model
+    {"op": "put", "id": 3, "role": "user", "content": "..."}   add a message at the end, or replace one
+    {"op": "append", "id": 3, "text": "..."}                   add text to the end of a message (streamed replies)
+    {"op": "order", "ids": [1, 3, 2]}                          reorder messages; ids left out are deleted
+
+Replaying the events gives the conversation, so a change is saved by appending
+one short line instead of rewriting the whole file. Logs are compacted (rewritten
+as a snapshot) once most of the file is history. Legacy `.json` logs holding
+{"system_message", "chat_history", "model"} can be read and written everywhere
+a log path is accepted, and converted with:
+
+    python src/chat_log.py old_log.json new_log.jsonl
+"""
+
+import argparse
+import json
+import os
+from threading import Lock, Timer
+
+def is_append_log(path):
+    return path.endswith(".jsonl")
+
+def read_chat_log(path):
+    """Return the {"system_message", "chat_history", "model"} data of a .json or .jsonl log."""
+    if is_append_log(path):
+        return AppendLog.read(path).chat_data()
+    with open(path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+def write_chat_log(path, chat_data):
+    """Write {"system_message", "chat_history", "model"} as a .jsonl or legacy .json log."""
+    if is_append_log(path):
+        AppendLog.create(path, chat_data).close()
+        return
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(chat_data, f, indent=4)
+
+class AppendLog:
+    """An open .jsonl chat log. Changes are appended as events and fsynced in batches.
+
+    Every event is written and flushed to the OS immediately, so a crash of the
+    application loses nothing; fsync() runs at most once per `fsync_interval`
+    on a timer thread, so a power loss costs at most that much. Messages are
+    identified by integer ids that stay the same across saves.
+    """
+    compact_min_bytes = 256 * 1024  # never compact logs smaller than this
+    compact_ratio = 2  # compact once the file is this many times the size of a snapshot
+
+    def __init__(self, path, fsync_interval=1.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.lock = Lock()
+        self.timer = None
+        self.file = None
+        self.system_message = ""
+        self.model = ""
+        self.messages = {}  # id -> {"role", "content"}, in conversation order
+        self.next_id = 1
+        self.file_bytes = 0
+        self.event_count = 0
+        self.fsync_count = 0
+        self.compaction_count = 0
+        self.damaged = False  # the file ends in a torn line, appending to it would corrupt the next event
+
+    @classmethod
+    def read(cls, path):
+        """Replay a log without opening it for writing."""
+        log = cls(path)
+        with open(path, "r", encoding='utf-8') as f:
+            for line in f:
+                log.file_bytes += len(line.encode("utf-8"))
+                if not line.endswith("\n"):
+                    log.damaged = True
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write; everything before it is intact
+                    print(f"Warning: skipped an incomplete event in chat log '{path}'.")
+                    log.damaged = True
+                    continue
+                log.apply(event)
+                log.event_count += 1
+        return log
+
+    @classmethod
+    def open(cls, path, fsync_interval=1.0):
+        log = cls.read(path)
+        log.fsync_interval = fsync_interval
+        if log.damaged:
+            log.compact()
+        else:
+            log.file = open(path, "a", encoding='utf-8')
+        return log
+
+    @classmethod
+    def create(cls, path, chat_data, fsync_interval=1.0):
+        """Start a log holding `chat_data`, replacing any file at `path`. Returns it open for writing."""
+        log = cls(path, fsync_interval)
+        log.system_message = chat_data.get("system_message", "")
+        log.model = chat_data.get("model", "")
+        for message in chat_data.get("chat_history", []):
+            log.messages[log.new_id()] = {"role": message["role"], "content": message["content"]}
+        log.compact()
+        return log
+
+    def apply(self, event):
+        op = event.get("op")
+        if op == "system":
+            self.system_message = event["content"]
+        elif op == "model":
+            self.model = event["model"]
+        elif op == "put":
+            self.messages[event["id"]] = {"role": event["role"], "content": event["content"]}
+            self.next_id = max(self.next_id, event["id"] + 1)
+        elif op == "append":
+            self.messages[event["id"]]["content"] += event["text"]
+        elif op == "order":
+            self.messages = {message_id: self.messages[message_id] for message_id in event["ids"] if message_id in self.messages}
+
+    def new_id(self):
+        message_id = self.next_id
+        self.next_id += 1
+        return message_id
+
+    def chat_data(self):
+        return {"system_message": self.system_message, "chat_history": [dict(message) for message in self.messages.values()],
+                "model": self.model}
+
+    # Writing
+
+    def write(self, event):
+        self.apply(event)
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.file_bytes += len(line.encode("utf-8"))
+            self.event_count += 1
+            if self.timer is None and self.fsync_interval is not None:
+                self.timer = Timer(self.fsync_interval, self.sync)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def sync(self):
+        with self.lock:
+            self.timer = None
+            if self.file is not None and not self.file.closed:
+                os.fsync(self.file.fileno())
+                self.fsync_count += 1
+
+    def set_system_message(self, content):
+        if content != self.system_message:
+            self.write({"op": "system", "content": content})
+
+    def set_model(self, model):
+        if model != self.model:
+            self.write({"op": "model", "model": model})
+
+    def put(self, message_id, role, content):
+        """Save a message. Text added to the end of an unchanged message is written as just the new text."""
+        old = self.messages.get(message_id)
+        if old is not None and old["role"] == role:
+            if old["content"] == content:
+                return
+            if old["content"] and content.startswith(old["content"]):
+                self.write({"op": "append", "id": message_id, "text": content[len(old["content"]):]})
+                return
+        self.write({"op": "put", "id": message_id, "role": role, "content": content})
+
+    def set_order(self, message_ids):
+        """Reorder the messages to `message_ids`; messages not in the list are deleted."""
+        if list(self.messages) != list(message_ids):
+            self.write({"op": "order", "ids": list(message_ids)})
+
+    def snapshot_events(self):
+        yield {"op": "system", "content": self.system_message}
+        yield {"op": "model", "model": self.model}
+        for message_id, message in self.messages.items():
+            yield {"op": "put", "id": message_id, "role": message["role"], "content": message["content"]}
+
+    def maybe_compact(self):
+        """Compact the log if most of it is superseded history. Returns True if it was compacted."""
+        if self.file_bytes < self.compact_min_bytes:
+            return False
+        snapshot_bytes = sum(len(message["content"]) for message in self.messages.values()) + len(self.system_message)
+        if self.file_bytes < self.compact_ratio * snapshot_bytes:
+            return False
+        self.compact()
+        return True
+
+    def compact(self):
+        """Rewrite the log as a snapshot of the current conversation (temp file + fsync + rename)."""
+        lines = [json.dumps(event, ensure_ascii=False) + "\n" for event in self.snapshot_events()]
+        temp_path = self.path + ".tmp"
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            with open(temp_path, "w", encoding='utf-8') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            if self.file is not None:
+                self.file.close()
+            os.replace(temp_path, self.path)
+            self.file = open(self.path, "a", encoding='utf-8')
+            self.file_bytes = sum(len(line.encode("utf-8")) for line in lines)
+            self.event_count = len(lines)
+            self.compaction_count += 1
+            self.damaged = False
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.file is not None:
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.file.close()
+                self.file = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert chat logs between the legacy .json format and the append-only .jsonl format")
+    parser.add_argument("source", help="chat log to read (.json or .jsonl)")
+    parser.add_argument("destination", help="chat log to write; the format follows the extension")
+    args = parser.parse_args()
+    write_chat_log(args.destination, read_chat_log(args.source))
+    print(f"Wrote {args.destination}")
+
+if __name__ == "__main__":
+    main()
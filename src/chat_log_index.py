@@ -0,0 +1,203 @@
+import os
+import sqlite3
+from threading import Lock, Timer, current_thread
+from constants import DEFAULT_TOKEN_COUNT_MODEL, CHAT_LOG_INDEX_DELAY
+from token_counter import token_counter
+from chat_log import read_chat_log
+
+SCHEMA_VERSION = 2
+
+class ChatLogIndex:
+    """Persistent SQLite index of the chat logs in `log_dir`.
+
+    Stores each log's mtime, size, title, message count, model and token total so
+    the log list can be shown and searched without opening every file. The text
+    of every message is also kept in an FTS5 full-text index. refresh() only
+    re-reads files whose mtime or size changed since they were last indexed.
+    Logs that are appended to as the conversation goes on are re-indexed
+    with schedule_update(), at most once per CHAT_LOG_INDEX_DELAY.
+    """
+    def __init__(self, log_dir="chat_logs", db_path=os.path.join("temp", "chat_log_index.sqlite"), count_tokens=True):
+        self.log_dir = log_dir
+        self.db_path = db_path
+        self.count_tokens = count_tokens
+        self.lock = Lock()
+        self.connection = None
+        self.full_text_search = True
+        self.pending_updates = {}  # path -> Timer of the scheduled re-index
+
+    def connect(self):
+        if self.connection is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS logs (
+                name TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                message_count INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                tokens INTEGER)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS logs_by_mtime ON logs (mtime DESC)")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                role TEXT NOT NULL)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS messages_by_name ON messages (name)")
+            try:
+                # Rows of message_text share their rowid with the matching row in messages.
+                # Prefix indexes keep search-as-you-type queries (last word + '*') fast.
+                self.connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS message_text USING fts5(content, prefix='2 3')")
+            except sqlite3.OperationalError as e:
+                print(f"Warning: SQLite FTS5 is not available, full-text search of chat logs is disabled ({e})")
+                self.full_text_search = False
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                # Older indexes have no message text; forget them so the next refresh re-reads every log
+                self.connection.execute("DELETE FROM logs")
+                self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.connection.commit()
+        return self.connection
+
+    def scan(self):
+        """Return a dict of file name -> os.stat_result for every log on disk."""
+        if not os.path.isdir(self.log_dir):
+            return {}
+        with os.scandir(self.log_dir) as entries:
+            return {entry.name: entry.stat() for entry in entries if entry.name.endswith(('.json', '.jsonl')) and entry.is_file()}
+
+    def read_log(self, path):
+        chat_data = read_chat_log(path)
+        chat_history = chat_data.get("chat_history", [])
+        model = chat_data.get("model", "")
+        title = next((message["content"] for message in chat_history if message["role"] == "user" and message["content"].strip()), "")
+        title = " ".join(title.split())[:100]
+        messages = [{"role": "system", "content": chat_data.get("system_message", "")}]
+        messages.extend({"role": message["role"], "content": message["content"]} for message in chat_history)
+        tokens = None
+        if self.count_tokens:
+            try:
+                tokens = token_counter.count_messages(messages, model or DEFAULT_TOKEN_COUNT_MODEL)
+            except Exception as e:
+                print(f"Warning: could not count tokens for '{path}': {e}")
+        return {"title": title, "message_count": len(chat_history), "model": model, "tokens": tokens, "messages": messages}
+
+    def index_file(self, name, stat):
+        """Read a log and return its logs row and its messages (position 0 is the system message)."""
+        try:
+            info = self.read_log(os.path.join(self.log_dir, name))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Warning: could not index chat log '{name}': {e}")
+            info = {"title": "", "message_count": 0, "model": "", "tokens": None, "messages": []}
+        row = (name, stat.st_mtime, stat.st_size, info["title"], info["message_count"], info["model"], info["tokens"])
+        return row, info["messages"]
+
+    def store(self, connection, indexed_files, removed_names):
+        """Write freshly indexed files and drop removed ones. Must be called with the lock held."""
+        for name in [row[0] for row, _ in indexed_files] + removed_names:
+            if self.full_text_search:
+                connection.execute("DELETE FROM message_text WHERE rowid IN (SELECT id FROM messages WHERE name = ?)", (name,))
+            connection.execute("DELETE FROM messages WHERE name = ?", (name,))
+            connection.execute("DELETE FROM logs WHERE name = ?", (name,))
+        for row, messages in indexed_files:
+            connection.execute("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            for position, message in enumerate(messages):
+                if not message["content"]:
+                    continue
+                message_id = connection.execute("INSERT INTO messages (name, position, role) VALUES (?, ?, ?)",
+                                                (row[0], position, message["role"])).lastrowid
+                if self.full_text_search:
+                    connection.execute("INSERT INTO message_text (rowid, content) VALUES (?, ?)", (message_id, message["content"]))
+        connection.commit()
+
+    def refresh(self):
+        """Bring the index up to date with the log directory. Returns the number of logs (re)indexed."""
+        on_disk = self.scan()
+        with self.lock:
+            connection = self.connect()
+            indexed = {name: (mtime, size) for name, mtime, size in connection.execute("SELECT name, mtime, size FROM logs")}
+        changed = [name for name, stat in on_disk.items() if indexed.get(name) != (stat.st_mtime, stat.st_size)]
+        removed = [name for name in indexed if name not in on_disk]
+        indexed_files = [self.index_file(name, on_disk[name]) for name in changed]
+        with self.lock:
+            self.store(self.connect(), indexed_files, removed)
+        return len(indexed_files)
+
+    def update_file(self, path):
+        """Index a single log right after it was written."""
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.log_dir):
+            return
+        name = os.path.basename(path)
+        indexed_file = self.index_file(name, os.stat(path))
+        with self.lock:
+            self.store(self.connect(), [indexed_file], [])
+
+    def schedule_update(self, path, delay=CHAT_LOG_INDEX_DELAY):
+        """Re-index a log on a timer thread within `delay` seconds, batching the writes made until then. Returns the timer."""
+        with self.lock:
+            timer = self.pending_updates.get(path)
+            if timer is not None:
+                if delay > 0:
+                    return timer
+                timer.cancel()
+            timer = Timer(delay, self.run_scheduled_update, (path,))
+            timer.daemon = True
+            self.pending_updates[path] = timer
+            timer.start()
+            return timer
+
+    def run_scheduled_update(self, path):
+        with self.lock:
+            if self.pending_updates.get(path) is current_thread():
+                del self.pending_updates[path]
+        try:
+            self.update_file(path)
+        except OSError as e:
+            print(f"Warning: could not index chat log '{path}': {e}")
+
+    def list_logs(self, query="", limit=100, offset=0):
+        """Return logs (newest first) whose name or title contains `query`, as dicts."""
+        sql = "SELECT name, mtime, size, title, message_count, model, tokens FROM logs"
+        params = []
+        if query:
+            sql += " WHERE name LIKE ? ESCAPE '\\' OR title LIKE ? ESCAPE '\\'"
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params.extend([pattern, pattern])
+        sql += " ORDER BY mtime DESC LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        with self.lock:
+            rows = self.connect().execute(sql, params).fetchall()
+        columns = ["name", "mtime", "size", "title", "message_count", "model", "tokens"]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def search(self, query, limit=100, offset=0):
+        """Full-text search over every message of every log.
+
+        Returns dicts with the log name, its mtime, the message position (0 is the
+        system message) and role, and a snippet with the matches in [brackets].
+        All words must match; the last word also matches as a prefix.
+        """
+        words = query.split()
+        if not words or not self.full_text_search:
+            return []
+        match = " ".join('"' + word.replace('"', '""') + '"' for word in words) + "*"
+        sql = """SELECT messages.name, logs.mtime, messages.position, messages.role,
+                        snippet(message_text, 0, '[', ']', '...', 16)
+                 FROM message_text
+                 JOIN messages ON messages.id = message_text.rowid
+                 JOIN logs ON logs.name = messages.name
+                 WHERE message_text MATCH ?
+                 ORDER BY rank LIMIT ? OFFSET ?"""
+        with self.lock:
+            rows = self.connect().execute(sql, (match, limit, offset)).fetchall()
+        columns = ["name", "mtime", "position", "role", "snippet"]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def recent_names(self, limit):
+        return [log["name"] for log in self.list_logs(limit=limit)]
+
+# Shared by every window so the index is only opened once
+chat_log_index = ChatLogIndex()
@@ -6,45 +6,64 @@ from tkinter import filedialog
 from tkinter import messagebox
 from threading import Thread
 import asyncio
-import json
-from datetime import datetime
-import random
-import string
 import sys
 from tooltip import ToolTip
 from constants import OPENAI_VISION_MODELS, OPENAI_MODELS, ANTHROPIC_MODELS, GOOGLE_MODELS, \
-    SYSTEM_MESSAGE_DEFAULT_TEXT, DEFAULT_FILE_NAMING_MODEL, MODEL_INFO, \
-    HIGH_DETAIL_COST_PER_IMAGE, LOW_DETAIL_COST_PER_IMAGE
-from prompts import file_naming_prompt
-from utils import convert_messages_for_model, parse_and_create_image_messages, count_tokens, convert_text_to_tokens, convert_tokens_to_text
+    SYSTEM_MESSAGE_DEFAULT_TEXT, DEFAULT_FILE_NAMING_MODEL, MODEL_INFO, DEFAULT_SUMMARY_MODEL, SUMMARY_MAX_TOKENS, DEFAULT_CONTEXT_KEEP_LAST, \
+    HIGH_DETAIL_COST_PER_IMAGE, LOW_DETAIL_COST_PER_IMAGE, STREAM_RENDER_INTERVAL_MS, RECENT_CHAT_LOGS_IN_DROPDOWN, CHAT_LOG_SYNC_MS
+from utils import find_urls, count_tokens, is_installed
+from url_classifier import url_classifier
+from chat_log_index import chat_log_index
+from chat_log import AppendLog, is_append_log, read_chat_log, write_chat_log
+from autosave import Autosave, read_snapshot
+from log_picker import LogPicker
+from transcript import TranscriptView
 from custom_server import CustomServer
+from fan_out import FanOutWindow
+from stream_renderer import StreamRenderer
+from providers import ProviderRegistry, builtin_adapters
+from metrics import RequestMetrics, metrics_store
+from metrics_window import MetricsWindow
+from token_meter import TokenMeter
+from token_counter import token_counter
+from response_cache import response_cache, RecordingOutput
+from context_manager import ContextManager, CollectingOutput, CONTEXT_STRATEGIES
+from file_namer import FileNamer
+from startup import preload
 
 class ChatWindow:
-    def __init__(self, root, config, os_name):
+    def __init__(self, root, config_store, os_name, async_worker):
         self.app = root
-        self.config = config
+        # Reads go straight to the ConfigParser; writes go through the store so they are batched
+        self.config_store = config_store
+        self.config = config_store.config
         self.os_name = os_name
+        # Event loop shared by every window for all provider requests
+        self.async_worker = async_worker
+        self.current_request = None
         # Initialize the main application window
         self.app.geometry("800x600")
         self.app.title("Chat Completions GUI")
 
-        self.is_streaming_cancelled = False
+        # Streamed deltas are coalesced and written to the last message at a fixed frame rate
+        self.stream_renderer = StreamRenderer(self.app, self.add_to_last_message, STREAM_RENDER_INTERVAL_MS)
 
         self.settings_window = None
         self.settings_frame = None
 
-        self.setup_openai_client()
-        self.setup_anthropic_client()
-        self.setup_google_client()
+        self.setup_provider_vars()
+        self.builtin_adapters = builtin_adapters(self.config)
         self.custom_servers = []
         custom_server_count = 0
-        while config.has_section(f"custom_server_{custom_server_count}"):
-            base_url = config.get(f"custom_server_{custom_server_count}", "base_url", fallback="http://localhost:11434/v1/")
-            api_key = config.get(f"custom_server_{custom_server_count}", "api_key", fallback="ollama")
-            org_id = config.get(f"custom_server_{custom_server_count}", "organization", fallback="")
-            custom_models = [model.strip() for model in config.get(f"custom_server_{custom_server_count}", "models", fallback="").split(",") if model.strip()]
+        while self.config.has_section(f"custom_server_{custom_server_count}"):
+            base_url = self.config.get(f"custom_server_{custom_server_count}", "base_url", fallback="http://localhost:11434/v1/")
+            api_key = self.config.get(f"custom_server_{custom_server_count}", "api_key", fallback="ollama")
+            org_id = self.config.get(f"custom_server_{custom_server_count}", "organization", fallback="")
+            custom_models = [model.strip() for model in self.config.get(f"custom_server_{custom_server_count}", "models", fallback="").split(",") if model.strip()]
             self.custom_servers.append(CustomServer(base_url, api_key, org_id, custom_models, on_config_changed=lambda *args: self.on_config_changed()))
             custom_server_count += 1
+        self.providers = ProviderRegistry()
+        self.update_provider_registry()
 
         # Create the main_frame for holding the chat and other widgets
         self.main_frame = ttk.Frame(self.app, padding="10")
@@ -90,23 +109,25 @@ class ChatWindow:
         self.max_len_entry_var.trace("w", self.on_max_len_entry_change)
 
         # Chat frame and scrollbar
-        self.chat_history = []
         self.chat_frame = tk.Canvas(self.main_frame, highlightthickness=0)
         self.chat_frame.grid(row=1, column=0, columnspan=9, sticky="nsew")
 
-        self.inner_frame = ttk.Frame(self.chat_frame)
-        self.inner_frame.rowconfigure(0, weight=1)
-        self.chat_frame.create_window((0, 0), window=self.inner_frame, anchor="nw")
+        self.chat_scroll = ttk.Scrollbar(self.main_frame, orient="vertical", command=self.chat_frame.yview)
+        self.chat_scroll.grid(row=1, column=9, sticky="ns")
+        self.chat_frame.configure(yscrollcommand=self.on_chat_scroll)
 
-        chat_scroll = ttk.Scrollbar(self.main_frame, orient="vertical", command=self.chat_frame.yview)
-        chat_scroll.grid(row=1, column=9, sticky="ns")
-        self.chat_frame.configure(yscrollcommand=chat_scroll.set)
+        # A .jsonl chat log that was saved or loaded is kept up to date with incremental writes
+        self.chat_log = None
+        self.log_dirty = set()
+        self.log_sync_id = None
+        # Snapshots of the conversation are taken in the background whenever it changed
+        self.autosave = Autosave(self.app, self.get_chat_data)
+        self.autosave.start()
 
-        # Add button for chat messages
-        self.add_button_row = 1
-        self.add_button = ttk.Button(self.inner_frame, text="+", width=2, command=self.add_message_via_button)
-        self.add_button_label = ttk.Label(self.inner_frame, text="Add")
-        ToolTip(self.add_button, "Add new message")
+        # Messages are kept in a plain data model; only the ones near the viewport get widgets
+        self.transcript = TranscriptView(self.chat_frame, on_add=self.add_message_via_button, on_insert=self.insert_message,
+                                         on_move=self.move_message, on_toggle_role=self.toggle_role,
+                                         on_delete=self.delete_message, on_edit=self.track_message_tokens)
 
         # Submit button
         self.submit_button_text = tk.StringVar()  # Create a StringVar variable to control the text of the submit button
@@ -114,10 +135,24 @@ class ChatWindow:
         self.submit_button = ttk.Button(self.main_frame, textvariable=self.submit_button_text, command=self.submit_chat_request)  # Use textvariable instead of text
         self.submit_button.grid(row=7, column=7, sticky="e")
 
+        # Send the conversation to several models at once and compare the replies
+        self.compare_button = ttk.Button(self.main_frame, text="Compare Models", command=self.open_fan_out_window)
+        self.compare_button.grid(row=7, column=6, sticky="e", padx=5)
+
         # Add a new button for counting tokens (new code)
         self.token_count_button = ttk.Button(self.main_frame, text="Count Tokens", command=self.show_token_count_message)
         self.token_count_button.grid(row=7, column=0, sticky="w")  # Place it on the bottom left, same row as 'Submit'
 
+        # Live token and cost estimate, updated incrementally as messages change
+        self.token_meter_var = tk.StringVar()
+        ttk.Label(self.main_frame, textvariable=self.token_meter_var).grid(row=7, column=1, sticky="w", padx=5)
+        self.token_meter = TokenMeter(self.app, self.token_meter_var, self.model_var.get, self.max_len_entry_var.get)
+        self.token_meter.update("system", self.read_system_message)
+        self.system_message_widget.bind("<KeyRelease>", self.on_system_message_edit)
+        self.model_var.trace("w", self.token_meter.invalidate)
+        self.model_var.trace("w", lambda *args: self.on_conversation_changed())
+        self.max_length_var.trace("w", self.token_meter.render)
+
         self.add_message("user", "")
 
         # Configuration frame for API key, Org ID, and buttons
@@ -125,26 +160,29 @@ class ChatWindow:
         self.configuration_frame.grid(row=0, column=0, sticky="new")
         config_row = 0
 
-        # Add a dropdown menu to select a chat log file to load
+        # Add a dropdown menu to select a recent chat log file to load
+        # The list comes from the persistent chat log index, which is brought up to date in the background
         self.chat_filename_var = tk.StringVar()
-        self.chat_files = sorted(
-            [f for f in os.listdir("chat_logs") if os.path.isfile(os.path.join("chat_logs", f)) and f.endswith('.json')],
-            key=lambda x: os.path.getmtime(os.path.join("chat_logs", x)),
-            reverse=True
-        )
+        self.chat_files = chat_log_index.recent_names(RECENT_CHAT_LOGS_IN_DROPDOWN)
         ttk.Label(self.configuration_frame, text="Chat Log:").grid(row=config_row, column=0, sticky="w")
         default_chat_file = "<new-log>"
         self.chat_files.insert(0, default_chat_file)
         self.chat_file_dropdown = ttk.OptionMenu(self.configuration_frame, self.chat_filename_var, default_chat_file, *self.chat_files)
         self.chat_file_dropdown.grid(row=config_row, column=1, sticky="w")
 
+        # Add a button to search all chat logs
+        self.browse_button = ttk.Button(self.configuration_frame, text="...", width=3, command=self.open_log_picker)
+        self.browse_button.grid(row=config_row, column=2, sticky="w")
+        ToolTip(self.browse_button, "Browse and search all chat logs")
+
         # Add a button to load the selected chat log
         self.load_button = ttk.Button(self.configuration_frame, text="Load Chat", command=self.load_chat_history)
-        self.load_button.grid(row=config_row, column=2, sticky="w")
+        self.load_button.grid(row=config_row, column=3, sticky="w")
 
         # Add a button to save the chat history
         self.save_button = ttk.Button(self.configuration_frame, text="Save Chat", command=self.save_chat_history)
-        self.save_button.grid(row=config_row, column=3, sticky="w")
+        self.save_button.grid(row=config_row, column=4, sticky="w")
+        self.refresh_chat_log_index()
 
         # Add image detail dropdown
         self.image_detail_var = tk.StringVar(value="low")
@@ -171,13 +209,31 @@ class ChatWindow:
             self.dark_mode_var.set(True)
             self.toggle_dark_mode()
 
-        self.file_naming_model_var = tk.StringVar(value=DEFAULT_FILE_NAMING_MODEL)
+        self.file_naming_model_var = tk.StringVar(value=self.config.get("app", "file_naming_model", fallback=DEFAULT_FILE_NAMING_MODEL))
+        self.file_naming_model_var.trace("w", lambda *args: self.config_store.set("app", "file_naming_model", self.file_naming_model_var.get().strip()))
+        # File names are suggested in the background, so the save dialog never waits for the naming model
+        self.file_namer = FileNamer(self.app, self.async_worker, self.get_messages_from_chat_history,
+                                    lambda: self.file_naming_model_var.get().strip(), self.complete_messages)
+
+        # Opt-in cache that replays identical requests instead of sending them again
+        self.response_cache_var = tk.BooleanVar(value=self.config.getboolean("app", "response_cache", fallback=False))
+        self.response_cache_var.trace("w", lambda *args: self.config_store.set("app", "response_cache", str(self.response_cache_var.get())))
+
+        # What to do with a conversation that doesn't fit the model's context window
+        self.context_manager = ContextManager(lambda messages, model, output: self.complete_messages(messages, model, SUMMARY_MAX_TOKENS, output))
+        strategy_labels = {strategy: label for label, strategy in CONTEXT_STRATEGIES.items()}
+        self.context_strategy_var = tk.StringVar(value=strategy_labels.get(self.config.get("app", "context_strategy", fallback="off"), "Show an error"))
+        self.context_strategy_var.trace("w", lambda *args: self.config_store.set("app", "context_strategy", CONTEXT_STRATEGIES[self.context_strategy_var.get()]))
+        self.context_keep_last_var = tk.StringVar(value=self.config.get("app", "context_keep_last", fallback=str(DEFAULT_CONTEXT_KEEP_LAST)))
+        self.context_keep_last_var.trace("w", lambda *args: self.config_store.set("app", "context_keep_last", self.context_keep_last_var.get()))
+        self.summary_model_var = tk.StringVar(value=self.config.get("app", "summary_model", fallback=DEFAULT_SUMMARY_MODEL))
+        self.summary_model_var.trace("w", lambda *args: self.config_store.set("app", "summary_model", self.summary_model_var.get().strip()))
 
         # Add a separator
         ttk.Separator(self.configuration_frame, orient='horizontal').grid(row=config_row+1, column=0, columnspan=10, sticky="we", pady=3)
 
         # Set the weights for the configuration frame
-        self.configuration_frame.columnconfigure(3, weight=1)
+        self.configuration_frame.columnconfigure(4, weight=1)
 
         # Configure weights for resizing behavior
         self.app.columnconfigure(0, weight=1)
@@ -190,7 +246,6 @@ class ChatWindow:
         self.previous_focused_widget = None
 
         # Bind events
-        self.inner_frame.bind("<Configure>", self.configure_scrollregion)
         self.app.bind("<Configure>", self.update_entry_widths)
         self.app.bind_class('Entry', '<FocusOut>', self.update_previous_focused_widget)
         self.app.bind("<Escape>", lambda event: self.toggle_settings_window())
@@ -200,90 +255,76 @@ class ChatWindow:
         self.app.bind_all(f'<{modifier}-n>', self.create_new_window)
         # Add a protocol to handle the close event
         self.app.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Load the slow modules the first request will need once the window is up
+        self.app.after_idle(self.preload_modules)
+        # Only the first window offers to restore what the last session left unsaved
+        if not isinstance(self.app, tk.Toplevel):
+            self.app.after_idle(self.offer_autosave_restore)
         # Start the application main loop
         self.app.mainloop()
 
-    def setup_openai_client(self):
-        if not hasattr(self, "openai_apikey_var"):
-            self.openai_apikey_var = tk.StringVar(value=self.config.get("openai", "api_key", fallback=""))
-            self.openai_orgid_var = tk.StringVar(value=self.config.get("openai", "organization", fallback=""))
-            self.openai_apikey_var.trace("w", self.on_config_changed)
-            self.openai_orgid_var.trace("w", self.on_config_changed)
-        if self.openai_apikey_var.get():
-            try:
-                from openai import OpenAI, AsyncOpenAI
-            except:
-                error_message = "WARNING: OpenAI API not installed. If you wish to use OpenAI or custom server models, install the 'openai' package with the `pip install openai` command."
-                print(error_message)
-                # self.show_error_popup(error_message)
-                self.openai_aclient = None
-                self.openai_client = None
-                return
-            self.openai_client = OpenAI(api_key=self.openai_apikey_var.get(), organization=self.openai_orgid_var.get())
-            self.openai_aclient = AsyncOpenAI(api_key=self.openai_apikey_var.get(), organization=self.openai_orgid_var.get())
-        else:
-            self.openai_client = None
-            self.openai_aclient = None
-
-    def setup_anthropic_client(self):
-        if not hasattr(self, "anthropic_apikey_var"):
-            self.anthropic_apikey_var = tk.StringVar(value=self.config.get("anthropic", "api_key", fallback=""))
-            self.anthropic_apikey_var.trace("w", self.on_config_changed)
+    # Provider clients live in their adapters (providers.py), created on first use and only rebuilt when their own credentials change
+    def setup_provider_vars(self):
+        self.openai_apikey_var = tk.StringVar(value=self.config.get("openai", "api_key", fallback=""))
+        self.openai_orgid_var = tk.StringVar(value=self.config.get("openai", "organization", fallback=""))
+        self.anthropic_apikey_var = tk.StringVar(value=self.config.get("anthropic", "api_key", fallback=""))
+        self.google_apikey_var = tk.StringVar(value=self.config.get("google", "api_key", fallback=""))
+        for var in (self.openai_apikey_var, self.openai_orgid_var, self.anthropic_apikey_var, self.google_apikey_var):
+            var.trace("w", self.on_config_changed)
+
+    def update_provider_registry(self):
+        # Built-in providers take precedence over custom servers serving a model of the same name
+        self.providers.set_entries([*self.builtin_adapters, *(server.adapter for server in self.custom_servers)])
+
+    def preload_modules(self):
+        module_names = ["tiktoken", "requests"]
+        if self.openai_apikey_var.get() or self.custom_servers:
+            module_names.append("openai")
         if self.anthropic_apikey_var.get():
-            try:
-                import anthropic
-            except:
-                error_message = "WARNING: Anthropic API not installed. If you wish to use Anthropic models, install the 'anthropic' package with the `pip install anthropic` command."
-                # self.show_error_popup(error_message)
-                print(error_message)
-                self.anthropic_client = None
-                return
-            self.anthropic_client = anthropic.Anthropic(api_key=self.anthropic_apikey_var.get())
-        else:
-            self.anthropic_client = None
-
-    def setup_google_client(self):
-        if not hasattr(self, "google_apikey_var"):
-            self.google_apikey_var = tk.StringVar(value=self.config.get("google", "api_key", fallback=""))
-            self.google_apikey_var.trace("w", self.on_config_changed)
+            module_names.append("anthropic")
         if self.google_apikey_var.get():
-            try:
-                import google.generativeai as genai
-            except:
-                error_message = "WARNING: Google GenerativeAI API not installed. If you wish to use Google Gemini models, install the 'google-generativeai' package with the `pip install google-generativeai` command."
-                # self.show_error_popup(error_message)
-                print(error_message)
-                return
-            genai.configure(api_key=self.google_apikey_var.get())
-    
+            module_names.append("google.generativeai")
+        model = self.model_var.get()
+        preload([name for name in module_names if is_installed(name)], then=lambda: self.preload_encoding(model))
+
+    def preload_encoding(self, model):
+        try:
+            token_counter.get_encoding(model)
+        except Exception as e:
+            print(f"Warning: could not load the token encoding for {model}: {e}")
+
     def clear_chat_history(self):
-        for row in reversed(range(len(self.chat_history))):
-            self.delete_message(row + 1)
+        self.token_meter.remove(*[message.key for message in self.transcript.messages])
+        self.transcript.clear()
+        self.cancel_streaming()
 
-        self.chat_history.clear()
+    def get_chat_data(self):
+        return {
+            "system_message": self.system_message_widget.get("1.0", tk.END).strip(),
+            "chat_history": [self.read_message(message) for message in self.transcript.messages],
+            "model": self.model_var.get()
+        }
 
     def save_chat_history(self):
         filename = self.chat_filename_var.get()
-        chat_data = {
-            "system_message": self.system_message_widget.get("1.0", tk.END).strip(),
-            "chat_history": [
-                {
-                    "role": message["role"].get(),
-                    "content": message["content_widget"].get("1.0", tk.END).strip()
-                }
-                for message in self.chat_history
-            ]
-        }
+        chat_data = self.get_chat_data()
 
         if filename == "<new-log>":
-            # Get a file name suggestion from the API
-            suggested_filename = self.request_file_name()
+            # Use the best suggestion made so far rather than waiting for the naming model
+            suggested_filename = self.file_namer.best_name()
+            # .jsonl logs are saved incrementally from then on; .json is the older format, rewritten on every save
             file_path = filedialog.asksaveasfilename(
-                defaultextension=".json", initialdir="chat_logs", initialfile=suggested_filename, title="Save Chat Log",
-                filetypes=[("JSON Files", "*.json"), ("All Files", "*.*")]  # Add a file type filter for JSON
+                defaultextension=".jsonl", initialdir="chat_logs", initialfile=suggested_filename, title="Save Chat Log",
+                filetypes=[("Chat Logs", "*.jsonl"), ("JSON Files", "*.json"), ("All Files", "*.*")]
             )
         else:
             file_path = os.path.join("chat_logs", filename)
+            if self.chat_log is not None and os.path.abspath(self.chat_log.path) == os.path.abspath(file_path):
+                # Every change is already in the log; write what is pending and compact it
+                self.sync_chat_log()
+                self.chat_log.compact()
+                self.update_chat_file_dropdown(file_path)
+                return
             # Check for overwrite confirmation
             if not messagebox.askokcancel("Overwrite Confirmation", f"Do you want to overwrite '{filename}'?"):
                 return
@@ -291,53 +332,80 @@ class ChatWindow:
         if not file_path:
             return
 
-        with open(file_path, "w", encoding='utf-8') as f:
-            json.dump(chat_data, f, indent=4)
+        self.detach_chat_log()
+        if is_append_log(file_path):
+            log = AppendLog.create(file_path, chat_data)
+            for message, message_id in zip(self.transcript.messages, log.messages):
+                message.log_id = message_id
+            self.chat_log = log
+        else:
+            write_chat_log(file_path, chat_data)
 
         self.update_chat_file_dropdown(file_path)
 
+    # Append-only chat logs
+
+    def on_system_message_edit(self, event=None):
+        self.token_meter.update("system", self.read_system_message)
+        self.on_conversation_changed()
+
+    def on_conversation_changed(self, message=None):
+        """Called for every change to the conversation, with the message that changed if there is one."""
+        self.autosave.mark_dirty()
+        self.schedule_log_sync(message)
+
+    def schedule_log_sync(self, message=None):
+        """Append `message` (and any reordering or deletions) to the open chat log after a short delay."""
+        if self.chat_log is None:
+            return
+        if message is not None:
+            self.log_dirty.add(message)
+        if self.log_sync_id is None:
+            self.log_sync_id = self.app.after(CHAT_LOG_SYNC_MS, self.sync_chat_log)
+
+    def sync_chat_log(self):
+        if self.log_sync_id is not None:
+            self.app.after_cancel(self.log_sync_id)
+            self.log_sync_id = None
+        log = self.chat_log
+        if log is None:
+            self.log_dirty.clear()
+            return
+        log.set_system_message(self.read_system_message()["content"])
+        log.set_model(self.model_var.get())
+        messages = self.transcript.messages
+        for message in self.log_dirty:
+            if message.index >= len(messages) or messages[message.index] is not message:
+                continue # deleted since it changed
+            if message.log_id is None:
+                message.log_id = log.new_id()
+            log.put(message.log_id, message.role, self.read_message(message)["content"])
+        self.log_dirty.clear()
+        log.set_order([message.log_id for message in messages if message.log_id is not None])
+        log.maybe_compact()
+        chat_log_index.schedule_update(log.path)
+
+    def detach_chat_log(self):
+        """Write pending changes to the open chat log and close it."""
+        if self.chat_log is None:
+            return
+        self.sync_chat_log()
+        self.chat_log.close()
+        chat_log_index.schedule_update(self.chat_log.path, delay=0)
+        self.chat_log = None
+
+    def read_system_message(self):
+        return {"role": "system", "content": self.system_message_widget.get("1.0", tk.END).strip()}
+
+    def read_message(self, message):
+        return {"role": message.role, "content": self.transcript.content(message).strip()}
+
     def get_messages_from_chat_history(self):
-        messages = [
-            {"role": "system", "content": self.system_message_widget.get("1.0", tk.END).strip()}
-        ]
-        for message in self.chat_history:
-            messages.append(
-                {
-                    "role": message["role"].get(),
-                    "content": message["content_widget"].get("1.0", tk.END).strip()
-                }
-            )
+        messages = [self.read_system_message()]
+        for message in self.transcript.messages:
+            messages.append(self.read_message(message))
         return messages
 
-    def request_file_name(self):
-        if not self.file_naming_model_var.get() or self.openai_client is None:
-            return "chat_log.json"
-        file_naming_model = self.file_naming_model_var.get()
-        # add to messages a system message informing the AI to create a title
-        messages = self.get_messages_from_chat_history()
-        # trim messages if they exceed the token limit
-        num_tokens = count_tokens(messages, file_naming_model)
-        num_messages = len(messages)
-        if num_tokens > 3500:
-            ratio = 3500 / num_tokens
-            for i in range(num_messages):
-                if i < 0:
-                    break
-                tokens = convert_text_to_tokens(messages[i]["content"], file_naming_model)
-                messages[i]["content"] = convert_tokens_to_text(tokens[:int(ratio * len(tokens))], file_naming_model)
-        # get completion
-        messages.append(
-            {
-                "role": "system",
-                "content": file_naming_prompt
-            }
-        )
-        print("requesting file name using ", count_tokens(messages, file_naming_model), f"tokens and {file_naming_model} model.")
-        response = self.openai_client.chat.completions.create(model=file_naming_model, messages=messages)
-        # return the filename
-        suggested_filename = response.choices[0].message.content.strip()
-        return suggested_filename
-
     def check_token_limits(self, messages):
         model = self.model_var.get()
         model_max_context_window = MODEL_INFO[model]["max_tokens"] if model in MODEL_INFO else 128000
@@ -354,162 +422,159 @@ class ChatWindow:
 
     def submit_chat_request(self):
         messages = self.get_messages_from_chat_history()
-        if not self.check_token_limits(messages):
+        if self.config.get("app", "context_strategy", fallback="off") == "off" and not self.check_token_limits(messages):
             return
-        messages, anthropic_system_message = convert_messages_for_model(self.model_var.get(), messages, self.image_detail_var.get())
-        # send request
-        def request_thread():
-            model_name = self.model_var.get()
-            if model_name in ANTHROPIC_MODELS:
-                self.stream_anthropic_model_output(messages, anthropic_system_message)
-            elif model_name in GOOGLE_MODELS:
-                self.stream_google_model_output(messages)
-            else:
-                self.stream_openai_model_output(messages)
-        self.is_streaming_cancelled = False
+        model_name = self.model_var.get()
+        temperature = self.temperature_var.get()
+        max_tokens = self.max_length_var.get()
+        image_detail = self.image_detail_var.get()
+        # send request on the shared event loop
+        request = self.send_chat_request(messages, model_name, image_detail, temperature, max_tokens, self.stream_renderer)
         self.set_submit_button(False)
-        Thread(target=request_thread).start()
-
-    def stream_openai_model_output(self, messages):
-        async def streaming_chat_completion():
-            if self.model_var.get() in OPENAI_MODELS:
-                streaming_client = self.openai_aclient
-                if not streaming_client:
-                    self.show_error_popup("OpenAI API not installed. Please install the 'openai' package with the `pip install openai` command.")
-                    return
-            else:
-                streaming_client = next((server.client for server in self.custom_servers if self.model_var.get() in server.models), None)
-                if len(self.custom_servers) > 0 and self.custom_servers[0].client is None:
-                    self.show_error_popup("OpenAI package not found, custom servers will be disabled! Install the OpenAI API with `pip install openai`")
-                    return
-                elif not streaming_client:
-                    error_message = f"Model {self.model_var.get()} not found in custom servers."
-                    self.show_error_popup(error_message)
-                    return
-            try:
-                response = streaming_client.chat.completions.create(model=self.model_var.get(),
-                    messages=messages,
-                    temperature=self.temperature_var.get(),
-                    max_tokens=self.max_length_var.get(),
-                    # top_p=1,
-                    # frequency_penalty=0,
-                    # presence_penalty=0,
-                    stream=True)
-            except Exception as e:
-                error_message = f"An error occurred: {e}"
-                loop.call_soon_threadsafe(self.show_error_popup, error_message)
-                return
-            try:
-                async for chunk in await response:
-                    content = chunk.choices[0].delta.content
-                    if content is not None:
-                        self.app.after(0, self.add_to_last_message, content)
-                    if self.is_streaming_cancelled:
-                        break
-            except Exception as e:
-                if "Incorrect API key" in str(e):
-                    error_message = "API key is incorrect, please configure it in the settings."
-                    loop.call_soon_threadsafe(self.show_error_and_open_settings, error_message)
-                elif "No such organization" in str(e):
-                    error_message = "Organization not found, please configure it in the settings."
-                    loop.call_soon_threadsafe(self.show_error_and_open_settings, error_message)
-                else:
-                    error_message = f"An unexpected error occurred: {e}"
-                    loop.call_soon_threadsafe(self.show_error_popup, error_message)
-            finally:
-                response.close()
-                print("Closed response")
-            if not self.is_streaming_cancelled:
-                self.app.after(0, self.add_empty_user_message)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(streaming_chat_completion())
-
-    def stream_anthropic_model_output(self, messages, system_message):
-        if self.config.get("anthropic", "api_key", fallback="") == "":
-            error_message = "Anthropic API key is not configured. Please configure it in the settings."
-            self.show_error_and_open_settings(error_message)
-            return
-        if not self.anthropic_client:
-            error_message = "Anthropic API not installed. Please install the 'anthropic' package with the `pip install anthropic` command."
-            self.show_error_popup(error_message)
-            return
-        async def streaming_anthropic_chat_completion():
-            with self.anthropic_client.messages.stream(
-                    model=self.model_var.get(),
-                    max_tokens=min(self.max_length_var.get(), 4000), # 4000 is the max tokens for anthropic
-                    messages=messages,
-                    system=system_message.strip(),
-                    temperature=self.temperature_var.get()
-                ) as stream:
-                try:
-                    for text in stream.text_stream:
-                        self.app.after(0, self.add_to_last_message, text)
-                        if self.is_streaming_cancelled:
-                            break
-                except Exception as e:
-                    error_message = f"An unexpected error occurred: {e}"
-                    loop.call_soon_threadsafe(self.show_error_popup, error_message)
-                finally:
-                    stream.close()
-            if not self.is_streaming_cancelled:
-                self.app.after(0, self.add_empty_user_message)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(streaming_anthropic_chat_completion())
-
-    def stream_google_model_output(self, messages):
-        if self.config.get("google", "api_key", fallback="") == "":
-            error_message = "Google API key is not configured. Please configure it in the settings."
-            self.show_error_and_open_settings(error_message)
-            return
+        generation = self.stream_renderer.start()
+        self.current_request = self.async_worker.submit(request)
+        self.current_request.add_done_callback(lambda future: self.stream_renderer.call(self.on_streaming_finished, generation, future))
+
+    async def send_chat_request(self, messages, model_name, image_detail, temperature, max_tokens, output):
+        """Stream a reply from `model_name`. Deltas go to output.push(), UI callbacks to output.call()."""
+        # Converting may probe image URLs over the network, so keep it off the UI thread
+        loop = asyncio.get_event_loop()
+        metrics = RequestMetrics()
+        messages = await self.fit_context(messages, model_name, max_tokens, output)
+        messages, anthropic_system_message = await loop.run_in_executor(None, self.convert_messages, model_name, messages, image_detail)
+        if self.config.getboolean("app", "response_cache", fallback=False):
+            cache_key = response_cache.key(model_name, messages, anthropic_system_message, temperature, max_tokens)
+            chunks = await loop.run_in_executor(None, response_cache.get, cache_key)
+            if chunks is not None:
+                # Replay the cached reply through the same output a live response uses
+                for chunk in chunks:
+                    output.push(chunk)
+                return True
+            recording = RecordingOutput(output)
+            if await self.stream_model_output(messages, anthropic_system_message, model_name, temperature, max_tokens, recording, metrics):
+                await loop.run_in_executor(None, response_cache.put, cache_key, model_name, recording.chunks)
+                return True
+            return False
+        return await self.stream_model_output(messages, anthropic_system_message, model_name, temperature, max_tokens, output, metrics)
+
+    async def fit_context(self, messages, model_name, max_tokens, output):
+        """Trim a conversation that is too long for the model with the strategy picked in the settings."""
+        strategy = self.config.get("app", "context_strategy", fallback="off")
         try:
-            import google.generativeai as genai
-        except:
-            error_message = "Google GenerativeAI API not installed. If you wish to use Google Gemini models, install the 'google-generativeai' package with the `pip install google-generativeai` command."
-            self.show_error_popup(error_message)
+            keep_last = int(self.config.get("app", "context_keep_last", fallback=DEFAULT_CONTEXT_KEEP_LAST))
+        except ValueError:
+            keep_last = DEFAULT_CONTEXT_KEEP_LAST
+        summary_model = self.config.get("app", "summary_model", fallback=DEFAULT_SUMMARY_MODEL)
+        messages, dropped = await self.context_manager.fit(messages, model_name, max_tokens, strategy, keep_last, summary_model, output)
+        if dropped:
+            print(f"Context: {'summarized' if strategy == 'summarize' else 'dropped'} {dropped} older messages to fit {model_name}'s context window")
+        return messages
+
+    async def complete_messages(self, messages, model, max_tokens, output):
+        """Return the reply of any model to `messages` as text, for summaries and file names. None if the request failed."""
+        loop = asyncio.get_event_loop()
+        metrics = RequestMetrics()
+        messages, anthropic_system_message = await loop.run_in_executor(None, self.convert_messages, model, messages)
+        collected = CollectingOutput(output)
+        if await self.stream_model_output(messages, anthropic_system_message, model, 0, max_tokens, collected, metrics):
+            return collected.text().strip()
+        return None
+
+    async def stream_model_output(self, messages, anthropic_system_message, model_name, temperature, max_tokens, output, metrics=None):
+        """Stream a reply in the provider's message format to output.push(). Returns False if it failed.
+
+        Its timings are stored in the metrics database; `metrics` is passed in to count the time spent preparing the request.
+        """
+        adapter = self.get_provider(model_name, output)
+        if adapter is None:
+            return False
+        metrics = metrics or RequestMetrics()
+        usage = {}
+        try:
+            async for text in adapter.stream(model_name, messages, anthropic_system_message, temperature, max_tokens, usage, metrics):
+                output.push(text)
+        except asyncio.CancelledError:
+            self.record_metrics(metrics, "cancelled")
+            raise
+        except Exception as e:
+            self.record_metrics(metrics, "error", f"{type(e).__name__}: {e}")
+            if "Incorrect API key" in str(e):
+                output.call(self.show_error_and_open_settings, "API key is incorrect, please configure it in the settings.")
+            elif "No such organization" in str(e):
+                output.call(self.show_error_and_open_settings, "Organization not found, please configure it in the settings.")
+            else:
+                output.call(self.show_error_popup, f"An unexpected error occurred: {e}")
+            return False
+        self.record_metrics(metrics, "ok", usage=usage or None)
+        output.set_usage(usage or None)
+        return True
+
+    def record_metrics(self, metrics, status, error=None, usage=None):
+        metrics.finish(status, error, usage)
+        # Written on a worker thread; not awaited, so a cancelled request is recorded too
+        asyncio.get_event_loop().run_in_executor(None, metrics_store.record, metrics)
+
+    def open_fan_out_window(self):
+        # The same conversation Submit would send, to every model picked in the window
+        messages = self.get_messages_from_chat_history()
+        FanOutWindow(self, messages, self.temperature_var.get(), self.max_length_var.get(), self.image_detail_var.get())
+
+    def on_streaming_finished(self, generation, future):
+        if generation != self.stream_renderer.generation:
+            return # a newer request has taken over the renderer
+        self.stream_renderer.stop()
+        self.current_request = None
+        stats = self.stream_renderer.stats()
+        if stats["tokens_rendered"]:
+            print(f"Rendered {stats['tokens_rendered']} tokens in {stats['widget_inserts']} inserts "
+                  f"({stats['tokens_per_second']:.1f} tokens/s)")
+        if future.cancelled():
             return
-        async def streaming_google_chat_completion():
-            try:
-                google_model = genai.GenerativeModel(self.model_var.get(), 
-                                    generation_config={"temperature": self.temperature_var.get(), 
-                                                        "max_output_tokens": self.max_length_var.get()})
-                response = google_model.generate_content(messages, stream=True)
-            except Exception as e:
-                error_message = "Error: " + str(e)
-                self.show_error_popup(error_message)
-                return
-            try:
-                for chunk in response:
-                    self.app.after(0, self.add_to_last_message, chunk.parts[0].text)
-                    if self.is_streaming_cancelled:
-                        break
-            except Exception as e:
-                error_message = f"An unexpected error occurred: {e}"
-                loop.call_soon_threadsafe(self.show_error_popup, error_message)
-            finally:
-                response.resolve()
-            if not self.is_streaming_cancelled:
-                self.app.after(0, self.add_empty_user_message)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(streaming_google_chat_completion())
+        if future.exception() is not None:
+            self.show_error_popup(f"An unexpected error occurred: {future.exception()}")
+            self.set_submit_button(True)
+        elif future.result():
+            # Replies replayed from the response cache have no usage, which clears the last one
+            self.token_meter.set_last_usage(self.model_var.get(), self.stream_renderer.usage)
+            self.add_empty_user_message()
+            self.file_namer.schedule()
+        else:
+            self.set_submit_button(True)
+
+    def convert_messages(self, model, messages, image_detail="low"):
+        """Convert to the message format of the provider serving `model`. Returns (messages, system_message)."""
+        adapter = self.providers.resolve(model)
+        if adapter is None:
+            return messages, None
+        return adapter.convert_messages(model, messages, image_detail)
+
+    def get_provider(self, model, output):
+        """Return the adapter serving `model`, or None after telling the user what is missing."""
+        adapter = self.providers.resolve(model)
+        if adapter is None:
+            output.call(self.show_error_popup, f"Model {model} not found in custom servers.")
+            return None
+        if not adapter.has_api_key():
+            output.call(self.show_error_and_open_settings, f"{adapter.label} API key is not configured. Please configure it in the settings.")
+            return None
+        if adapter.get_client() is None:
+            output.call(self.show_error_popup, adapter.install_message)
+            return None
+        return adapter
 
     def update_chat_file_dropdown(self, new_file_path):
-        # Refresh the list of chat files from the directory
-        self.chat_files = sorted(
-            [f for f in os.listdir("chat_logs") if os.path.isfile(os.path.join("chat_logs", f)) and f.endswith('.json')],
-            key=lambda x: os.path.getmtime(os.path.join("chat_logs", x)),
-            reverse=True
-        )
-
+        # Index the saved file, then refresh the list of recent chat files from the index
+        chat_log_index.update_file(new_file_path)
         new_file_name = os.path.basename(new_file_path)
+        self.chat_filename_var.set(new_file_name)  # Select the newly created log
+        self.populate_chat_file_dropdown(new_file_name)
 
-        # Check if the new file name is already in the list of chat files
-        if new_file_name not in self.chat_files:
-            self.chat_files.insert(0, new_file_name)  # Insert the file at the beginning if it's not there
+    def populate_chat_file_dropdown(self, selected_file_name=None):
+        self.chat_files = chat_log_index.recent_names(RECENT_CHAT_LOGS_IN_DROPDOWN)
 
-        self.chat_filename_var.set(new_file_name)  # Select the newly created log
+        # Check if the selected file name is already in the list of chat files
+        if selected_file_name and selected_file_name != "<new-log>" and selected_file_name not in self.chat_files:
+            self.chat_files.insert(0, selected_file_name)  # Insert the file at the beginning if it's not there
 
         # Clear and repopulate the dropdown menu with the refreshed list of files
         menu = self.chat_file_dropdown["menu"]
@@ -518,17 +583,55 @@ class ChatWindow:
         for file in self.chat_files:
             menu.add_command(label=file, command=lambda value=file: self.chat_filename_var.set(value))
 
+    def refresh_chat_log_index(self):
+        # Only files whose mtime changed are re-read, on a background thread
+        refresh_thread = Thread(target=chat_log_index.refresh, daemon=True)
+        refresh_thread.start()
+        self.app.after(100, self.on_chat_log_index_refreshing, refresh_thread)
+
+    def on_chat_log_index_refreshing(self, refresh_thread):
+        if refresh_thread.is_alive():
+            self.app.after(100, self.on_chat_log_index_refreshing, refresh_thread)
+            return
+        self.populate_chat_file_dropdown(self.chat_filename_var.get())
+
+    def open_metrics_window(self):
+        MetricsWindow(self.app, metrics_store)
+
+    def open_log_picker(self):
+        LogPicker(self.app, chat_log_index, self.load_chat_history_by_name)
+
+    def load_chat_history_by_name(self, filename, position=None):
+        self.chat_filename_var.set(filename)
+        self.load_chat_history()
+        if position:
+            # Wait for the message heights to settle before scrolling to the search match
+            self.app.after(150, self.scroll_to_message, position)
+
+    def scroll_to_message(self, position):
+        if 0 < position <= len(self.transcript.messages):
+            self.transcript.scroll_to(position - 1)
+
     def update_models_dropdown(self):
         # Update the model dropdown menu with available models
         current_model = self.model_var.get()
-        anthropic_models = ANTHROPIC_MODELS if "anthropic" in sys.modules and self.anthropic_apikey_var.get() else []
-        google_models = GOOGLE_MODELS if "google.generativeai" in sys.modules and self.google_apikey_var.get() else []
-        openai_models = OPENAI_MODELS if "openai" in sys.modules and self.openai_apikey_var.get() else []
+        anthropic_models = ANTHROPIC_MODELS if self.anthropic_apikey_var.get() and is_installed("anthropic") else []
+        google_models = GOOGLE_MODELS if self.google_apikey_var.get() and is_installed("google.generativeai") else []
+        openai_models = OPENAI_MODELS if self.openai_apikey_var.get() and is_installed("openai") else []
         custom_models = [model for server in self.custom_servers for model in server.models]
         possible_models = [*openai_models, *anthropic_models, *google_models, *custom_models]
-        ttk.OptionMenu(self.main_frame, self.model_var, current_model, *possible_models).grid(row=0, column=7, sticky="nw")
+        self.available_models = possible_models
+        # Only rebuild the menu when the list of models (or where the separators go) actually changed
+        dropdown_key = (tuple(openai_models), tuple(anthropic_models), tuple(google_models), tuple(tuple(server.models) for server in self.custom_servers))
+        if dropdown_key == getattr(self, "dropdown_key", None):
+            return
+        self.dropdown_key = dropdown_key
+        if getattr(self, "model_dropdown", None) is not None:
+            self.model_dropdown.destroy()
+        self.model_dropdown = ttk.OptionMenu(self.main_frame, self.model_var, current_model, *possible_models)
+        self.model_dropdown.grid(row=0, column=7, sticky="nw")
         # add separators to the dropdown menu
-        dropdown_menu = self.main_frame.winfo_children()[len(self.main_frame.children)-1]['menu']
+        dropdown_menu = self.model_dropdown['menu']
         sep = -1
         if openai_models:
             sep+=len(openai_models)+1
@@ -546,44 +649,66 @@ class ChatWindow:
     def load_chat_history(self):
         filename = self.chat_filename_var.get()
 
+        self.detach_chat_log()
         if not filename or filename == "<new-log>":
             self.clear_chat_history()
             self.system_message_widget.delete("1.0", tk.END)
             self.system_message_widget.insert(tk.END, SYSTEM_MESSAGE_DEFAULT_TEXT)
+            self.token_meter.update("system", self.read_system_message)
             self.add_message("user", "")
             return
 
         filepath = os.path.join("chat_logs", filename)
-        if os.path.exists(filepath) and filepath.endswith('.json'):
-            with open(filepath, "r", encoding='utf-8') as f:
-                chat_data = json.load(f)
-
-            self.clear_chat_history()
-
-            system_message = chat_data["system_message"]
-            self.system_message_widget.delete("1.0", tk.END)
-            self.system_message_widget.insert(tk.END, system_message)
-
-            for entry in chat_data["chat_history"]:
-                self.add_message(entry["role"], entry["content"])
-
-        self.app.after(100, self.update_height_of_all_messages)
-
-
-    def update_height_of_all_messages(self):
-        for message in self.chat_history:
-            self.update_content_height(None, message["content_widget"])
+        if os.path.exists(filepath) and filepath.endswith(('.json', '.jsonl')):
+            log = AppendLog.open(filepath) if is_append_log(filepath) else None
+            chat_data = log.chat_data() if log is not None else read_chat_log(filepath)
+
+            self.show_chat_data(chat_data)
+            if log is not None:
+                for message, message_id in zip(self.transcript.messages, log.messages):
+                    message.log_id = message_id
+                self.chat_log = log
+            self.file_namer.reset()
+            self.file_namer.schedule()
+
+    def show_chat_data(self, chat_data):
+        """Replace the conversation with a {"system_message", "chat_history"} log."""
+        self.clear_chat_history()
+
+        system_message = chat_data["system_message"]
+        self.system_message_widget.delete("1.0", tk.END)
+        self.system_message_widget.insert(tk.END, system_message)
+        self.token_meter.update("system", self.read_system_message)
+
+        for entry in chat_data["chat_history"]:
+            self.add_message(entry["role"], entry["content"])
+
+    def offer_autosave_restore(self):
+        """If the last session didn't close properly, offer to restore its latest autosave."""
+        path = self.autosave.find_unclosed_session_snapshot()
+        if path is None:
+            return
+        try:
+            chat_data = read_snapshot(path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read the autosave '{path}': {e}")
+            return
+        messages = len(chat_data["chat_history"])
+        if messagebox.askyesno("Restore Autosave", f"The last session did not close properly. Restore its autosaved chat ({messages} messages)?"):
+            self.chat_filename_var.set("<new-log>")
+            self.detach_chat_log()
+            self.show_chat_data(chat_data)
 
     def add_to_last_message(self, content):
-        last_message = self.chat_history[-1]
-        if last_message["role"].get() == "assistant":
-            last_message["content_widget"].insert(tk.END, content)
-            self.update_content_height(None, last_message["content_widget"])
+        messages = self.transcript.messages
+        if messages and messages[-1].role == "assistant":
+            self.transcript.append_text(messages[-1], content)
+            self.track_message_tokens(messages[-1])
         else:
             self.add_message("assistant", content)
 
     def cancel_streaming(self):
-        self.is_streaming_cancelled = True
+        self.async_worker.cancel(self.current_request)
         self.set_submit_button(True)
 
     def add_empty_user_message(self):
@@ -604,76 +729,42 @@ class ChatWindow:
         # Calculate the new width of the Text widgets based on the window width
         new_entry_width = int((window_width - scaling_factor*1000) * scaling_factor)
 
-        for message in self.chat_history:
-            message["content_widget"].configure(width=new_entry_width)
-
-
-    def update_content_height(self, event, content_widget):
-        lines = content_widget.get("1.0", "end-1c").split("\n")
-        widget_width = int(content_widget["width"])
-        wrapped_lines = 0
-        for line in lines:
-            if line == "":
-                wrapped_lines += 1
-            else:
-                line_length = len(line)
-                wrapped_lines += -(-line_length // widget_width)  # Equivalent to math.ceil(line_length / widget_width)
-        content_widget.configure(height=wrapped_lines)
+        self.transcript.set_char_width(new_entry_width)
 
     def add_message(self, role="user", content=""):
-        message = {
-            "role": tk.StringVar(value=role),
-            "content": tk.StringVar(value=content)
-        }
-        self.chat_history.append(message)
-
-        row = len(self.chat_history)
-        message["role_button"] = ttk.Button(self.inner_frame, textvariable=message["role"], command=lambda: self.toggle_role(message), width=8)
-        message["role_button"].grid(row=row, column=0, sticky="nw")
-        message["content_widget"] = tk.Text(self.inner_frame, wrap=tk.WORD, height=1, width=50, undo=True)
-        message["content_widget"].grid(row=row, column=1, sticky="we")
-        message["content_widget"].insert(tk.END, content)
-        message["content_widget"].bind("<KeyRelease>", lambda event, content_widget=message["content_widget"]: self.update_content_height(event, content_widget))
-        self.update_content_height(None, message["content_widget"])
-
-        self.add_button_row += 1
-        self.align_add_button()
-
-        message["delete_button"] = ttk.Button(self.inner_frame, text="-", width=3, command=lambda: self.delete_message(row))
-        message["delete_button"].grid(row=row, column=2, sticky="ne")
+        message = self.transcript.append(role, content)
+        self.track_message_tokens(message)
+        self.transcript.scroll_to_end()
 
-        self.chat_frame.yview_moveto(1.5)
-
-    def align_add_button(self):
-        self.add_button.grid(row=self.add_button_row, column=0, sticky="e", pady=(5, 0))
-        self.add_button_label.grid(row=self.add_button_row, column=1, sticky="sw")
-
-    def delete_message(self, row):
-        for widget in self.inner_frame.grid_slaves():
-            if int(widget.grid_info()["row"]) == row:
-                widget.destroy()
-
-        del self.chat_history[row - 1]
+    def insert_message(self, index, role="user", content=""):
+        message = self.transcript.insert(index, role, content)
+        self.track_message_tokens(message)
+        self.cancel_streaming()
 
-        for i, message in enumerate(self.chat_history[row - 1:], start=row):
-            for widget in self.inner_frame.grid_slaves():
-                if int(widget.grid_info()["row"]) == i + 1:
-                    widget.grid(row=i)
+    def move_message(self, message, index):
+        self.transcript.move(message, index)
+        self.on_conversation_changed()
+        self.cancel_streaming()
 
-            message["delete_button"].config(command=lambda row=i: self.delete_message(row))
+    def track_message_tokens(self, message):
+        self.token_meter.update(message.key, lambda: self.read_message(message))
+        self.on_conversation_changed(message)
 
-        self.add_button_row -= 1
-        self.align_add_button()
+    def delete_message(self, message):
+        self.token_meter.remove(message.key)
+        self.transcript.remove(message)
+        self.on_conversation_changed()
         self.cancel_streaming()
 
     def toggle_role(self, message):
-        current_role = message["role"].get()
+        current_role = message.role
         if current_role == "user":
-            message["role"].set("assistant")
+            self.transcript.set_role(message, "assistant")
         elif current_role == "assistant":
-            message["role"].set("system")
+            self.transcript.set_role(message, "system")
         else:
-            message["role"].set("user")
+            self.transcript.set_role(message, "user")
+        self.track_message_tokens(message)
 
     def set_submit_button(self, active):
         if active:
@@ -683,11 +774,13 @@ class ChatWindow:
             self.submit_button_text.set("Cancel")
             self.submit_button.configure(command=self.cancel_streaming)
 
-    def configure_scrollregion(self, event):
-        self.chat_frame.configure(scrollregion=self.chat_frame.bbox("all"))
+    def on_chat_scroll(self, first, last):
+        self.chat_scroll.set(first, last)
+        self.transcript.on_scroll()
 
     def add_message_via_button(self):
-        self.add_message("user" if len(self.chat_history) == 0 or self.chat_history[-1]["role"].get() == "assistant" else "assistant", "")
+        messages = self.transcript.messages
+        self.add_message("user" if len(messages) == 0 or messages[-1].role == "assistant" else "assistant", "")
 
     def update_image_detail_visibility(self, *args):
         if self.model_var.get() in OPENAI_VISION_MODELS:
@@ -717,45 +810,18 @@ class ChatWindow:
             self.max_len_entry_var.set(self.max_length_var.get())
 
     def on_close(self):
-        # Generate a timestamp string with the format "YYYYMMDD_HHMMSS"
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # Generate a random 6-character alphanumeric ID
-        random_id = ''.join(random.choices(string.ascii_letters + string.digits, k=6))
-        # Combine the timestamp and random ID to create the filename
-        filename = f"{timestamp}_{random_id}.json"
-
-        # Create the 'temp/backup/' directory if it doesn't exist
-        backup_path = "temp/backup"
-        if not os.path.exists(backup_path):
-            os.makedirs(backup_path)
-
-        # Construct the full file path
-        file_path = os.path.join(backup_path, filename)
-
-        # Get the chat history data
-        chat_data = {
-            "system_message": self.system_message_widget.get("1.0", tk.END).strip(),
-            "chat_history": [
-                {
-                    "role": message["role"].get(),
-                    "content": message["content_widget"].get("1.0", tk.END).strip()
-                }
-                for message in self.chat_history
-            ]
-        }
-
-        # Save the chat history to the file
-        with open(file_path, "w", encoding='utf-8') as f:
-            json.dump(chat_data, f, indent=4)
+        # Final snapshot of the conversation; it is only written if something changed since the last one
+        self.autosave.close()
 
         # Save the last used model
-        self.config.read("config.ini")
-        self.config.set("app", "last_used_model", self.model_var.get())
-        self.config.set("app", "last_used_temperature", str(self.temperature_var.get()))
-        with open("config.ini", "w") as config_file:
-            self.config.write(config_file)
+        self.config_store.set("app", "last_used_model", self.model_var.get())
+        self.config_store.set("app", "last_used_temperature", str(self.temperature_var.get()))
+        self.config_store.flush()
 
         # Close the application
+        self.detach_chat_log()
+        self.token_meter.shutdown()
+        self.file_namer.shutdown()
         self.app.destroy()
 
     def show_error_popup(self, message):
@@ -791,12 +857,9 @@ class ChatWindow:
 
         if model in OPENAI_VISION_MODELS:
             # Count the number of images in the messages
-            num_images = 0
-            parsed_messages = [parse_and_create_image_messages(message.get("content",""), self.image_detail_var.get()) for message in messages]
-            for message in parsed_messages:
-                for content in message["content"]:
-                    if "image_url" in content.get("type", ""):
-                        num_images+=1
+            urls = [url for message in messages for url in find_urls(message.get("content",""))]
+            image_urls = url_classifier.image_urls(urls)
+            num_images = sum(1 for url in urls if url in image_urls)
 
             # Calculate vision cost if the model is vision preview
             vision_cost = 0
@@ -814,37 +877,25 @@ class ChatWindow:
         self.save_api_key()
 
     def save_api_key(self):
-        if self.openai_apikey_var.get() != "":
-            self.config.set("openai", "api_key", self.openai_apikey_var.get())
-            self.config.set("openai", "organization", self.openai_orgid_var.get())
-            self.setup_openai_client()
-        if self.anthropic_apikey_var.get() != "":
-            self.config.set("anthropic", "api_key", self.anthropic_apikey_var.get())
-            self.setup_anthropic_client()
-        if self.google_apikey_var.get() != "":
-            self.config.set("google", "api_key", self.google_apikey_var.get())
-            self.setup_google_client()
+        # Only updates the in-memory config; the store writes config.ini once the typing stops
+        self.config_store.set("openai", "api_key", self.openai_apikey_var.get())
+        self.config_store.set("openai", "organization", self.openai_orgid_var.get())
+        self.config_store.set("anthropic", "api_key", self.anthropic_apikey_var.get())
+        self.config_store.set("google", "api_key", self.google_apikey_var.get())
         for i, custom_server in enumerate(self.custom_servers):
-            if not self.config.has_section(f"custom_server_{i}"):
-                self.config.add_section(f"custom_server_{i}")
+            self.config_store.ensure_section(f"custom_server_{i}")
             if custom_server.baseurl_var.get() != "":
-                custom_server.update_client()
-                self.config.set(f"custom_server_{i}", "base_url", str(custom_server.baseurl_var.get()))
-                self.config.set(f"custom_server_{i}", "api_key", str(custom_server.apikey_var.get()))
+                self.config_store.set(f"custom_server_{i}", "base_url", str(custom_server.baseurl_var.get()))
+                self.config_store.set(f"custom_server_{i}", "api_key", str(custom_server.apikey_var.get()))
             if custom_server.models_var.get() != "":
                 custom_server.update_models()
-                self.config.set(f"custom_server_{i}", "models", custom_server.models_var.get())
+                self.config_store.set(f"custom_server_{i}", "models", custom_server.models_var.get())
 
-        self.config.set("app", "file_naming_model", self.file_naming_model_var.get())
+        self.update_provider_registry()
         self.update_models_dropdown()
 
-        with open("config.ini", "w") as config_file:
-            self.config.write(config_file)
-
     def save_dark_mode_state(self):
-        self.config.set("app", "dark_mode", str(self.dark_mode_var.get()))
-        with open("config.ini", "w") as f:
-            self.config.write(f)
+        self.config_store.set("app", "dark_mode", str(self.dark_mode_var.get()))
 
     def load_dark_mode_state(self):
         return self.config.getboolean("app", "dark_mode", fallback=False)
@@ -855,7 +906,7 @@ class ChatWindow:
             self.main_frame.configure(style="Dark.TFrame")
             self.configuration_frame.configure(style="Dark.TFrame")
             self.chat_frame.configure(bg="#2c2c2c") # Change chat_frame background color
-            self.inner_frame.configure(style="Dark.TFrame")
+            self.transcript.set_frame_style("Dark.TFrame")
 
             for widget in self.main_frame.winfo_children():
                 if isinstance(widget, (ttk.Label, ttk.OptionMenu, ttk.Checkbutton)):
@@ -873,7 +924,7 @@ class ChatWindow:
             self.main_frame.configure(style="")
             self.configuration_frame.configure(style="")
             self.chat_frame.configure(bg=self.default_bg_color) # Reset chat_frame background color
-            self.inner_frame.configure(style="")
+            self.transcript.set_frame_style("")
 
             for widget in self.main_frame.winfo_children():
                 if isinstance(widget, (ttk.Label, ttk.Button, ttk.OptionMenu, ttk.Checkbutton, ttk.Scrollbar)):
@@ -904,8 +955,7 @@ class ChatWindow:
         self.toggle_settings_window()
     def remove_last_custom_server(self):
         if len(self.custom_servers) > 0:
-            self.config.remove_section(f"custom_server_{len(self.custom_servers)-1}")
-            self.config.write(open("config.ini", "w"))
+            self.config_store.remove_section(f"custom_server_{len(self.custom_servers)-1}")
             self.custom_servers.pop()
         self.save_api_key()
         self.toggle_settings_window()
@@ -948,7 +998,7 @@ class ChatWindow:
         google_apikey_entry.grid(row=4, column=1, sticky="e")
 
         # Add file naming model configuration
-        ttk.Label(self.settings_frame, text="File Naming Model (OpenAI only):").grid(row=5, column=0, sticky="e")
+        ttk.Label(self.settings_frame, text="File Naming Model:").grid(row=5, column=0, sticky="e")
         file_naming_model_entry = ttk.Entry(self.settings_frame, textvariable=self.file_naming_model_var, width=60)
         file_naming_model_entry.grid(row=5, column=1, sticky="e")
 
@@ -976,6 +1026,30 @@ class ChatWindow:
         add_custom_server_button = ttk.Button(self.settings_frame, text="Add Custom Server", command=self.add_new_custom_server)
         add_custom_server_button.grid(row=cur_row+3, column=0, columnspan=1, sticky="w")
 
+        # Context window overflow
+        ttk.Separator(self.settings_frame, orient='horizontal').grid(row=92, column=0, columnspan=2, sticky="we", pady=10)
+        ttk.Label(self.settings_frame, text="When a chat is too long:").grid(row=93, column=0, sticky="e")
+        ttk.OptionMenu(self.settings_frame, self.context_strategy_var, self.context_strategy_var.get(), *CONTEXT_STRATEGIES).grid(row=93, column=1, sticky="w")
+        ttk.Label(self.settings_frame, text="Messages kept (N):").grid(row=94, column=0, sticky="e")
+        ttk.Entry(self.settings_frame, textvariable=self.context_keep_last_var, width=10).grid(row=94, column=1, sticky="w")
+        ttk.Label(self.settings_frame, text="Summary Model:").grid(row=95, column=0, sticky="e")
+        ttk.Entry(self.settings_frame, textvariable=self.summary_model_var, width=60).grid(row=95, column=1, sticky="e")
+
+        # Response cache
+        ttk.Separator(self.settings_frame, orient='horizontal').grid(row=96, column=0, columnspan=2, sticky="we", pady=10)
+        ttk.Checkbutton(self.settings_frame, text="Cache responses to identical requests", variable=self.response_cache_var).grid(row=97, column=0, sticky="w")
+        ttk.Button(self.settings_frame, text="Clear Cache", command=self.clear_response_cache).grid(row=97, column=1, sticky="e")
+        self.response_cache_status_var = tk.StringVar()
+        ttk.Label(self.settings_frame, textvariable=self.response_cache_status_var).grid(row=98, column=0, columnspan=2, sticky="w")
+        self.update_response_cache_status()
+
+        # Show diagnostics for the shared request event loop
+        worker_stats = self.async_worker.stats()
+        worker_status = (f"Requests: {worker_stats['active_tasks']} active, {worker_stats['submitted_tasks']} total "
+                         f"on {worker_stats['loops_created']} event loop(s)")
+        ttk.Label(self.settings_frame, text=worker_status).grid(row=99, column=0, sticky="w")
+        ttk.Button(self.settings_frame, text="Request Metrics", command=self.open_metrics_window).grid(row=99, column=1, sticky="e")
+
         # Add a button to close the popup
         close_button = ttk.Button(self.settings_frame, text="Close", command=self.close_settings_window)
         close_button.grid(row=100, column=0, columnspan=2, pady=10)
@@ -993,6 +1067,15 @@ class ChatWindow:
 
         self.settings_window.focus_force()
 
+    def update_response_cache_status(self):
+        stats = response_cache.stats()
+        self.response_cache_status_var.set(f"Cache: {stats['hits']} hits, {stats['misses']} misses, {stats['bytes_saved'] / 1024:.1f} KB saved "
+                                           f"({stats['entries']} replies, {stats['bytes'] / 1024:.1f} KB stored)")
+
+    def clear_response_cache(self):
+        response_cache.clear()
+        self.update_response_cache_status()
+
     def on_settings_window_close(self):
         self.settings_window.destroy()
         self.settings_window = None
@@ -1034,4 +1117,4 @@ class ChatWindow:
         # Handle key press event
         if event.state == 0x0004 and event.keysym == 'n':  # 0x0004 is the mask for the Control key on Windows/Linux
             new_root = tk.Toplevel(self.app)
-            new_window = ChatWindow(new_root, self.config, self.os_name)
\ No newline at end of file
+            new_window = ChatWindow(new_root, self.config_store, self.os_name, self.async_worker)
\ No newline at end of file
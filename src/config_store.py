@@ -0,0 +1,73 @@
+import os
+from threading import Lock, Timer
+
+class ConfigStore:
+    """Batches writes of a ConfigParser to disk.
+
+    set() and remove_section() update the in-memory config immediately, so reads
+    always see the latest values. The file is only rewritten once changes stop
+    arriving for `debounce_seconds`, and always atomically (temp file + rename),
+    so typing or pasting an API key costs a single write.
+    """
+    def __init__(self, config, path="config.ini", debounce_seconds=0.5):
+        self.config = config
+        self.path = path
+        self.debounce_seconds = debounce_seconds
+        self.lock = Lock()
+        self.timer = None
+        self.dirty = False
+        self.write_count = 0
+
+    def ensure_section(self, section):
+        with self.lock:
+            if self.config.has_section(section):
+                return
+            self.config.add_section(section)
+            self.dirty = True
+        self.schedule_save()
+
+    def set(self, section, option, value):
+        with self.lock:
+            if not self.config.has_section(section):
+                self.config.add_section(section)
+            elif self.config.get(section, option, fallback=None) == value:
+                return
+            self.config.set(section, option, value)
+            self.dirty = True
+        self.schedule_save()
+
+    def remove_section(self, section):
+        with self.lock:
+            if not self.config.remove_section(section):
+                return
+            self.dirty = True
+        self.schedule_save()
+
+    def schedule_save(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = Timer(self.debounce_seconds, self.save)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def save(self):
+        with self.lock:
+            self.timer = None
+            if not self.dirty:
+                return
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                self.config.write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self.dirty = False
+            self.write_count += 1
+
+    def flush(self):
+        """Write pending changes now, e.g. before the application exits."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+        self.save()
@@ -1,6 +1,25 @@
 
 SYSTEM_MESSAGE_DEFAULT_TEXT = ""
 DEFAULT_FILE_NAMING_MODEL="gpt-3.5-turbo" # if empty, won't name files automatically
+DEFAULT_SUMMARY_MODEL = "gpt-3.5-turbo" # cheap model that summarizes older messages when a conversation outgrows the context window
+SUMMARY_MAX_TOKENS = 500 # length limit of those summaries
+DEFAULT_CONTEXT_KEEP_LAST = 10 # messages kept by the "Keep system + last N" strategy
+STREAM_RENDER_INTERVAL_MS = 25 # how often streamed text is flushed to the chat window (~40 fps)
+CHAT_LOG_SYNC_MS = 500 # how long edits to a .jsonl chat log are batched before they are appended to it
+CHAT_LOG_INDEX_DELAY = 5 # seconds a .jsonl chat log being appended to waits before it is re-indexed for search and the log list
+AUTOSAVE_INTERVAL_MS = 30000 # how often a changed conversation is snapshotted to temp/backup
+AUTOSAVE_MAX_SNAPSHOTS = 50 # retention limits of those snapshots; the newest is always kept
+AUTOSAVE_MAX_AGE_DAYS = 7
+AUTOSAVE_MAX_BYTES = 20 * 1024 * 1024
+RECENT_CHAT_LOGS_IN_DROPDOWN = 30 # older logs are reachable through the chat log browser
+DEFAULT_TOKEN_COUNT_MODEL = "gpt-4" # encoding used for logs that don't record their model
+RESPONSE_CACHE_MAX_BYTES = 50 * 1024 * 1024 # size of the opt-in response cache before the least recently used replies are evicted
+ANTHROPIC_CACHE_MIN_CHARS = 4096 # roughly the 1024 token minimum Anthropic caches a prompt prefix at
+ANTHROPIC_PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+CACHE_READ_PRICE_FACTOR = {"anthropic": 0.1, "openai": 0.5, "google": 0.25} # cached input tokens cost this fraction of the input price
+CACHE_WRITE_PRICE_FACTOR = {"anthropic": 1.25} # writing a prompt cache costs this multiple of the input price
+PROVIDER_MAX_CONNECTIONS = 8 # pooled HTTP connections per provider, kept alive between turns
+PROVIDER_KEEPALIVE_SECONDS = 300 # how long an idle pooled connection stays open
 OPENAI_MODELS = [
     "gpt-4o",
     "gpt-3.5-turbo",
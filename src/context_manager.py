@@ -0,0 +1,136 @@
+import hashlib
+import json
+from collections import OrderedDict
+from constants import MODEL_INFO, SUMMARY_MAX_TOKENS
+from prompts import summary_prompt
+from token_counter import token_counter
+
+# Strategies for a conversation that doesn't fit the model's context window, by the name shown in the settings
+CONTEXT_STRATEGIES = {
+    "Show an error": "off",
+    "Drop oldest messages": "drop_oldest",
+    "Keep system + last N": "keep_last_n",
+    "Summarize older messages": "summarize",
+}
+
+class CollectingOutput:
+    """Collects a streamed reply as text instead of showing it. UI callbacks (error popups) go to `output`, or nowhere if it is None."""
+    def __init__(self, output):
+        self.output = output
+        self.chunks = []
+
+    def push(self, text):
+        if text:
+            self.chunks.append(text)
+
+    def set_usage(self, usage):
+        pass
+
+    def call(self, func, *args):
+        if self.output is not None:
+            self.output.call(func, *args)
+
+    def text(self):
+        return "".join(self.chunks)
+
+class ContextManager:
+    """Fits a conversation into a token budget by dropping or summarizing its oldest turns.
+
+    System messages are always kept. Token counts come from the shared
+    token_counter, which memoizes them per message body, so fitting a long
+    history is a pass of dictionary lookups. Summaries are cached by a
+    running hash of the turns they cover: when the conversation grows, the
+    newly dropped turns are folded into the longest summary already made.
+    """
+    def __init__(self, summarize, max_cached_summaries=100):
+        self.summarize = summarize  # async summarize(messages, model, output) -> text, or None on failure
+        self.max_cached_summaries = max_cached_summaries
+        self.summaries = OrderedDict()
+        self.summary_requests = 0
+
+    def budget(self, model, max_tokens):
+        """Tokens available for the prompt: the context window minus the room reserved for the reply."""
+        context_window = MODEL_INFO[model]["max_tokens"] if model in MODEL_INFO else 128000
+        return context_window - int(max_tokens)
+
+    def split(self, messages, model, budget, keep_last=None):
+        """Return the system messages, the turns to drop and the turns to keep."""
+        system = [message for message in messages if message["role"] == "system"]
+        turns = [message for message in messages if message["role"] != "system"]
+        # every reply is primed with <|start|>assistant<|message|>
+        remaining = budget - 3 - sum(token_counter.count_message(message, model) for message in system)
+        start = len(turns)
+        lowest = 0 if keep_last is None else max(0, len(turns) - keep_last)
+        while start > lowest:
+            tokens = token_counter.count_message(turns[start - 1], model)
+            if tokens > remaining:
+                break
+            remaining -= tokens
+            start -= 1
+        return system, turns[:start], turns[start:]
+
+    async def fit(self, messages, model, max_tokens, strategy, keep_last=10, summary_model=None, output=None):
+        """Return `messages` trimmed to fit `model` with `max_tokens` for the reply, and the number of turns dropped."""
+        budget = self.budget(model, max_tokens)
+        if strategy == "off" or token_counter.count_messages(messages, model) <= budget:
+            return messages, 0
+        if strategy == "keep_last_n":
+            system, dropped, kept = self.split(messages, model, budget, keep_last)
+            return system + kept, len(dropped)
+        if strategy == "summarize" and summary_model:
+            # Leave room for the summary itself
+            system, dropped, kept = self.split(messages, model, budget - SUMMARY_MAX_TOKENS)
+            if dropped:
+                summary = await self.summary_of(dropped, summary_model, output)
+                if summary:
+                    summary_message = {"role": "system", "content": "Summary of the earlier conversation: " + summary}
+                    return system + [summary_message] + kept, len(dropped)
+            return system + kept, len(dropped)
+        system, dropped, kept = self.split(messages, model, budget)
+        return system + kept, len(dropped)
+
+    def chain_hashes(self, messages, summary_model):
+        """Running hash of messages[:i + 1] for every i, so any prefix can be looked up in the cache."""
+        digest = hashlib.sha256(summary_model.encode("utf-8")).digest()
+        hashes = []
+        for message in messages:
+            digest = hashlib.sha256(digest + json.dumps(message, sort_keys=True, ensure_ascii=False).encode("utf-8")).digest()
+            hashes.append(digest)
+        return hashes
+
+    def summary_chunk_budget(self, summary_model):
+        """Tokens of conversation per summary request: the summary model's budget with room for its reply, minus the summary prompt."""
+        return self.budget(summary_model, SUMMARY_MAX_TOKENS) - token_counter.count_text(summary_prompt, summary_model)
+
+    async def summary_of(self, messages, summary_model, output):
+        hashes = self.chain_hashes(messages, summary_model)
+        # Start from the longest prefix that has already been summarized
+        start, summary = 0, None
+        for i in range(len(hashes) - 1, -1, -1):
+            if hashes[i] in self.summaries:
+                self.summaries.move_to_end(hashes[i])
+                start, summary = i + 1, self.summaries[hashes[i]]
+                break
+        # Summarize the rest in chunks that fit the summary model
+        chunk_budget = self.summary_chunk_budget(summary_model)
+        while start < len(messages):
+            chunk = [{"role": "system", "content": "Summary of the earlier conversation: " + summary}] if summary else []
+            used = token_counter.count_messages(chunk, summary_model)
+            end = start
+            while end < len(messages):
+                tokens = token_counter.count_message(messages[end], summary_model)
+                if used + tokens > chunk_budget and end > start:
+                    break
+                used += tokens
+                end += 1
+            chunk += messages[start:end]
+            chunk.append({"role": "system", "content": summary_prompt})
+            self.summary_requests += 1
+            summary = await self.summarize(chunk, summary_model, output)
+            if not summary:
+                return None
+            self.summaries[hashes[end - 1]] = summary
+            if len(self.summaries) > self.max_cached_summaries:
+                self.summaries.popitem(last=False)
+            start = end
+        return summary
@@ -1,4 +1,5 @@
 import tkinter as tk
+from providers import CustomServerAdapter
 
 class CustomServer:
     def __init__(self, base_url, api_key, org_id, models, on_config_changed):
@@ -6,21 +7,21 @@ class CustomServer:
         self.baseurl_var = tk.StringVar(value=base_url)
         self.apikey_var = tk.StringVar(value=api_key)
         self.models_var = tk.StringVar(value=", ".join(self.models))
-        self.baseurl_var.trace("w", on_config_changed)
-        self.apikey_var.trace("w", on_config_changed)
+        # Plain copies of the credentials, so the adapter can read them from the event loop thread
+        self.base_url = base_url
+        self.api_key = api_key
+        # Owns the pooled client, which is rebuilt on the next request after the credentials change, not on every keystroke
+        self.adapter = CustomServerAdapter("custom_server", self.models, lambda: (self.api_key, self.base_url, None))
+        self.baseurl_var.trace("w", lambda *args: self.on_credentials_changed(on_config_changed))
+        self.apikey_var.trace("w", lambda *args: self.on_credentials_changed(on_config_changed))
         self.models_var.trace("w", on_config_changed)
-        self.update_client()
         self.update_models()
-    
-    def update_client(self):
-        try:
-            from openai import AsyncOpenAI
-        except ImportError:
-            self.client = None
-            print("OpenAI package not found, custom servers will be disabled! Install the OpenAI API with `pip install openai`")
-            return
-        self.client = AsyncOpenAI(base_url=self.baseurl_var.get(), api_key=self.apikey_var.get())
+
+    def on_credentials_changed(self, on_config_changed):
+        self.base_url = self.baseurl_var.get()
+        self.api_key = self.apikey_var.get()
+        on_config_changed()
 
     def update_models(self):
         self.models.clear()
-        self.models.extend([model.strip() for model in self.models_var.get().split(",") if model.strip()])
\ No newline at end of file
+        self.models.extend([model.strip() for model in self.models_var.get().split(",") if model.strip()])
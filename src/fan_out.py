@@ -0,0 +1,161 @@
+import time
+import tkinter as tk
+from tkinter import ttk
+from constants import MODEL_INFO, STREAM_RENDER_INTERVAL_MS
+from stream_renderer import StreamRenderer
+from token_counter import token_counter
+from token_meter import usage_cost
+
+class ModelPane:
+    """One model's column in the fan-out window: its streamed reply and timings."""
+    def __init__(self, parent, root, model):
+        self.model = model
+        self.frame = ttk.Frame(parent, padding="3")
+        ttk.Label(self.frame, text=model).grid(row=0, column=0, columnspan=2, sticky="w")
+        self.text = tk.Text(self.frame, wrap=tk.WORD, width=30, height=20)
+        self.text.grid(row=1, column=0, sticky="nsew")
+        scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.text.yview)
+        scrollbar.grid(row=1, column=1, sticky="ns")
+        self.text.configure(yscrollcommand=scrollbar.set)
+        self.status_var = tk.StringVar(value="Waiting for the first token...")
+        ttk.Label(self.frame, textvariable=self.status_var, wraplength=250).grid(row=2, column=0, columnspan=2, sticky="w")
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(1, weight=1)
+        # The pane's renderer is the output the streaming methods write to
+        self.renderer = StreamRenderer(root, self.write, STREAM_RENDER_INTERVAL_MS)
+        self.future = None
+        self.start_time = None
+        self.end_time = None
+        self.finished = False
+
+    def write(self, text):
+        self.text.insert(tk.END, text)
+        self.text.see(tk.END)
+
+    def describe(self, input_tokens):
+        """Return the status line with TTFT, tokens/s and cost of the finished reply."""
+        usage = self.renderer.usage
+        if usage is not None:
+            input_tokens, output_tokens = usage["input_tokens"], usage["output_tokens"]
+        else:
+            output_tokens = token_counter.count_text(self.text.get("1.0", "end-1c"), self.model)
+        first_token_time = self.renderer.first_delta_time
+        parts = []
+        if first_token_time is not None:
+            parts.append(f"TTFT {first_token_time - self.start_time:.2f} s")
+            streaming_time = self.end_time - first_token_time
+            if streaming_time > 0:
+                parts.append(f"{output_tokens / streaming_time:.1f} tokens/s")
+        parts.append(f"{input_tokens} + {output_tokens} tokens")
+        if usage is not None and usage["cache_read_tokens"]:
+            parts.append(f"{usage['cache_read_tokens']} cached")
+        if usage is not None and self.model in MODEL_INFO:
+            parts.append(f"${usage_cost(self.model, usage):.5f}")
+        elif self.model in MODEL_INFO:
+            cost = (MODEL_INFO[self.model]["input_price"] * input_tokens + MODEL_INFO[self.model]["output_price"] * output_tokens) / 1000
+            parts.append(f"${cost:.5f}")
+        parts.append(f"total {self.end_time - self.start_time:.2f} s")
+        return "   ".join(parts)
+
+class FanOutWindow:
+    """Sends one conversation to several models at once and streams each reply into its own pane.
+
+    Every request runs concurrently on the chat window's event loop, so the
+    wall-clock time is that of the slowest model rather than the sum of all.
+    """
+    columns = 4  # model checkboxes per row
+
+    def __init__(self, chat_window, messages, temperature, max_tokens, image_detail):
+        self.chat_window = chat_window
+        self.messages = messages
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.image_detail = image_detail
+        self.panes = []
+        self.start_time = None
+
+        self.window = tk.Toplevel(chat_window.app)
+        self.window.title("Compare Models")
+        self.window.geometry("1000x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        models_frame = ttk.Frame(self.window, padding="5")
+        models_frame.grid(row=0, column=0, sticky="we")
+        self.model_vars = {}
+        for i, model in enumerate(getattr(chat_window, "available_models", [])):
+            var = tk.BooleanVar(value=model == chat_window.model_var.get())
+            ttk.Checkbutton(models_frame, text=model, variable=var).grid(row=i // self.columns, column=i % self.columns, sticky="w", padx=3)
+            self.model_vars[model] = var
+        controls_frame = ttk.Frame(self.window, padding="5")
+        controls_frame.grid(row=1, column=0, sticky="we")
+        self.send_button = ttk.Button(controls_frame, text="Send", command=self.send)
+        self.send_button.grid(row=0, column=0, sticky="w")
+        ttk.Button(controls_frame, text="Cancel", command=self.cancel).grid(row=0, column=1, sticky="w", padx=3)
+        self.summary_var = tk.StringVar(value=f"Select the models to send the conversation ({len(messages)} messages) to.")
+        ttk.Label(controls_frame, textvariable=self.summary_var).grid(row=0, column=2, sticky="w", padx=5)
+
+        self.panes_frame = ttk.Frame(self.window, padding="5")
+        self.panes_frame.grid(row=2, column=0, sticky="nsew")
+        self.panes_frame.rowconfigure(0, weight=1)
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(2, weight=1)
+
+    def send(self):
+        models = [model for model, var in self.model_vars.items() if var.get()]
+        if not models:
+            self.summary_var.set("Select at least one model.")
+            return
+        self.cancel()
+        for pane in self.panes:
+            pane.renderer.stop()
+            pane.frame.destroy()
+        self.panes = []
+        for column in range(self.panes_frame.grid_size()[0]):
+            self.panes_frame.columnconfigure(column, weight=0)
+
+        self.start_time = time.perf_counter()
+        self.summary_var.set(f"Streaming from {len(models)} models...")
+        for column, model in enumerate(models):
+            pane = ModelPane(self.panes_frame, self.window, model)
+            pane.frame.grid(row=0, column=column, sticky="nsew")
+            self.panes_frame.columnconfigure(column, weight=1, uniform="pane")
+            self.panes.append(pane)
+            pane.renderer.start()
+            pane.start_time = time.perf_counter()
+            request = self.chat_window.send_chat_request(self.messages, model, self.image_detail, self.temperature, self.max_tokens, pane.renderer)
+            pane.future = self.chat_window.async_worker.submit(request)
+            pane.future.add_done_callback(lambda future, pane=pane: self.on_request_done(pane))
+
+    def on_request_done(self, pane):
+        # Runs on the event loop thread; the UI work is queued behind the pane's remaining text
+        pane.end_time = time.perf_counter()
+        pane.renderer.call(self.on_finished, pane)
+
+    def on_finished(self, pane):
+        pane.renderer.stop()
+        pane.finished = True
+        future = pane.future
+        if future.cancelled():
+            pane.status_var.set("Cancelled")
+        elif future.exception() is not None:
+            pane.status_var.set(f"Failed: {future.exception()}")
+        elif not future.result():
+            pane.status_var.set("Failed, see the error message")
+        else:
+            input_tokens = token_counter.count_messages(self.messages, pane.model)
+            pane.status_var.set(pane.describe(input_tokens))
+        if all(p.finished for p in self.panes):
+            wall_clock = max(p.end_time for p in self.panes) - self.start_time
+            sequential = sum(p.end_time - p.start_time for p in self.panes)
+            self.summary_var.set(f"Done in {wall_clock:.2f} s (one after another: {sequential:.2f} s)")
+
+    def cancel(self):
+        for pane in self.panes:
+            if pane.future is not None and not pane.future.done():
+                self.chat_window.async_worker.cancel(pane.future)
+
+    def close(self):
+        self.cancel()
+        for pane in self.panes:
+            pane.renderer.stop()
+        self.window.destroy()
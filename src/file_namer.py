@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import json
+import re
+from collections import OrderedDict
+from threading import Lock
+from prompts import file_naming_prompt
+from token_counter import token_counter
+
+def sanitize_file_name(text):
+    """Turn a model's reply into a file name (without extension), or "" if nothing usable is left."""
+    lines = text.strip().splitlines()
+    name = lines[0].strip().strip("'\"`*.") if lines else ""
+    if name.lower().endswith(".json"):
+        name = name[:-5]
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', "", name)
+    name = re.sub(r"\s+", "-", name).strip("-.")
+    return name[:60]
+
+class FileNamer:
+    """Suggests chat log file names in the background so saving never waits for the naming model.
+
+    schedule() is called whenever the conversation changes meaningfully (a reply
+    finished, a log was loaded); after a short debounce the conversation is sent
+    to the naming model on the shared event loop. Suggestions are cached by a
+    hash of the conversation, and best_name() returns immediately with the
+    best name available: the one for the current conversation, else the last
+    one made for this window, else one made from the first user message.
+    """
+    debounce_ms = 2000
+    max_prompt_tokens = 3500
+    max_cached_names = 50
+
+    def __init__(self, root, async_worker, get_messages, get_model, complete):
+        self.root = root
+        self.async_worker = async_worker
+        self.get_messages = get_messages
+        self.get_model = get_model
+        self.complete = complete  # async complete(messages, model, max_tokens, output) -> text, or None on failure
+        self.lock = Lock()
+        self.names = OrderedDict()  # conversation hash -> suggested name
+        self.pending = {}  # conversation hash -> future of the naming request
+        self.latest = None
+        self.schedule_id = None
+
+    def key(self, messages, model):
+        data = json.dumps([model, messages], ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def schedule(self, *args):
+        if self.schedule_id is not None:
+            self.root.after_cancel(self.schedule_id)
+        self.schedule_id = self.root.after(self.debounce_ms, self.start)
+
+    def reset(self):
+        """Forget the latest suggestion, e.g. when another chat log is loaded."""
+        with self.lock:
+            self.latest = None
+
+    def start(self):
+        """Request a name for the current conversation unless one is cached or on its way."""
+        self.schedule_id = None
+        model = self.get_model()
+        messages = self.get_messages()
+        if not model or not any(message["content"] for message in messages if message["role"] != "system"):
+            return
+        key = self.key(messages, model)
+        with self.lock:
+            if key in self.names or key in self.pending:
+                return
+        future = self.async_worker.submit(self.request(key, messages, model))
+        with self.lock:
+            self.pending[key] = future
+        future.add_done_callback(lambda future: self.on_done(key))
+
+    def on_done(self, key):
+        # Runs on the event loop thread
+        with self.lock:
+            self.pending.pop(key, None)
+
+    async def request(self, key, messages, model):
+        loop = asyncio.get_event_loop()
+        messages = await loop.run_in_executor(None, self.trim, messages, model)
+        messages.append({"role": "system", "content": file_naming_prompt})
+        # No output for UI callbacks: a failed suggestion shouldn't interrupt the user with a popup
+        reply = await self.complete(messages, model, 30, None)
+        name = sanitize_file_name(reply or "")
+        if not name:
+            print(f"Warning: could not get a file name suggestion from {model}.")
+            return
+        with self.lock:
+            self.names[key] = name
+            self.latest = name
+            if len(self.names) > self.max_cached_names:
+                self.names.popitem(last=False)
+
+    def trim(self, messages, model):
+        """Shorten every message by the same ratio so the conversation fits max_prompt_tokens."""
+        num_tokens = token_counter.count_messages(messages, model)
+        if num_tokens <= self.max_prompt_tokens:
+            return list(messages)
+        ratio = self.max_prompt_tokens / num_tokens
+        trimmed = []
+        for message in messages:
+            tokens = token_counter.encode(message["content"], model)
+            trimmed.append({"role": message["role"], "content": token_counter.decode(tokens[:int(ratio * len(tokens))], model)})
+        return trimmed
+
+    def shutdown(self):
+        if self.schedule_id is not None:
+            self.root.after_cancel(self.schedule_id)
+            self.schedule_id = None
+
+    def best_name(self):
+        """Return a file name for the save dialog without waiting, and make sure a suggestion is on its way."""
+        model = self.get_model()
+        messages = self.get_messages()
+        if model:
+            key = self.key(messages, model)
+            with self.lock:
+                name = self.names.get(key)
+                latest = self.latest
+            if name:
+                return name
+            self.start()
+            if latest:
+                return latest
+        first_user_message = next((message["content"] for message in messages if message["role"] == "user" and message["content"]), "")
+        return sanitize_file_name(" ".join(first_user_message.split()[:4]).lower()) or "chat_log"
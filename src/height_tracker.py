@@ -0,0 +1,62 @@
+class HeightTracker:
+    """Tracks the wrapped height (in lines) of a word-wrapped Text widget incrementally.
+
+    The length of every logical line is cached so that appends and single-line
+    edits only re-measure the lines they touch, instead of re-reading and
+    re-splitting the whole message on every keystroke or streamed chunk.
+    """
+    def __init__(self, width, text=""):
+        self.width = max(1, width)
+        self.reset(text)
+
+    def reset(self, text):
+        self.line_lengths = [len(line) for line in text.split("\n")]
+        self.char_count = sum(self.line_lengths) + len(self.line_lengths) - 1
+        self.line_wraps = [self.wrap(length) for length in self.line_lengths]
+        self.height = sum(self.line_wraps)
+
+    def wrap(self, length):
+        if length == 0:
+            return 1
+        return -(-length // self.width)  # Equivalent to math.ceil(length / width)
+
+    def set_width(self, width):
+        width = max(1, width)
+        if width == self.width:
+            return
+        self.width = width
+        self.line_wraps = [self.wrap(length) for length in self.line_lengths]
+        self.height = sum(self.line_wraps)
+
+    def set_line(self, index, length):
+        old_wraps = self.line_wraps[index]
+        new_wraps = self.wrap(length)
+        self.char_count += length - self.line_lengths[index]
+        self.line_lengths[index] = length
+        self.line_wraps[index] = new_wraps
+        self.height += new_wraps - old_wraps
+
+    def append(self, text):
+        """Account for text inserted at the end of the widget."""
+        parts = text.split("\n")
+        self.set_line(len(self.line_lengths) - 1, self.line_lengths[-1] + len(parts[0]))
+        for part in parts[1:]:
+            wraps = self.wrap(len(part))
+            self.line_lengths.append(len(part))
+            self.line_wraps.append(wraps)
+            self.height += wraps
+        self.char_count += len(text) - len(parts[0])
+
+    def update_line(self, index, length, line_count, char_count):
+        """Re-measure a single edited line.
+
+        Returns False if the widget no longer matches the cached state apart from
+        that line (e.g. lines were added, removed or pasted over), in which case
+        the caller must reset() from the full text.
+        """
+        if line_count != len(self.line_lengths) or not 0 <= index < line_count:
+            return False
+        if char_count != self.char_count - self.line_lengths[index] + length:
+            return False
+        self.set_line(index, length)
+        return True
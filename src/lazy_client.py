@@ -0,0 +1,29 @@
+from threading import Lock
+
+class LazyClient:
+    """Builds a provider client on first use and rebuilds it only when its credentials change.
+
+    `factory(*credentials)` returns the client, or None if it can't be created
+    (no API key, or the provider package isn't installed). A client replaced
+    by a rebuild is passed to `on_replace`, so its connections can be closed.
+    """
+    def __init__(self, factory, on_replace=None):
+        self.factory = factory
+        self.on_replace = on_replace
+        self.lock = Lock()
+        self.credentials = None
+        self.client = None
+        self.build_count = 0
+
+    def get(self, *credentials):
+        replaced = None
+        with self.lock:
+            if self.build_count == 0 or credentials != self.credentials:
+                replaced = self.client
+                self.client = self.factory(*credentials)
+                self.credentials = credentials
+                self.build_count += 1
+            client = self.client
+        if replaced is not None and self.on_replace is not None:
+            self.on_replace(replaced)
+        return client
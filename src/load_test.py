@@ -0,0 +1,293 @@
+"""
+Load testing OpenAI-compatible servers
+
+Usage:
+    python src/load_test.py --server 0 --corpus chat_logs --concurrency 8 --requests 200
+    python src/load_test.py --base-url http://localhost:11434/v1/ --model llama3 --corpus requests.jsonl --rate 2 --duration 60
+    python src/load_test.py --mock --concurrency 16
+
+Replays a corpus against one server and reports throughput, time to first
+token and latency percentiles and the error rate. The corpus is a folder of
+saved chat logs, where every user turn becomes one request with the
+conversation up to it, or a requests.jsonl file as read by batch.py. Entries
+are replayed in order and repeated as needed.
+
+With --concurrency, that many requests are kept in flight (a closed loop:
+the next request is sent when one finishes). With --rate, requests are sent
+at that many per second no matter how fast the server answers (an open
+loop), which shows how latency grows once the server falls behind; latency
+then includes the time a request waited for a free connection.
+
+--server N targets custom server N of config.ini, --base-url any
+OpenAI-compatible server, and --mock a mock server started in-process
+(src/mock_server.py), so the tool runs offline. With --record-metrics every
+request is also stored in temp/metrics.sqlite like the app's own requests.
+"""
+
+import argparse
+import asyncio
+import configparser
+import json
+import os
+import random
+import sys
+import time
+
+from batch import message_text, read_requests
+from chat_log import read_chat_log
+from metrics import RequestMetrics, metrics_store, percentile
+from providers import CustomServerAdapter
+
+def read_corpus(path):
+    """Return the list of conversations (lists of messages) to replay from a chat log folder or a requests .jsonl file.
+
+    Chat log messages whose content is a list of parts (images) are flattened to their text.
+    """
+    if not os.path.isdir(path):
+        return [request["messages"] for request in read_requests(path)]
+    corpus = []
+    for name in sorted(os.listdir(path)):
+        if not name.endswith((".json", ".jsonl")):
+            continue
+        try:
+            chat_data = read_chat_log(os.path.join(path, name))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: skipped chat log '{name}': {e}")
+            continue
+        # Image messages hold a list of parts; only their text is replayed
+        messages = [{"role": "system", "content": message_text(chat_data.get("system_message", ""))}]
+        messages += [{"role": message["role"], "content": message_text(message.get("content"))} for message in chat_data.get("chat_history", [])]
+        for i, message in enumerate(messages):
+            if message["role"] == "user" and message["content"].strip():
+                corpus.append(messages[:i + 1])
+    return corpus
+
+def distribution(values):
+    return {"p50": percentile(values, 0.5), "p90": percentile(values, 0.9), "p99": percentile(values, 0.99)}
+
+def summarize(rows, duration):
+    """Aggregate the metrics rows of one run into the report."""
+    ok = [row for row in rows if row["status"] == "ok"]
+    errors = {}
+    for row in rows:
+        if row["status"] != "ok":
+            kind = (row["error"] or row["status"]).split(":")[0]
+            errors[kind] = errors.get(kind, 0) + 1
+    def values(column):
+        return [row[column] for row in ok if row[column] is not None]
+    return {
+        "requests": len(rows),
+        "ok": len(ok),
+        "errors": len(rows) - len(ok),
+        "error_rate": (len(rows) - len(ok)) / len(rows) if rows else 0.0,
+        "error_kinds": errors,
+        "duration_s": round(duration, 3),
+        "requests_per_second": len(ok) / duration if duration > 0 else 0.0,
+        "output_tokens_per_second": sum(values("output_tokens")) / duration if duration > 0 else 0.0,
+        "ttft_ms": distribution(values("ttft_ms")),
+        "latency_ms": distribution(values("total_ms")),
+        "queue_ms": distribution(values("queue_ms")),
+        "inter_token_ms": distribution(values("itl_p50_ms")),
+        "tokens_per_second_per_request": distribution(values("tokens_per_second")),
+    }
+
+def format_report(report):
+    def ms(values):
+        return "   ".join(f"{name} {value:8.1f}" if value is not None else f"{name}        -" for name, value in values.items())
+    lines = [
+        f"Requests:      {report['requests']} ({report['ok']} ok, {report['errors']} failed, error rate {report['error_rate'] * 100:.1f}%)",
+        f"Duration:      {report['duration_s']:.2f} s" + (f", sent {report['sent_per_second']:.2f} requests/s" if "sent_per_second" in report else ""),
+        f"Throughput:    {report['requests_per_second']:.2f} requests/s, {report['output_tokens_per_second']:.1f} output tokens/s",
+        f"TTFT (ms):     {ms(report['ttft_ms'])}",
+        f"Latency (ms):  {ms(report['latency_ms'])}",
+        f"Queue (ms):    {ms(report['queue_ms'])}",
+        f"ITL (ms):      {ms(report['inter_token_ms'])}",
+    ]
+    if report["error_kinds"]:
+        lines.append("Errors:        " + ", ".join(f"{kind} x{count}" for kind, count in sorted(report["error_kinds"].items())))
+    return "\n".join(lines)
+
+class LoadTest:
+    """Sends the corpus to one server at a fixed concurrency or request rate and collects a RequestMetrics row per request."""
+    def __init__(self, adapter, model, corpus, concurrency=None, rate=None, total_requests=100, duration=None,
+                 max_tokens=200, temperature=0.7, timeout=120, poisson=False, max_in_flight=256, metrics_store=None):
+        if not corpus:
+            raise ValueError("The corpus is empty")
+        if (concurrency is None) == (rate is None):
+            raise ValueError("Set either a concurrency or a request rate")
+        self.adapter = adapter
+        self.model = model
+        self.concurrency = concurrency
+        self.rate = rate
+        self.total_requests = total_requests  # None: until the duration is over
+        self.duration = duration
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        self.poisson = poisson
+        self.max_in_flight = max_in_flight
+        self.metrics_store = metrics_store
+        # Converted up front so the load generator's own work isn't measured
+        self.corpus = [adapter.convert_messages(model, messages) for messages in corpus]
+        self.rows = []
+        self.sent = 0
+        self.send_times = []
+
+    def next_request(self, deadline):
+        """The corpus entry to send next, or None when the run is over."""
+        if self.total_requests is not None and self.sent >= self.total_requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        entry = self.corpus[self.sent % len(self.corpus)]
+        self.sent += 1
+        self.send_times.append(time.perf_counter())
+        return entry
+
+    async def send(self, entry, metrics, in_flight):
+        messages, system_message = entry
+        usage = {}
+        async with in_flight:
+            try:
+                await asyncio.wait_for(self.consume(messages, system_message, usage, metrics), self.timeout)
+                metrics.finish("ok", usage=usage or None)
+            except Exception as e:
+                metrics.finish("error", f"{type(e).__name__}: {e}")
+        row = metrics.row()
+        self.rows.append(row)
+        if self.metrics_store is not None:
+            asyncio.get_event_loop().run_in_executor(None, self.metrics_store.record, row)
+
+    async def consume(self, messages, system_message, usage, metrics):
+        async for _ in self.adapter.stream(self.model, messages, system_message, self.temperature, self.max_tokens, usage, metrics):
+            pass
+
+    async def closed_loop(self, deadline):
+        in_flight = asyncio.Semaphore(self.concurrency)
+        async def worker():
+            while True:
+                entry = self.next_request(deadline)
+                if entry is None:
+                    return
+                await self.send(entry, RequestMetrics(), in_flight)
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def open_loop(self, deadline):
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+        tasks = []
+        next_time = time.perf_counter()
+        while True:
+            await asyncio.sleep(max(0.0, next_time - time.perf_counter()))
+            entry = self.next_request(deadline)
+            if entry is None:
+                break
+            # Created at the scheduled arrival, so time spent waiting for a free connection counts as queue time
+            tasks.append(asyncio.ensure_future(self.send(entry, RequestMetrics(), in_flight)))
+            next_time += random.expovariate(self.rate) if self.poisson else 1 / self.rate
+        await asyncio.gather(*tasks)
+
+    async def run(self):
+        """Run the test and return its report (see summarize)."""
+        self.rows = []
+        self.sent = 0
+        self.send_times = []
+        # Build the client (and import its SDK) before the clock starts
+        if self.adapter.get_client() is None:
+            raise RuntimeError(self.adapter.install_message)
+        start = time.perf_counter()
+        deadline = start + self.duration if self.duration else None
+        if self.concurrency is not None:
+            await self.closed_loop(deadline)
+        else:
+            await self.open_loop(deadline)
+        report = summarize(self.rows, time.perf_counter() - start)
+        if len(self.send_times) > 1:
+            report["sent_per_second"] = (len(self.send_times) - 1) / (self.send_times[-1] - self.send_times[0])
+        return report
+
+def load_server(config, index):
+    """Base URL, API key and first model of custom server `index` in `config`, with the app's defaults."""
+    section = f"custom_server_{index}"
+    if not config.has_section(section):
+        raise SystemExit(f"config.ini has no {section} section; add the server in the app's settings or use --base-url")
+    models = [model.strip() for model in config.get(section, "models", fallback="").split(",") if model.strip()]
+    return (config.get(section, "base_url", fallback="http://localhost:11434/v1/"), config.get(section, "api_key", fallback="ollama"),
+            models[0] if models else None)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a corpus of chats against an OpenAI-compatible server and report its performance")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--server", type=int, help="custom server number in config.ini (0 is the first)")
+    target.add_argument("--base-url", help="OpenAI-compatible base URL, e.g. http://localhost:11434/v1/")
+    target.add_argument("--mock", action="store_true", help="start the bundled mock server and test it (works offline)")
+    parser.add_argument("--config", default="config.ini", help="config file with the custom servers")
+    parser.add_argument("--api-key", help="API key for --base-url")
+    parser.add_argument("--model", help="model to request; defaults to the server's first model")
+    parser.add_argument("--corpus", default="chat_logs", help="folder of saved chat logs, or a requests .jsonl file")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, help="requests kept in flight")
+    load.add_argument("--rate", type=float, help="requests sent per second")
+    parser.add_argument("--poisson", action="store_true", help="with --rate, send at random (exponential) intervals instead of evenly")
+    parser.add_argument("--requests", type=int, default=100, help="requests to send (0: until --duration is over)")
+    parser.add_argument("--duration", type=float, help="stop sending after this many seconds")
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds per request")
+    parser.add_argument("--include-usage", action="store_true", help="ask for token usage with stream_options (vLLM, OpenAI)")
+    parser.add_argument("--record-metrics", action="store_true", help="also store every request in temp/metrics.sqlite")
+    parser.add_argument("--json", help="write the report to this file as JSON")
+    parser.add_argument("--mock-ttft", type=float, default=0.1, help="seconds before the mock server's first token")
+    parser.add_argument("--mock-tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--mock-reply-tokens", type=int, default=50)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    if args.concurrency is None and args.rate is None:
+        args.concurrency = 1
+    if not args.requests and not args.duration:
+        parser.error("--requests 0 needs a --duration")
+
+    server = None
+    if args.mock:
+        from mock_server import start_mock_server
+        server = start_mock_server(ttft=args.mock_ttft, tokens_per_second=args.mock_tokens_per_second,
+                                   reply_tokens=args.mock_reply_tokens, error_rate=args.mock_error_rate)
+        base_url, api_key, model = server.base_url, "mock", args.model or "mock-model"
+    elif args.base_url:
+        base_url, api_key, model = args.base_url, args.api_key or "none", args.model
+    else:
+        config = configparser.ConfigParser()
+        config.read(args.config)
+        base_url, api_key, server_model = load_server(config, args.server or 0)
+        model = args.model or server_model
+    if not model:
+        parser.error("no model to request; pass --model")
+
+    if os.path.exists(args.corpus):
+        corpus = read_corpus(args.corpus)
+    elif args.mock:
+        corpus = [[{"role": "user", "content": f"Question {i}"}] for i in range(20)]
+    else:
+        parser.error(f"corpus '{args.corpus}' not found")
+    if not corpus:
+        parser.error(f"corpus '{args.corpus}' has no user messages to send")
+
+    connections = args.concurrency or 256
+    adapter = CustomServerAdapter("load_test", [model], lambda: (api_key, base_url, None), include_usage=args.include_usage,
+                                  max_connections=connections, max_retries=0)
+    test = LoadTest(adapter, model, corpus, concurrency=args.concurrency, rate=args.rate, total_requests=args.requests or None,
+                    duration=args.duration, max_tokens=args.max_tokens, temperature=args.temperature, timeout=args.timeout,
+                    poisson=args.poisson, max_in_flight=connections, metrics_store=metrics_store if args.record_metrics else None)
+    load_description = f"{args.concurrency} concurrent" if args.concurrency else f"{args.rate:g} requests/s"
+    print(f"Sending {len(corpus)} conversations to {model} at {base_url}, {load_description}")
+    report = asyncio.run(test.run())
+    report.update({"base_url": base_url, "model": model, "concurrency": args.concurrency, "rate": args.rate})
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    if server is not None:
+        server.shutdown()
+    return 0 if report["ok"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+
+class LogPicker:
+    """A searchable chat log browser backed by the chat log index.
+
+    With an empty query it lists logs newest first; otherwise it shows every
+    message that matches the query in the full-text index. Rows are fetched one
+    page at a time as the list is scrolled, so opening the picker costs the same
+    no matter how many logs exist.
+    """
+    page_size = 100
+
+    def __init__(self, parent, index, on_select):
+        self.index = index
+        self.on_select = on_select
+        self.logs = []
+        self.exhausted = False
+        self.search_id = None
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Chat Logs")
+        self.window.geometry("700x450")
+        frame = ttk.Frame(self.window, padding="5")
+        frame.pack(fill="both", expand=True)
+
+        self.query_var = tk.StringVar()
+        ttk.Label(frame, text="Search:").grid(row=0, column=0, sticky="w")
+        query_entry = ttk.Entry(frame, textvariable=self.query_var)
+        query_entry.grid(row=0, column=1, columnspan=2, sticky="we", pady=3)
+        self.query_var.trace("w", self.schedule_search)
+
+        self.listbox = tk.Listbox(frame, activestyle="none")
+        self.listbox.grid(row=1, column=0, columnspan=2, sticky="nsew")
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self.listbox.yview)
+        scrollbar.grid(row=1, column=2, sticky="ns")
+        self.listbox.configure(yscrollcommand=lambda first, last: self.on_scroll(scrollbar, first, last))
+        self.listbox.bind("<Double-Button-1>", self.select)
+        self.listbox.bind("<Return>", self.select)
+        query_entry.bind("<Return>", self.select)
+        query_entry.bind("<Down>", lambda event: self.listbox.focus_set())
+
+        ttk.Button(frame, text="Load", command=self.select).grid(row=2, column=1, columnspan=2, sticky="e", pady=3)
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        self.search()
+        query_entry.focus_set()
+
+    def schedule_search(self, *args):
+        if self.search_id is not None:
+            self.window.after_cancel(self.search_id)
+        self.search_id = self.window.after(150, self.search)
+
+    def search(self):
+        self.search_id = None
+        self.logs = []
+        self.exhausted = False
+        self.listbox.delete(0, tk.END)
+        self.load_page()
+        if self.logs:
+            self.listbox.selection_set(0)
+
+    def load_page(self):
+        if self.exhausted:
+            return
+        query = self.query_var.get().strip()
+        if query and self.index.full_text_search:
+            logs = self.index.search(query, limit=self.page_size, offset=len(self.logs))
+        else:
+            logs = self.index.list_logs(query, limit=self.page_size, offset=len(self.logs))
+        self.exhausted = len(logs) < self.page_size
+        self.logs.extend(logs)
+        for log in logs:
+            self.listbox.insert(tk.END, self.format_match(log) if "snippet" in log else self.format_log(log))
+
+    def format_log(self, log):
+        modified = datetime.fromtimestamp(log["mtime"]).strftime("%Y-%m-%d %H:%M")
+        details = f"{log['message_count']} msgs"
+        if log["model"]:
+            details += f", {log['model']}"
+        if log["tokens"] is not None:
+            details += f", {log['tokens']} tokens"
+        return f"{modified}  {log['name']}  ({details})  {log['title']}"
+
+    def format_match(self, match):
+        modified = datetime.fromtimestamp(match["mtime"]).strftime("%Y-%m-%d")
+        snippet = " ".join(match["snippet"].split())
+        return f"{modified}  {match['name']}  #{match['position']} {match['role']}:  {snippet}"
+
+    def on_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        # Fetch the next page once the user scrolls close to the end of what is loaded
+        if float(last) > 0.9:
+            self.load_page()
+
+    def select(self, event=None):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        log = self.logs[selection[0]]
+        self.window.destroy()
+        self.on_select(log["name"], log.get("position"))
@@ -1,36 +1,23 @@
+import startup  # first, so the startup report covers every import below
 import tkinter as tk
 import configparser
 import os
 import platform
 from chat_window import ChatWindow
+from async_worker import AsyncWorker
+from config_store import ConfigStore
+startup.mark("imports")
 
 # configure config file
 config_filename = "config.ini"
-if not os.path.exists(config_filename):
-    with open(config_filename, "w") as f:
-        f.write("[openai]\n")
-        f.write("[anthropic]\n")
-        f.write("[custom_server_0]\n")
-        f.write("[app]\n")
 config = configparser.ConfigParser()
 config.read(config_filename)
-if not config.has_section("openai"):
-    config.add_section("openai")
-    with open(config_filename, "w") as f:
-        config.write(f)
-if not config.has_section("anthropic"):
-    config.add_section("anthropic")
-    with open(config_filename, "w") as f:
-        config.write(f)
-if not config.has_section("custom_server_0"):
-    config.add_section("custom_server_0")
-    with open(config_filename, "w") as f:
-        config.write(f)
+config_store = ConfigStore(config, config_filename)
+for section in ("openai", "anthropic", "custom_server_0"):
+    config_store.ensure_section(section)
 if not config.has_section("app"):
-    config.add_section("app")
-    config.set("app", "dark_mode", "False")
-    with open(config_filename, "w") as f:
-        config.write(f)
+    config_store.set("app", "dark_mode", "False")
+config_store.flush()
 
 os_name = platform.system()
 if os_name == 'Linux' and "ANDROID_BOOTLOGO" in os.environ:
@@ -44,8 +31,14 @@ if os.name == 'nt':
 
 def main():
     root = tk.Tk()
-    app = ChatWindow(root, config, os_name)
+    if os.environ.get("CHAT_GUI_STARTUP_REPORT"):
+        # Timers only run once the main loop is up, the idle callback after the window has been drawn
+        root.after(0, lambda: root.after_idle(startup.report, root))
+    async_worker = AsyncWorker()
+    ChatWindow(root, config_store, os_name, async_worker)
     root.mainloop()
+    config_store.flush()
+    async_worker.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Single-pass conversion to the strictly alternating message formats of Anthropic and Google
+
+Both APIs want the conversation to start and end with a user turn and never
+have two turns of the same role in a row. Each message is appended in order,
+with a "<no message>" filler turn in front of it if it would repeat the
+previous role, so converting is one pass over the conversation. A normalizer
+remembers what it converted; if the next conversation starts with the same
+messages, only the ones appended since are converted.
+"""
+
+from collections import deque
+from threading import Lock
+
+FILLER_TEXT = "<no message>"
+
+class MessageNormalizer:
+    user_role = "user"
+    reply_role = "assistant"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Roles and contents of every message converted so far, as two lists because they compare faster than tuples
+        self.roles = []
+        self.contents = []
+        self.turns = []  # the converted turns, without the filler a trailing reply needs
+        self.system_parts = []
+
+    def make_turn(self, role, content):
+        return {"role": role, "content": content}
+
+    def filler(self, role):
+        return self.make_turn(role, FILLER_TEXT)
+
+    def add_turn(self, role, content):
+        if not self.turns:
+            if role == self.reply_role:
+                self.turns.append(self.filler(self.user_role))
+        elif self.turns[-1]["role"] == role:
+            self.turns.append(self.filler(self.user_role if role == self.reply_role else self.reply_role))
+        self.turns.append(self.make_turn(role, content))
+
+    def add(self, message):
+        raise NotImplementedError
+
+    def system(self):
+        return None
+
+    def matches(self, messages):
+        """True if the messages converted so far are the start of `messages`."""
+        if len(messages) < len(self.contents):
+            return False
+        prefix = messages[:len(self.contents)]
+        return self.contents == [message["content"] for message in prefix] and self.roles == [message["role"] for message in prefix]
+
+    def convert(self, messages):
+        """Return the turns and the system message for `messages`, converting only what was appended since the last call."""
+        if not self.matches(messages):
+            self.reset()
+        try:
+            for message in messages[len(self.contents):]:
+                self.add(message)
+                self.roles.append(message["role"])
+                self.contents.append(message["content"])
+        except Exception:
+            self.reset()
+            raise
+        turns = list(self.turns) if self.turns else [self.filler(self.user_role)]
+        if turns[-1]["role"] == self.reply_role:
+            turns.append(self.filler(self.user_role))
+        return turns, self.system()
+
+class AnthropicNormalizer(MessageNormalizer):
+    """System messages are joined into the separate system prompt; empty messages are skipped."""
+    def reset(self):
+        super().reset()
+        self.system_content = ""
+
+    def add(self, message):
+        if message["role"] == "system":
+            self.system_parts.append(message["content"] + "\n")
+            self.system_content = None
+        elif message["content"]:
+            self.add_turn(message["role"], message["content"])
+
+    def system(self):
+        if self.system_content is None:
+            self.system_content = "".join(self.system_parts).strip()
+        return self.system_content
+
+class GoogleNormalizer(MessageNormalizer):
+    """Replies are "model" turns, and so are system messages, marked with a SYSTEM_PROMPT: prefix."""
+    reply_role = "model"
+    roles_mapping = {"user": "user", "assistant": "model", "system": "model"}
+
+    def make_turn(self, role, content):
+        return {"role": role, "parts": [content]}
+
+    def add(self, message):
+        if not message["content"]:
+            return
+        if message["role"] == "system":
+            self.add_turn("model", "SYSTEM_PROMPT: " + message["content"])
+        else:
+            self.add_turn(self.roles_mapping[message["role"]], message["content"])
+
+class NormalizerCache:
+    """Normalizers for the last few conversations converted, so replies, summaries and file names don't evict each other.
+
+    Conversions run on executor threads, so they are serialized by a lock.
+    """
+    def __init__(self, normalizer_class, size=4):
+        self.normalizer_class = normalizer_class
+        self.normalizers = deque(maxlen=size)  # least recently used first
+        self.lock = Lock()
+
+    def convert(self, messages):
+        with self.lock:
+            matching = [normalizer for normalizer in self.normalizers if normalizer.contents and normalizer.matches(messages)]
+            if matching:
+                normalizer = max(matching, key=lambda normalizer: len(normalizer.contents))
+                self.normalizers.remove(normalizer)
+            elif len(self.normalizers) == self.normalizers.maxlen:
+                normalizer = self.normalizers.popleft()
+            else:
+                normalizer = self.normalizer_class()
+            self.normalizers.append(normalizer)
+            return normalizer.convert(messages)
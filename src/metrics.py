@@ -0,0 +1,246 @@
+"""
+Per-request latency and throughput metrics
+
+Every streamed request fills in a RequestMetrics and is stored as one row of
+temp/metrics.sqlite, tagged with its provider, model and base URL:
+
+    queue_ms            from the request being made until it is sent (context fitting, message conversion, cache lookup)
+    connect_ms          time spent opening connections (TCP and TLS), 0 when a pooled connection was reused,
+                        empty for providers that don't use HTTP (Google)
+    ttft_ms             from sending the request until the first text arrives
+    itl_p50/p90/p99_ms  percentiles of the time between streamed chunks
+    tokens_per_second   output tokens per second after the first one arrived
+    input/output_tokens as reported by the provider; without a report, output_tokens is the number of chunks
+    cost                from MODEL_INFO, empty for models it doesn't know
+
+The Metrics window shows a summary per provider, model and server. From the
+command line:
+
+    python src/metrics.py summary [--days 7]
+    python src/metrics.py export metrics.csv [--days 7]
+"""
+
+import argparse
+import contextvars
+import csv
+import os
+import sqlite3
+import sys
+import time
+from threading import Lock
+from token_meter import usage_cost
+
+# The request being streamed by the current task, so the shared HTTP clients can report its connection times
+current_request = contextvars.ContextVar("current_request", default=None)
+
+COLUMNS = ["started_at", "provider", "model", "base_url", "status", "error", "queue_ms", "connect_ms", "ttft_ms",
+           "itl_p50_ms", "itl_p90_ms", "itl_p99_ms", "total_ms", "tokens_per_second", "input_tokens", "output_tokens",
+           "usage_reported", "cost"]
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values` (0 < fraction <= 1), or None if there are none."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+class RequestMetrics:
+    """Timings of one request, recorded as it streams. Times are time.perf_counter() values."""
+    def __init__(self):
+        self.created = time.perf_counter()
+        self.started_at = time.time()
+        self.provider = None
+        self.model = None
+        self.base_url = None
+        self.sent = None
+        self.connect_seconds = None  # stays None unless the HTTP client reports on the request
+        self.connect_started = None
+        self.chunk_times = []
+        self.finished = None
+        self.status = None
+        self.error = None
+        self.usage = None
+
+    def start(self, provider, model, base_url):
+        self.provider = provider
+        self.model = model
+        self.base_url = base_url
+        self.sent = time.perf_counter()
+
+    async def trace(self, event_name, info):
+        # httpcore's trace extension: one started/complete pair per step of the request
+        if self.connect_seconds is None:
+            self.connect_seconds = 0.0
+        if event_name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            self.connect_started = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete") and self.connect_started is not None:
+            self.connect_seconds += time.perf_counter() - self.connect_started
+            self.connect_started = None
+
+    def chunk(self):
+        self.chunk_times.append(time.perf_counter())
+
+    def finish(self, status, error=None, usage=None):
+        if self.finished is None:
+            self.finished = time.perf_counter()
+            self.status = status
+            self.error = error
+            self.usage = usage
+
+    def row(self):
+        sent = self.sent if self.sent is not None else self.finished
+        first = self.chunk_times[0] if self.chunk_times else None
+        gaps = [later - earlier for earlier, later in zip(self.chunk_times, self.chunk_times[1:])]
+        output_tokens = self.usage["output_tokens"] if self.usage else len(self.chunk_times)
+        tokens_per_second = None
+        if first is not None and self.chunk_times[-1] > first:
+            tokens_per_second = round((output_tokens - 1) / (self.chunk_times[-1] - first), 2)
+        cost = usage_cost(self.model, self.usage) if self.usage and self.model else None
+        return {
+            "started_at": self.started_at,
+            "provider": self.provider,
+            "model": self.model,
+            "base_url": self.base_url,
+            "status": self.status,
+            "error": self.error,
+            "queue_ms": milliseconds(sent - self.created),
+            "connect_ms": milliseconds(self.connect_seconds),
+            "ttft_ms": milliseconds(first - sent) if first is not None else None,
+            "itl_p50_ms": milliseconds(percentile(gaps, 0.5)),
+            "itl_p90_ms": milliseconds(percentile(gaps, 0.9)),
+            "itl_p99_ms": milliseconds(percentile(gaps, 0.99)),
+            "total_ms": milliseconds(self.finished - self.created),
+            "tokens_per_second": tokens_per_second,
+            "input_tokens": self.usage["input_tokens"] if self.usage else None,
+            "output_tokens": output_tokens,
+            "usage_reported": 1 if self.usage else 0,
+            "cost": round(cost, 6) if cost is not None else None,
+        }
+
+async def attach_connection_trace(request):
+    """httpx request hook of the providers' pooled clients: report connection times to the request being streamed."""
+    metrics = current_request.get()
+    if metrics is not None:
+        request.extensions["trace"] = metrics.trace
+
+class MetricsStore:
+    """SQLite table of request metrics, one row per request."""
+    def __init__(self, db_path=os.path.join("temp", "metrics.sqlite")):
+        self.db_path = db_path
+        self.lock = Lock()
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY,
+                started_at REAL NOT NULL,
+                provider TEXT, model TEXT, base_url TEXT, status TEXT, error TEXT,
+                queue_ms REAL, connect_ms REAL, ttft_ms REAL, itl_p50_ms REAL, itl_p90_ms REAL, itl_p99_ms REAL, total_ms REAL,
+                tokens_per_second REAL, input_tokens INTEGER, output_tokens INTEGER, usage_reported INTEGER, cost REAL)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS requests_by_start ON requests (started_at)")
+            self.connection.commit()
+        return self.connection
+
+    def record(self, metrics):
+        """Store a finished RequestMetrics (or a row dict from one)."""
+        row = metrics.row() if isinstance(metrics, RequestMetrics) else metrics
+        with self.lock:
+            connection = self.connect()
+            connection.execute(f"INSERT INTO requests ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                               [row[column] for column in COLUMNS])
+            connection.commit()
+
+    def rows(self, since=None):
+        """Every stored row as a dict, oldest first, optionally only those started after the unix time `since`."""
+        with self.lock:
+            cursor = self.connect().execute(f"SELECT {', '.join(COLUMNS)} FROM requests WHERE started_at >= ? ORDER BY started_at",
+                                            (since or 0,))
+            return [dict(zip(COLUMNS, values)) for values in cursor.fetchall()]
+
+    def summary(self, since=None):
+        """One dict per provider, model and base URL with request counts, latency percentiles, throughput, tokens and cost."""
+        groups = {}
+        for row in self.rows(since):
+            groups.setdefault((row["provider"], row["model"], row["base_url"]), []).append(row)
+        summaries = []
+        for (provider, model, base_url), rows in sorted(groups.items(), key=lambda item: tuple(part or "" for part in item[0])):
+            ok = [row for row in rows if row["status"] == "ok"]
+            def values(column):
+                return [row[column] for row in ok if row[column] is not None]
+            summaries.append({
+                "provider": provider, "model": model, "base_url": base_url,
+                "requests": len(rows),
+                "errors": sum(1 for row in rows if row["status"] == "error"),
+                "ttft_p50_ms": percentile(values("ttft_ms"), 0.5),
+                "ttft_p90_ms": percentile(values("ttft_ms"), 0.9),
+                "connect_p50_ms": percentile(values("connect_ms"), 0.5),
+                "itl_p50_ms": percentile(values("itl_p50_ms"), 0.5),
+                "tokens_per_second_p50": percentile(values("tokens_per_second"), 0.5),
+                "total_p50_ms": percentile(values("total_ms"), 0.5),
+                "tokens": sum(values("input_tokens")) + sum(values("output_tokens")),
+                "cost": sum(values("cost")),
+            })
+        return summaries
+
+    def export_csv(self, path, since=None):
+        rows = self.rows(since)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def clear(self):
+        with self.lock:
+            connection = self.connect()
+            connection.execute("DELETE FROM requests")
+            connection.commit()
+
+# Shared by every window and the command line tools
+metrics_store = MetricsStore()
+
+def format_summary(summaries):
+    header = f"{'provider':<14} {'model':<28} {'requests':>8} {'errors':>6} {'TTFT p50':>9} {'TTFT p90':>9} {'connect':>8} {'ITL p50':>8} {'tok/s':>7} {'tokens':>9} {'cost':>9}  server"
+    lines = [header]
+    for summary in summaries:
+        def ms(value):
+            return f"{value:.0f}" if value is not None else "-"
+        tokens_per_second = f"{summary['tokens_per_second_p50']:.1f}" if summary["tokens_per_second_p50"] is not None else "-"
+        lines.append(f"{summary['provider'] or '-':<14} {summary['model'] or '-':<28} {summary['requests']:>8} {summary['errors']:>6} "
+                     f"{ms(summary['ttft_p50_ms']):>9} {ms(summary['ttft_p90_ms']):>9} {ms(summary['connect_p50_ms']):>8} "
+                     f"{ms(summary['itl_p50_ms']):>8} {tokens_per_second:>7} {summary['tokens']:>9} {summary['cost']:>9.4f}  {summary['base_url'] or ''}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show or export the per-request metrics recorded by the app and the batch runner")
+    parser.add_argument("--db", default=metrics_store.db_path, help="metrics database")
+    subparsers = parser.add_subparsers(dest="command")
+    summary_parser = subparsers.add_parser("summary", help="latency, throughput and cost per provider, model and server")
+    summary_parser.add_argument("--days", type=float, help="only requests from the last DAYS days")
+    export_parser = subparsers.add_parser("export", help="write every request as a row of a CSV file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--days", type=float, help="only requests from the last DAYS days")
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_help()
+        return 1
+    store = MetricsStore(args.db)
+    since = time.time() - args.days * 86400 if args.days else None
+    if args.command == "summary":
+        print(format_summary(store.summary(since)))
+    else:
+        print(f"Exported {store.export_csv(args.path, since)} requests to {args.path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
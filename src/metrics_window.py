@@ -0,0 +1,110 @@
+import time
+import tkinter as tk
+from tkinter import ttk
+from tkinter import filedialog
+from tkinter import messagebox
+from concurrent.futures import ThreadPoolExecutor
+
+# Time ranges of the window, by the name shown in the dropdown, in seconds (None: everything)
+PERIODS = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400, "All time": None}
+
+SUMMARY_COLUMNS = [
+    ("provider", "Provider", 90), ("model", "Model", 170), ("base_url", "Server", 160), ("requests", "Requests", 65),
+    ("errors", "Errors", 50), ("ttft_p50_ms", "TTFT p50", 70), ("ttft_p90_ms", "TTFT p90", 70), ("connect_p50_ms", "Connect p50", 80),
+    ("itl_p50_ms", "ITL p50", 60), ("tokens_per_second_p50", "Tokens/s", 65), ("total_p50_ms", "Total p50", 70),
+    ("tokens", "Tokens", 70), ("cost", "Cost", 70),
+]
+
+class MetricsWindow:
+    """Per provider, model and server summary of the request metrics, refreshed while the window is open.
+
+    The database is read on a background thread so a long history never
+    blocks the UI.
+    """
+    refresh_ms = 5000
+
+    def __init__(self, parent, store):
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics")
+        self.refresh_id = None
+
+        self.window = tk.Toplevel(parent)
+        self.window.title("Request Metrics")
+        self.window.geometry("1100x350")
+        frame = ttk.Frame(self.window, padding="5")
+        frame.pack(fill="both", expand=True)
+
+        self.period_var = tk.StringVar(value="Last 24 hours")
+        ttk.Label(frame, text="Requests from:").grid(row=0, column=0, sticky="w")
+        ttk.OptionMenu(frame, self.period_var, self.period_var.get(), *PERIODS, command=lambda *args: self.refresh()).grid(row=0, column=1, sticky="w")
+        ttk.Button(frame, text="Export CSV...", command=self.export).grid(row=0, column=3, sticky="e", padx=3)
+        ttk.Button(frame, text="Clear", command=self.clear).grid(row=0, column=4, sticky="e")
+
+        self.tree = ttk.Treeview(frame, columns=[name for name, _, _ in SUMMARY_COLUMNS], show="headings")
+        for name, heading, width in SUMMARY_COLUMNS:
+            self.tree.heading(name, text=heading)
+            self.tree.column(name, width=width, anchor="w" if name in ("provider", "model", "base_url") else "e")
+        self.tree.grid(row=1, column=0, columnspan=5, sticky="nsew", pady=3)
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self.tree.yview)
+        scrollbar.grid(row=1, column=5, sticky="ns")
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.status_var = tk.StringVar()
+        ttk.Label(frame, textvariable=self.status_var).grid(row=2, column=0, columnspan=5, sticky="w")
+        frame.columnconfigure(2, weight=1)
+        frame.rowconfigure(1, weight=1)
+
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def since(self):
+        seconds = PERIODS[self.period_var.get()]
+        return time.time() - seconds if seconds else None
+
+    def refresh(self):
+        if self.refresh_id is not None:
+            self.window.after_cancel(self.refresh_id)
+        future = self.executor.submit(self.store.summary, self.since())
+        self.poll(future)
+
+    def poll(self, future):
+        if not future.done():
+            self.refresh_id = self.window.after(50, self.poll, future)
+            return
+        self.refresh_id = self.window.after(self.refresh_ms, self.refresh)
+        if future.exception() is not None:
+            self.status_var.set(f"Could not read the metrics: {future.exception()}")
+            return
+        self.show(future.result())
+
+    def show(self, summaries):
+        def ms(value):
+            return f"{value:.0f} ms" if value is not None else "-"
+        self.tree.delete(*self.tree.get_children())
+        for summary in summaries:
+            tokens_per_second = summary["tokens_per_second_p50"]
+            self.tree.insert("", tk.END, values=(
+                summary["provider"] or "-", summary["model"] or "-", summary["base_url"] or "", summary["requests"], summary["errors"],
+                ms(summary["ttft_p50_ms"]), ms(summary["ttft_p90_ms"]), ms(summary["connect_p50_ms"]), ms(summary["itl_p50_ms"]),
+                f"{tokens_per_second:.1f}" if tokens_per_second is not None else "-", ms(summary["total_p50_ms"]),
+                summary["tokens"], f"${summary['cost']:.4f}"))
+        requests = sum(summary["requests"] for summary in summaries)
+        self.status_var.set(f"{requests} requests, updated {time.strftime('%H:%M:%S')}")
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self.window, defaultextension=".csv", initialfile="metrics.csv",
+                                            filetypes=[("CSV files", "*.csv")])
+        if path:
+            count = self.store.export_csv(path, self.since())
+            self.status_var.set(f"Exported {count} requests to {path}")
+
+    def clear(self):
+        if messagebox.askyesno("Clear Metrics", "Delete every recorded request?", parent=self.window):
+            self.store.clear()
+            self.refresh()
+
+    def close(self):
+        if self.refresh_id is not None:
+            self.window.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        self.executor.shutdown(wait=False)
+        self.window.destroy()
@@ -0,0 +1,246 @@
+"""
+Mock OpenAI-compatible chat completions server
+
+Usage:
+    python src/mock_server.py [--port 8000] [--ttft 0.2] [--tokens-per-second 50] ...
+
+Serves POST /v1/chat/completions (streamed and non-streamed), the Anthropic
+style POST /v1/messages and GET /v1/models with made-up replies, so custom
+server features, the batch runner and the benchmarks can be exercised offline. To use it from the app, add a custom
+server with the base URL http://127.0.0.1:8000/v1/ and the model mock-model.
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+WORDS = ["the", "mock", "server", "streams", "a", "reply", "token", "by", "token", "for", "testing", "offline"]
+
+class MockServerStats:
+    """Counters shared by every connection of one mock server."""
+    def __init__(self):
+        self.lock = Lock()
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.requests = 0
+        self.errors = 0
+        self.disconnects = 0  # streams the client hung up on before they finished
+
+    def add(self, name, amount=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: value for name, value in vars(self).items() if name != "lock"}
+
+class MockServerHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    models = ["mock-model"]
+    ttft = 0.1  # seconds before the first token
+    tokens_per_second = 100.0
+    reply_tokens = 50
+    error_rate = 0.0  # fraction of requests answered with a 503
+    rate_limit_rate = 0.0  # fraction of requests answered with a 429
+    handshake_delay = 0.0  # seconds every new connection waits before its first request is read, like a TLS handshake
+    stats = None
+
+    def setup(self):
+        super().setup()
+        self.stats.add("connections_opened")
+        if self.handshake_delay:
+            time.sleep(self.handshake_delay)
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            self.stats.add("connections_closed")
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, headers=()):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": model, "object": "model", "owned_by": "mock"} for model in self.models]})
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+        anthropic = self.path.rstrip("/").endswith("/messages")
+        if not anthropic and not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        self.stats.add("requests")
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            self.stats.add("errors")
+            self.send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, [("Retry-After", "1")])
+            return
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.stats.add("errors")
+            self.send_json(503, {"error": {"message": "The mock server is overloaded", "type": "server_error"}})
+            return
+        model = request.get("model", self.models[0])
+        if model not in self.models:
+            self.send_json(404, {"error": {"message": f"The model '{model}' does not exist", "type": "invalid_request_error"}})
+            return
+        tokens = self.reply(request)
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in request.get("messages", []))
+        if anthropic and request.get("stream"):
+            self.stream_anthropic(model, tokens, prompt_tokens)
+        elif anthropic:
+            time.sleep(self.ttft + len(tokens) / self.tokens_per_second)
+            self.send_json(200, {
+                "id": "msg_mock", "type": "message", "role": "assistant", "model": model,
+                "content": [{"type": "text", "text": "".join(tokens)}], "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": prompt_tokens, "output_tokens": len(tokens)},
+            })
+        elif request.get("stream"):
+            include_usage = (request.get("stream_options") or {}).get("include_usage")
+            self.stream(model, tokens, prompt_tokens if include_usage else None)
+        else:
+            time.sleep(self.ttft + len(tokens) / self.tokens_per_second)
+            self.send_json(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)},
+            })
+
+    def reply(self, request):
+        """Return the reply as a list of tokens; it is seeded by the last message so it is repeatable."""
+        messages = request.get("messages") or [{}]
+        last_content = str(messages[-1].get("content", ""))
+        count = min(self.reply_tokens, request.get("max_tokens") or self.reply_tokens)
+        rng = random.Random(last_content)
+        return [rng.choice(WORDS) + " " for _ in range(count)]
+
+    def write_chunk(self, data, event=None):
+        payload = (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+        payload = payload.encode("utf-8")
+        self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.flush()
+
+    def stream(self, model, tokens, prompt_tokens=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        created = int(time.time())
+        try:
+            time.sleep(self.ttft)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(1 / self.tokens_per_second)
+                chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self.write_chunk(json.dumps(chunk))
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            self.write_chunk(json.dumps(chunk))
+            if prompt_tokens is not None:
+                # Asked for with stream_options.include_usage: a last chunk without choices
+                chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model, "choices": [],
+                         "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}}
+                self.write_chunk(json.dumps(chunk))
+            self.write_chunk("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.stats.add("disconnects")
+            self.close_connection = True
+
+    def stream_anthropic(self, model, tokens, prompt_tokens):
+        """Stream the reply as Anthropic Messages API server-sent events."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [("message_start", {"type": "message_start", "message": {
+                      "id": "msg_mock", "type": "message", "role": "assistant", "model": model, "content": [],
+                      "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": prompt_tokens, "output_tokens": 1}}}),
+                  ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})]
+        try:
+            for name, data in events:
+                self.write_chunk(json.dumps(data), name)
+            time.sleep(self.ttft)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(1 / self.tokens_per_second)
+                delta = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}}
+                self.write_chunk(json.dumps(delta), "content_block_delta")
+            events = [("content_block_stop", {"type": "content_block_stop", "index": 0}),
+                      ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                         "usage": {"output_tokens": len(tokens)}}),
+                      ("message_stop", {"type": "message_stop"})]
+            for name, data in events:
+                self.write_chunk(json.dumps(data), name)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.stats.add("disconnects")
+            self.close_connection = True
+
+class MockServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 would make load tests measure the server's accept queue instead of the client
+    request_queue_size = 128
+    daemon_threads = True
+
+def start_mock_server(host="127.0.0.1", port=0, **settings):
+    """Start a mock server on a daemon thread. `settings` override MockServerHandler's class attributes.
+
+    Returns the server; its base URL is server.base_url and its counters server.stats.
+    """
+    stats = MockServerStats()
+    handler = type("ConfiguredMockServerHandler", (MockServerHandler,), dict(settings, stats=stats))
+    server = MockServer((host, port), handler)
+    server.stats = stats
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1/"
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--models", default="mock-model", help="comma separated model names")
+    parser.add_argument("--ttft", type=float, default=MockServerHandler.ttft, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=MockServerHandler.tokens_per_second)
+    parser.add_argument("--reply-tokens", type=int, default=MockServerHandler.reply_tokens)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    parser.add_argument("--handshake-delay", type=float, default=0.0, help="seconds added to every new connection")
+    args = parser.parse_args()
+    server = start_mock_server(args.host, args.port, models=[model.strip() for model in args.models.split(",") if model.strip()],
+                               ttft=args.ttft, tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens,
+                               error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                               handshake_delay=args.handshake_delay)
+    print(f"Mock server listening on {server.base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
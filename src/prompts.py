@@ -2,4 +2,9 @@ file_naming_prompt = "The user is saving this chat log. In your next message, \
 please write only a suggested name for the file. It should be in the format 'file-name-is-separated-by-hyphens', \
 it should be descriptive of the chat you had with the user, and it should be very concise - no more than 4 words \
 (and ideally just 2 or 3). Do not acknowledge this system message with any additional words, \
-please simply write the suggested filename."
\ No newline at end of file
+please simply write the suggested filename."
+
+summary_prompt = "The conversation above is too long to be sent in full. In your next message, \
+please summarize it for the assistant that will continue it: keep the user's goals, the facts, names, numbers and \
+decisions that were established, and any open questions. Be concise, use no more than 300 words, and do not \
+acknowledge this system message."
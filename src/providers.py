@@ -0,0 +1,268 @@
+"""
+Provider adapters
+
+Everything that differs between providers lives in one ProviderAdapter per
+endpoint: converting a conversation to the provider's message format, its
+client with a pooled keep-alive HTTP connection, and streaming a reply.
+A ProviderRegistry maps every model to its adapter in a dict, so finding the
+provider for a request is a single lookup:
+
+    adapter = registry.resolve(model)
+    messages, system_message = adapter.convert_messages(model, messages, image_detail)
+    async for text in adapter.stream(model, messages, system_message, temperature, max_tokens, usage):
+        ...
+
+Clients are built on first use and reused until the adapter's credentials
+change; the old client is closed once the requests still streaming on it
+have finished. Their connections stay open for PROVIDER_KEEPALIVE_SECONDS instead of
+httpx's default of 5 seconds, so the next turn of a conversation usually
+skips the TCP and TLS handshakes.
+"""
+
+import asyncio
+from threading import Lock
+from constants import OPENAI_MODELS, OPENAI_VISION_MODELS, ANTHROPIC_MODELS, GOOGLE_MODELS, PROVIDER_MAX_CONNECTIONS, PROVIDER_KEEPALIVE_SECONDS
+from lazy_client import LazyClient
+from metrics import attach_connection_trace, current_request
+from message_normalizer import AnthropicNormalizer, GoogleNormalizer, NormalizerCache
+from streaming import STREAMERS
+from utils import convert_messages_for_openai, convert_messages_for_anthropic, convert_messages_for_google
+
+VISION_MODELS = frozenset(OPENAI_VISION_MODELS)
+
+class ProviderAdapter:
+    """One API endpoint. `get_credentials()` returns (api_key, base_url, organization) and is read on every request."""
+    kind = None  # key into streaming.STREAMERS
+    label = None
+    requires_api_key = True
+    install_message = None
+
+    def __init__(self, name, models, get_credentials, include_usage=True, max_connections=PROVIDER_MAX_CONNECTIONS, max_retries=None):
+        self.name = name
+        self.models = models  # None serves any model the registry has no other adapter for
+        self.get_credentials = get_credentials
+        self.include_usage = include_usage
+        self.max_connections = max_connections
+        self.max_retries = max_retries  # None keeps the SDK's default retries
+        self.client = LazyClient(self.create_client, on_replace=self.close_client)
+        self.clients_lock = Lock()
+        self.active_streams = {}  # client -> number of replies streaming on it
+        self.client_loops = {}  # client -> the event loop its requests run on, where it has to be closed
+        self.retired = set()  # replaced clients waiting for their last stream to end
+        self.closing = set()  # close() tasks of replaced clients, referenced until they finish
+
+    def create_http_client(self):
+        import httpx
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections,
+                              keepalive_expiry=PROVIDER_KEEPALIVE_SECONDS)
+        return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(600, connect=10), event_hooks={"request": [attach_connection_trace]})
+
+    def client_options(self):
+        return {} if self.max_retries is None else {"max_retries": self.max_retries}
+
+    def create_client(self, api_key, base_url, organization):
+        raise NotImplementedError
+
+    def close_client(self, client):
+        """Close a client replaced after the credentials changed, so its pooled connections aren't left open.
+
+        Replies still streaming on it are left to finish; it is closed when the last one ends.
+        """
+        with self.clients_lock:
+            if self.active_streams.get(client):
+                self.retired.add(client)
+                return
+        self.schedule_close(client)
+
+    def schedule_close(self, client):
+        # The client's connections belong to the loop its requests ran on (the app's AsyncWorker), so it is closed there
+        with self.clients_lock:
+            loop = self.client_loops.pop(client, None)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is not None and loop is not running:
+            if not loop.is_closed():
+                asyncio.run_coroutine_threadsafe(client.close(), loop)
+        elif running is not None:
+            task = running.create_task(client.close())
+            self.closing.add(task)
+            task.add_done_callback(self.closing.discard)
+        else:
+            asyncio.run(client.close())  # never used for a request, so it holds no connections of any loop
+
+    def stream_started(self, client):
+        with self.clients_lock:
+            self.active_streams[client] = self.active_streams.get(client, 0) + 1
+            self.client_loops[client] = asyncio.get_running_loop()
+
+    def stream_finished(self, client):
+        with self.clients_lock:
+            self.active_streams[client] -= 1
+            if self.active_streams[client]:
+                return
+            del self.active_streams[client]
+            if client not in self.retired:
+                return
+            self.retired.discard(client)
+        self.schedule_close(client)
+
+    def has_api_key(self):
+        return not self.requires_api_key or bool(self.get_credentials()[0])
+
+    def get_client(self):
+        """The provider's client, or None if it can't be created (no API key, or its package isn't installed)."""
+        return self.client.get(*self.get_credentials())
+
+    def convert_messages(self, model, messages, image_detail="low"):
+        """Return the conversation in the provider's format and the separate system message, if the provider takes one."""
+        raise NotImplementedError
+
+    async def stream(self, model, messages, system_message, temperature, max_tokens, usage=None, metrics=None):
+        """Async generator of the reply's text deltas; `messages` and `system_message` come from convert_messages.
+
+        If a metrics.RequestMetrics is given, the request's timings are recorded in it; the caller finishes it.
+        """
+        client = self.get_client()
+        streamer = STREAMERS[self.kind](client, model, messages, system_message, temperature, max_tokens, usage, self.include_usage)
+        if metrics is not None:
+            metrics.start(self.name, model, self.get_credentials()[1])
+            current_request.set(metrics)
+        self.stream_started(client)
+        try:
+            async for text in streamer:
+                if metrics is not None:
+                    metrics.chunk()
+                yield text
+        finally:
+            if metrics is not None:
+                current_request.set(None)
+            try:
+                # Closes the HTTP response now, also when the caller stops reading early
+                await streamer.aclose()
+            finally:
+                self.stream_finished(client)
+
+class OpenAIAdapter(ProviderAdapter):
+    """OpenAI, and every OpenAI-compatible custom server."""
+    kind = "openai"
+    label = "OpenAI"
+    install_message = "OpenAI API not installed. Please install the 'openai' package with the `pip install openai` command."
+
+    def create_client(self, api_key, base_url, organization):
+        if self.requires_api_key and not api_key:
+            return None
+        try:
+            from openai import AsyncOpenAI
+        except ImportError:
+            print("WARNING: OpenAI API not installed. If you wish to use OpenAI or custom server models, install the 'openai' package with the `pip install openai` command.")
+            return None
+        return AsyncOpenAI(api_key=api_key, organization=organization or None, base_url=base_url or None,
+                           http_client=self.create_http_client(), **self.client_options())
+
+    def convert_messages(self, model, messages, image_detail="low"):
+        return convert_messages_for_openai(messages, image_detail, vision=model in VISION_MODELS)
+
+class CustomServerAdapter(OpenAIAdapter):
+    """An OpenAI-compatible server. Local servers often need no API key and may not support stream_options."""
+    label = "Custom server"
+    requires_api_key = False
+    install_message = "OpenAI package not found, custom servers will be disabled! Install the OpenAI API with `pip install openai`"
+
+    def __init__(self, name, models, get_credentials, include_usage=False, **kwargs):
+        super().__init__(name, models, get_credentials, include_usage=include_usage, **kwargs)
+
+class AnthropicAdapter(ProviderAdapter):
+    kind = "anthropic"
+    label = "Anthropic"
+    install_message = "Anthropic API not installed. Please install the 'anthropic' package with the `pip install anthropic` command."
+
+    def __init__(self, *args, prompt_caching=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prompt_caching = prompt_caching
+        self.normalizers = NormalizerCache(AnthropicNormalizer)
+
+    def create_client(self, api_key, base_url, organization):
+        if not api_key:
+            return None
+        try:
+            import anthropic
+        except ImportError:
+            print("WARNING: Anthropic API not installed. If you wish to use Anthropic models, install the 'anthropic' package with the `pip install anthropic` command.")
+            return None
+        return anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url or None, http_client=self.create_http_client(), **self.client_options())
+
+    def convert_messages(self, model, messages, image_detail="low"):
+        return convert_messages_for_anthropic(messages, self.prompt_caching, self.normalizers)
+
+class GoogleAdapter(ProviderAdapter):
+    """Gemini models. The google-generativeai package talks gRPC over its own channel, so there is no HTTP client to pool."""
+    kind = "google"
+    label = "Google"
+    install_message = "Google GenerativeAI API not installed. If you wish to use Google Gemini models, install the 'google-generativeai' package with the `pip install google-generativeai` command."
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.normalizers = NormalizerCache(GoogleNormalizer)
+
+    def create_client(self, api_key, base_url, organization):
+        if not api_key:
+            return None
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            print("WARNING: " + self.install_message)
+            return None
+        genai.configure(api_key=api_key)
+        return genai
+
+    def close_client(self, client):
+        pass  # the genai module is configured in place, there is no client of our own to close
+
+    def convert_messages(self, model, messages, image_detail="low"):
+        return convert_messages_for_google(messages, self.normalizers)
+
+ADAPTERS = {"openai": OpenAIAdapter, "anthropic": AnthropicAdapter, "google": GoogleAdapter}
+
+class ProviderRegistry:
+    """Finds the provider for a model with one dict lookup.
+
+    Works with anything that has a `models` list, such as adapters or batch
+    providers. When several serve the same model the first one wins; the first
+    with `models` set to None serves every model nobody else does. Call
+    rebuild() after changing an entry's models.
+    """
+    def __init__(self, entries=()):
+        self.entries = []
+        self.index = {}
+        self.fallback = None
+        self.set_entries(entries)
+
+    def set_entries(self, entries):
+        self.entries = list(entries)
+        self.rebuild()
+
+    def rebuild(self):
+        index = {}
+        fallback = None
+        for entry in self.entries:
+            if entry.models is None:
+                fallback = fallback or entry
+                continue
+            for model in entry.models:
+                index.setdefault(model, entry)
+        # Swapped in whole, since requests resolve models from the event loop thread
+        self.index, self.fallback = index, fallback
+
+    def resolve(self, model):
+        return self.index.get(model, self.fallback)
+
+def builtin_adapters(config):
+    """The Anthropic, Google and OpenAI adapters, reading their API keys from `config` (a ConfigParser) on every request."""
+    return [
+        AnthropicAdapter("anthropic", ANTHROPIC_MODELS, lambda: (config.get("anthropic", "api_key", fallback=""), None, None)),
+        GoogleAdapter("google", GOOGLE_MODELS, lambda: (config.get("google", "api_key", fallback=""), None, None)),
+        OpenAIAdapter("openai", OPENAI_MODELS, lambda: (config.get("openai", "api_key", fallback=""), None,
+                                                        config.get("openai", "organization", fallback=""))),
+    ]
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+from constants import RESPONSE_CACHE_MAX_BYTES
+
+class ResponseCache:
+    """Disk-backed cache of completed replies, keyed by the exact request that produced them.
+
+    A reply is stored as the list of streamed deltas so a hit can be replayed
+    through the same output as a live response. When the cached text exceeds
+    `max_bytes`, the least recently used replies are evicted.
+    """
+    def __init__(self, db_path=os.path.join("temp", "response_cache.sqlite"), max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.connection = None
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def connect(self):
+        if self.connection is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                chunks TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL)""")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_by_last_used ON responses (last_used)")
+            self.connection.commit()
+            self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self.connection
+
+    def key(self, model, messages, system_message, temperature, max_tokens):
+        """Hash a request as it is sent to the provider, i.e. after its adapter converted the messages."""
+        request = {"model": model, "messages": messages, "system": system_message, "temperature": temperature, "max_tokens": max_tokens}
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached deltas for `key`, or None."""
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute("SELECT chunks, size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+            self.hits += 1
+            self.bytes_saved += row[1]
+        return json.loads(row[0])
+
+    def put(self, key, model, chunks):
+        data = json.dumps(chunks, ensure_ascii=False)
+        size = len("".join(chunks).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            connection = self.connect()
+            old = connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, model, data, size, time.time()))
+            self.total_bytes += size
+            self.evict(connection)
+            connection.commit()
+
+    def evict(self, connection):
+        """Drop least recently used replies until the cache fits in max_bytes. Must be called with the lock held."""
+        while self.total_bytes > self.max_bytes:
+            rows = connection.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 100").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+
+    def clear(self):
+        with self.lock:
+            connection = self.connect()
+            connection.execute("DELETE FROM responses")
+            connection.commit()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            entries = self.connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "bytes_saved": self.bytes_saved,
+                    "entries": entries, "bytes": self.total_bytes}
+
+class RecordingOutput:
+    """Passes streamed deltas on to `output` and keeps a copy of them for the cache."""
+    def __init__(self, output):
+        self.output = output
+        self.chunks = []
+
+    def push(self, text):
+        if text:
+            self.chunks.append(text)
+        self.output.push(text)
+
+    def set_usage(self, usage):
+        self.output.set_usage(usage)
+
+    def call(self, func, *args):
+        self.output.call(func, *args)
+
+# Shared by every window so they all hit the same cache
+response_cache = ResponseCache()
@@ -0,0 +1,59 @@
+import importlib
+import sys
+import time
+from threading import Thread
+
+# Set as early as possible by main.py, the reference point of the startup report
+process_start = time.perf_counter()
+
+# Seconds spent importing each module loaded by preload()
+import_times = {}
+preload_threads = []
+
+# Slow imports that should never be needed to show the main window
+DEFERRED_MODULES = ["tiktoken", "requests", "openai", "anthropic", "google.generativeai"]
+
+# Named points in time (seconds since process_start) shown in the startup report
+marks = {}
+
+def preload(module_names, then=None):
+    """Import `module_names` on a background thread so their first use doesn't stall the UI.
+
+    Modules that are already imported or not installed are skipped. `then` is
+    called on the same thread once every module has been imported.
+    """
+    def run():
+        for name in module_names:
+            if name in sys.modules:
+                continue
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                continue
+            import_times[name] = time.perf_counter() - start
+        if then is not None:
+            then()
+    thread = Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    preload_threads.append(thread)
+    return thread
+
+def mark(name):
+    marks[name] = time.perf_counter() - process_start
+
+def report(root):
+    """Print time-to-first-frame and import costs to stdout, then close the window."""
+    root.update()
+    mark("first frame")
+    loaded_early = [name for name in DEFERRED_MODULES if name in sys.modules]
+    for thread in preload_threads:
+        thread.join(timeout=30)
+    mark("preloaded")
+    print("Startup report")
+    for name, seconds in marks.items():
+        print(f"  {name:<28}{seconds * 1000:9.2f} ms")
+    print(f"  slow modules loaded before the first frame: {', '.join(loaded_early) or 'none'}")
+    for name, seconds in import_times.items():
+        print(f"  import {name:<21}{seconds * 1000:9.2f} ms (background)")
+    root.destroy()
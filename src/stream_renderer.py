@@ -0,0 +1,107 @@
+import time
+from collections import deque
+from threading import Lock
+
+class StreamRenderer:
+    """Buffers streamed text from worker threads and flushes it to the UI on a fixed cadence.
+
+    Worker threads call push() for every delta; the Tk main loop drains the buffer
+    every `interval_ms` and hands all pending text to `write` in a single call.
+    """
+    def __init__(self, root, write, interval_ms=25):
+        self.root = root
+        self.write = write
+        self.interval_ms = interval_ms
+        self.lock = Lock()
+        self.queue = deque()
+        self.flush_id = None
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.deltas_received = 0
+        self.deltas_rendered = 0
+        self.chars_rendered = 0
+        self.flush_count = 0
+        self.first_delta_time = None
+        self.last_render_time = None
+        self.usage = None  # token usage reported by the provider, see utils.usage_to_dict
+
+    def start(self):
+        """Begin a new stream. Returns a generation number identifying it."""
+        with self.lock:
+            self.queue.clear()
+        self.reset_stats()
+        self.generation += 1
+        if self.flush_id is None:
+            self.flush_id = self.root.after(self.interval_ms, self.flush)
+        return self.generation
+
+    def stop(self):
+        """Stop the flush timer. Text still queued is dropped by the next start()."""
+        if self.flush_id is not None:
+            self.root.after_cancel(self.flush_id)
+            self.flush_id = None
+
+    def push(self, text):
+        """Queue a streamed delta. Safe to call from any thread."""
+        if not text:
+            return
+        with self.lock:
+            if self.first_delta_time is None:
+                self.first_delta_time = time.perf_counter()
+            self.deltas_received += 1
+            self.queue.append(text)
+
+    def set_usage(self, usage):
+        """Record the provider's token usage for the current stream. Safe to call from any thread."""
+        self.usage = usage
+
+    def call(self, func, *args):
+        """Queue a callback to run on the UI thread after all text pushed before it."""
+        with self.lock:
+            self.queue.append((func, args))
+
+    def flush(self):
+        with self.lock:
+            items = list(self.queue)
+            self.queue.clear()
+            deltas = self.deltas_received - self.deltas_rendered
+        # Join consecutive text deltas so each run is a single widget insert
+        pending_text = []
+        for item in items:
+            if isinstance(item, str):
+                pending_text.append(item)
+                continue
+            self.render("".join(pending_text))
+            pending_text = []
+            func, args = item
+            func(*args)
+        self.render("".join(pending_text))
+        if deltas:
+            self.deltas_rendered += deltas
+            self.last_render_time = time.perf_counter()
+        if self.flush_id is not None:
+            self.flush_id = self.root.after(self.interval_ms, self.flush)
+
+    def render(self, text):
+        if not text:
+            return
+        self.write(text)
+        self.chars_rendered += len(text)
+        self.flush_count += 1
+
+    def tokens_per_second(self):
+        # Each streamed delta is (roughly) one token for all supported providers
+        if self.first_delta_time is None or self.last_render_time is None:
+            return 0.0
+        elapsed = self.last_render_time - self.first_delta_time
+        return self.deltas_rendered / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            "tokens_rendered": self.deltas_rendered,
+            "chars_rendered": self.chars_rendered,
+            "widget_inserts": self.flush_count,
+            "tokens_per_second": self.tokens_per_second(),
+        }
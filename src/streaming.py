@@ -0,0 +1,54 @@
+"""
+Async streaming for every provider behind one interface
+
+Each stream_* function is an async generator of the reply's text deltas:
+
+    async for text in stream_anthropic(client, model, messages, system_message, temperature, max_tokens, usage):
+        ...
+
+`messages` and `system_message` are in the provider's format, as returned by
+ProviderAdapter.convert_messages. If a `usage` dict is given, it is filled with
+the provider's token usage (see utils.usage_to_dict) once the reply is complete.
+All of them await the network without blocking the event loop, so any number
+of replies can stream concurrently, and cancelling the consuming task closes
+the HTTP response right away instead of after the next chunk.
+"""
+
+from utils import anthropic_extra_headers, usage_to_dict
+
+async def stream_openai(client, model, messages, system_message, temperature, max_tokens, usage=None, include_usage=False):
+    # OpenAI reports usage (including cached prompt tokens) in a final chunk; custom servers may not support it
+    extra_body = {"stream_options": {"include_usage": True}} if include_usage else None
+    response = await client.chat.completions.create(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                                                    stream=True, extra_body=extra_body)
+    try:
+        async for chunk in response:
+            if usage is not None and getattr(chunk, "usage", None) is not None:
+                usage.update(usage_to_dict(chunk.usage))
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
+    finally:
+        await response.close()
+
+async def stream_anthropic(client, model, messages, system_message, temperature, max_tokens, usage=None, include_usage=True):
+    # `client` is an anthropic.AsyncAnthropic; 4000 is the max tokens for anthropic
+    async with client.messages.stream(model=model, max_tokens=min(max_tokens, 4000), messages=messages, system=system_message,
+                                      temperature=temperature, extra_headers=anthropic_extra_headers(messages, system_message)) as stream:
+        async for text in stream.text_stream:
+            yield text
+        if usage is not None:
+            final_message = await stream.get_final_message()
+            usage.update(usage_to_dict(final_message.usage))
+
+async def stream_google(client, model, messages, system_message, temperature, max_tokens, usage=None, include_usage=True):
+    # `client` is the configured google.generativeai module
+    google_model = client.GenerativeModel(model, generation_config={"temperature": temperature, "max_output_tokens": max_tokens})
+    response = await google_model.generate_content_async(messages, stream=True)
+    async for chunk in response:
+        # Safety and finish-only chunks have no parts
+        if chunk.parts and chunk.parts[0].text:
+            yield chunk.parts[0].text
+    if usage is not None and getattr(response, "usage_metadata", None) is not None:
+        usage.update(usage_to_dict(response.usage_metadata))
+
+STREAMERS = {"openai": stream_openai, "anthropic": stream_anthropic, "google": stream_google}
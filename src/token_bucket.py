@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """Asyncio rate limiter: holds up to `capacity` units and refills at `rate` units per second.
+
+    acquire() waits until enough units are available. Waiters are served in
+    order, so a large request can't be starved by a stream of small ones.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = max(1, capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = None
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # Asking for more than fits in the bucket would wait forever; take a full bucket instead
+        amount = min(amount, self.capacity)
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            self.refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= amount
@@ -0,0 +1,80 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+class TokenCounter:
+    """Counts tokens with cached encoders and a memo of per-text token counts.
+
+    Encoders are looked up once per model, and the token count of every message
+    body is remembered by content hash (with LRU eviction), so recounting a
+    conversation only encodes the messages that changed.
+    """
+    def __init__(self, max_cached_counts=50000):
+        self.max_cached_counts = max_cached_counts
+        self.encodings = {}
+        self.counts = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_encoding(self, model):
+        encoding = self.encodings.get(model)
+        if encoding is None:
+            import tiktoken  # imported on first use, it is slow to load
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                print("Warning: model not found for token counter. Using cl100k_base encoding.")
+                encoding = tiktoken.get_encoding("cl100k_base")
+            self.encodings[model] = encoding
+        return encoding
+
+    def encode(self, text, model):
+        return self.get_encoding(model).encode(text)
+
+    def decode(self, tokens, model):
+        return self.get_encoding(model).decode(tokens)
+
+    def count_text(self, text, model):
+        encoding = self.get_encoding(model)
+        key = (encoding.name, hashlib.sha1(text.encode("utf-8")).digest())
+        with self.lock:
+            count = self.counts.get(key)
+            if count is not None:
+                self.counts.move_to_end(key)
+                self.hits += 1
+                return count
+        count = len(encoding.encode(text))
+        with self.lock:
+            self.misses += 1
+            self.counts[key] = count
+            if len(self.counts) > self.max_cached_counts:
+                self.counts.popitem(last=False)
+        return count
+
+    def count_message(self, message, model):
+        """Return the number of tokens used by a single message, excluding reply priming."""
+        if "gpt-3.5-turbo" in model:
+            tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
+            tokens_per_name = -1  # if there's a name, the role is omitted
+        else:
+            tokens_per_message = 3
+            tokens_per_name = 1
+        num_tokens = tokens_per_message
+        for key, value in message.items():
+            num_tokens += self.count_text(value, model)
+            if key == "name":
+                num_tokens += tokens_per_name
+        return num_tokens
+
+    def count_messages(self, messages, model):
+        num_tokens = sum(self.count_message(message, model) for message in messages)
+        num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+        return num_tokens
+
+    def stats(self):
+        with self.lock:
+            return {"cached_counts": len(self.counts), "hits": self.hits, "misses": self.misses}
+
+# Shared by the whole application so every caller benefits from the same caches
+token_counter = TokenCounter()
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from constants import MODEL_INFO, ANTHROPIC_MODELS, GOOGLE_MODELS, CACHE_READ_PRICE_FACTOR, CACHE_WRITE_PRICE_FACTOR
+from token_counter import token_counter
+
+class TokenMeter:
+    """Keeps a running token and cost estimate for the conversation in the main window.
+
+    Every message registers a callable that reads its current role and content.
+    Changed messages are recounted after a short debounce; only those messages
+    are re-encoded, and large edits are counted on a background thread.
+    """
+    debounce_ms = 300
+    background_threshold_chars = 20000
+
+    def __init__(self, root, text_var, get_model, get_max_output_tokens):
+        self.root = root
+        self.text_var = text_var
+        self.get_model = get_model
+        self.get_max_output_tokens = get_max_output_tokens
+        self.readers = {}
+        self.message_tokens = {}
+        self.dirty = set()
+        self.refresh_id = None
+        self.pending = None
+        self.generation = 0
+        self.last_usage = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="token-meter")
+
+    def update(self, key, read_message):
+        """Register or update a message and schedule a recount of it."""
+        self.readers[key] = read_message
+        self.dirty.add(key)
+        self.schedule_refresh()
+
+    def remove(self, *keys):
+        for key in keys:
+            self.readers.pop(key, None)
+            self.message_tokens.pop(key, None)
+            self.dirty.discard(key)
+        self.schedule_refresh()
+
+    def invalidate(self, *args):
+        """Recount every message, e.g. after the model (and so the encoding) changed."""
+        self.generation += 1
+        self.message_tokens.clear()
+        self.dirty = set(self.readers)
+        self.schedule_refresh()
+
+    def schedule_refresh(self, *args):
+        if self.refresh_id is not None:
+            self.root.after_cancel(self.refresh_id)
+        self.refresh_id = self.root.after(self.debounce_ms, self.refresh)
+
+    def refresh(self):
+        self.refresh_id = None
+        if self.pending is not None:
+            # A background count is still running; try again once it has been applied
+            self.schedule_refresh()
+            return
+        model = self.get_model()
+        messages = {key: self.readers[key]() for key in self.dirty}
+        self.dirty.clear()
+        if sum(len(message["content"]) for message in messages.values()) < self.background_threshold_chars:
+            self.apply(self.generation, self.count(messages, model))
+        else:
+            self.pending = self.executor.submit(self.count, messages, model)
+            self.poll_pending(self.generation)
+
+    def count(self, messages, model):
+        return {key: token_counter.count_message(message, model) for key, message in messages.items()}
+
+    def poll_pending(self, generation):
+        if not self.pending.done():
+            self.root.after(20, self.poll_pending, generation)
+            return
+        counts = self.pending.result()
+        self.pending = None
+        self.apply(generation, counts)
+
+    def apply(self, generation, counts):
+        if generation != self.generation:
+            return # counted with a stale encoding, invalidate() has already queued a recount
+        for key, tokens in counts.items():
+            if key in self.readers:
+                self.message_tokens[key] = tokens
+        self.render()
+
+    def render(self, *args):
+        model = self.get_model()
+        num_input_tokens = sum(self.message_tokens.values()) + 3  # every reply is primed with <|start|>assistant<|message|>
+        try:
+            num_output_tokens = int(self.get_max_output_tokens())
+        except ValueError:
+            num_output_tokens = 0
+        input_cost = MODEL_INFO[model]["input_price"] * num_input_tokens / 1000 if model in MODEL_INFO else 0
+        output_cost = MODEL_INFO[model]["output_price"] * num_output_tokens / 1000 if model in MODEL_INFO else 0
+        text = f"Tokens: {num_input_tokens} + {num_output_tokens} max output   Cost: up to ${input_cost + output_cost:.5f}"
+        if self.last_usage is not None:
+            text += "   " + self.describe_usage(*self.last_usage)
+        self.text_var.set(text)
+
+    def set_last_usage(self, model, usage):
+        """Show the usage the provider reported for the last reply, including cached prompt tokens."""
+        self.last_usage = (model, usage) if usage else None
+        self.render()
+
+    def describe_usage(self, model, usage):
+        text = f"Last reply: {usage['input_tokens']} in"
+        if usage["cache_read_tokens"] or usage["cache_write_tokens"]:
+            text += f" ({usage['cache_read_tokens']} cached"
+            text += f", {usage['cache_write_tokens']} written)" if usage["cache_write_tokens"] else ")"
+        text += f" + {usage['output_tokens']} out"
+        cost = usage_cost(model, usage)
+        return text + (f", ${cost:.5f}" if cost is not None else "")
+
+    def shutdown(self):
+        if self.refresh_id is not None:
+            self.root.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        self.executor.shutdown(wait=False)
+
+def usage_cost(model, usage):
+    """Cost of a reply from its reported usage, with cache reads and writes at their own prices. None for unknown models."""
+    if model not in MODEL_INFO:
+        return None
+    provider = "anthropic" if model in ANTHROPIC_MODELS else "google" if model in GOOGLE_MODELS else "openai"
+    input_price = MODEL_INFO[model]["input_price"] / 1000
+    uncached = usage["input_tokens"] - usage["cache_read_tokens"] - usage["cache_write_tokens"]
+    return (uncached * input_price
+            + usage["cache_read_tokens"] * input_price * CACHE_READ_PRICE_FACTOR.get(provider, 1)
+            + usage["cache_write_tokens"] * input_price * CACHE_WRITE_PRICE_FACTOR.get(provider, 1)
+            + usage["output_tokens"] * MODEL_INFO[model]["output_price"] / 1000)
@@ -0,0 +1,334 @@
+import tkinter as tk
+import tkinter.font as tkfont
+from bisect import bisect_right
+from itertools import count
+from tkinter import ttk
+from height_tracker import HeightTracker
+from tooltip import ToolTip
+
+class ChatMessage:
+    """A single chat message. This is the source of truth; widgets only mirror it while visible."""
+    keys = count(1)
+
+    def __init__(self, role, content, width):
+        self.key = next(ChatMessage.keys)  # never reused, unlike id(), so late results for a deleted message can't land on a new one
+        self.role = role
+        self.content = content
+        self.height_tracker = HeightTracker(width, content)
+        self.index = 0  # position in TranscriptView.messages
+        self.row = None  # the MessageRow currently showing this message, if any
+        self.edited = False  # the row's Text holds edits not yet copied into `content`
+        self.log_id = None  # id of the message in the open append-only chat log, if any
+
+class MessageRow:
+    """The widgets for one visible message: role button, content Text and delete button.
+
+    Rows are pooled by TranscriptView and re-bound to whichever message scrolls into view.
+    """
+    def __init__(self, view):
+        self.view = view
+        self.message = None
+        self.frame = ttk.Frame(view.canvas, style=view.frame_style)
+        self.role_var = tk.StringVar()
+        self.role_button = ttk.Button(self.frame, textvariable=self.role_var, width=8, command=lambda: view.on_toggle_role(self.message))
+        self.role_button.grid(row=0, column=0, sticky="nw")
+        self.role_button.bind("<Button-3>", lambda event: view.show_message_menu(self.message, event))
+        self.content_widget = tk.Text(self.frame, wrap=tk.WORD, height=1, width=view.char_width, undo=True)
+        self.content_widget.grid(row=0, column=1, sticky="we")
+        self.content_widget.bind("<KeyRelease>", lambda event: view.on_key_release(self))
+        self.delete_button = ttk.Button(self.frame, text="-", width=3, command=lambda: view.on_delete(self.message))
+        self.delete_button.grid(row=0, column=2, sticky="ne")
+        self.frame.columnconfigure(1, weight=1)
+        self.item = view.canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+
+    def bind(self, message):
+        self.message = message
+        message.row = self
+        self.role_var.set(message.role)
+        self.content_widget.configure(width=self.view.char_width, height=message.height_tracker.height)
+        self.content_widget.delete("1.0", tk.END)
+        self.content_widget.insert(tk.END, message.content)
+        self.content_widget.edit_reset()
+
+    def release(self):
+        self.view.sync(self.message)
+        self.message.row = None
+        self.message = None
+        self.view.canvas.itemconfigure(self.item, state="hidden")
+
+class TranscriptView:
+    """A virtualized list of chat messages drawn on a Canvas.
+
+    Only messages near the viewport get widgets; rows scrolled out of view are
+    recycled for the messages scrolling in. Message heights are estimated from
+    each message's HeightTracker, so laying out a long chat never touches the
+    widgets of messages that aren't visible.
+    """
+    overscan_px = 600
+
+    def __init__(self, canvas, on_add, on_insert, on_move, on_toggle_role, on_delete, on_edit):
+        self.canvas = canvas
+        self.on_add = on_add
+        self.on_insert = on_insert
+        self.on_move = on_move
+        self.on_toggle_role = on_toggle_role
+        self.on_delete = on_delete
+        self.on_edit = on_edit
+        self.messages = []
+        self.offsets = [0]  # offsets[i] is the y of message i; offsets[-1] is the total height
+        self.layout_from = 0  # offsets after this index are stale
+        self.rows = []  # rows currently bound to a message
+        self.free_rows = []
+        self.char_width = 50
+        self.frame_style = ""
+        self.line_height = None
+        self.refresh_id = None
+
+        # Add button below the last message
+        self.add_frame = ttk.Frame(self.canvas)
+        self.add_button = ttk.Button(self.add_frame, text="+", width=2, command=self.on_add)
+        self.add_button.grid(row=0, column=0, sticky="e", pady=(5, 0))
+        ttk.Label(self.add_frame, text="Add").grid(row=0, column=1, sticky="sw")
+        ToolTip(self.add_button, "Add new message")
+        self.add_item = self.canvas.create_window(0, 0, window=self.add_frame, anchor="nw")
+
+        # Right-click menu of the role buttons
+        self.menu_message = None
+        self.message_menu = tk.Menu(self.canvas, tearoff=0)
+        self.message_menu.add_command(label="Insert message above", command=lambda: self.on_insert(self.menu_message.index))
+        self.message_menu.add_command(label="Insert message below", command=lambda: self.on_insert(self.menu_message.index + 1))
+        self.message_menu.add_separator()
+        self.message_menu.add_command(label="Move up", command=lambda: self.on_move(self.menu_message, self.menu_message.index - 1))
+        self.message_menu.add_command(label="Move down", command=lambda: self.on_move(self.menu_message, self.menu_message.index + 1))
+
+        self.canvas.bind("<Configure>", self.on_canvas_configure)
+
+    # Model operations
+
+    def append(self, role, content):
+        return self.insert(len(self.messages), role, content)
+
+    def insert(self, index, role, content):
+        message = ChatMessage(role, content, self.char_width)
+        self.messages.insert(index, message)
+        # offsets[index] stays valid as the new message's y; everything after it is recomputed
+        self.offsets.insert(index + 1, self.offsets[index])
+        self.renumber(index, len(self.messages))
+        self.invalidate_layout(index)
+        return message
+
+    def remove(self, message):
+        index = message.index
+        if message.row is not None:
+            self.free_row(message.row)
+        del self.messages[index]
+        del self.offsets[index + 1]
+        self.renumber(index, len(self.messages))
+        self.invalidate_layout(index)
+
+    def move(self, message, index):
+        """Move `message` to position `index`; only the messages in between are renumbered."""
+        old_index = message.index
+        index = max(0, min(index, len(self.messages) - 1))
+        if index == old_index:
+            return
+        del self.messages[old_index]
+        self.messages.insert(index, message)
+        first = min(old_index, index)
+        self.renumber(first, max(old_index, index) + 1)
+        self.invalidate_layout(first)
+
+    def clear(self):
+        # Drop the whole model at once; only the realized rows need any work
+        for row in self.rows:
+            row.message.row = None
+            row.message = None
+            self.canvas.itemconfigure(row.item, state="hidden")
+        self.free_rows.extend(self.rows)
+        self.rows = []
+        self.messages = []
+        self.offsets = [0]
+        self.invalidate_layout(0)
+
+    def renumber(self, start, stop):
+        messages = self.messages
+        for i in range(start, stop):
+            messages[i].index = i
+
+    def content(self, message):
+        self.sync(message)
+        return message.content
+
+    def sync(self, message):
+        # Copy pending edits from the visible Text widget into the message
+        if message.edited and message.row is not None:
+            message.content = message.row.content_widget.get("1.0", "end-1c")
+            message.edited = False
+
+    def set_role(self, message, role):
+        message.role = role
+        if message.row is not None:
+            message.row.role_var.set(role)
+
+    def append_text(self, message, text):
+        self.sync(message)
+        message.content += text
+        old_height = message.height_tracker.height
+        message.height_tracker.append(text)
+        if message.row is not None:
+            message.row.content_widget.insert(tk.END, text)
+        if message.height_tracker.height != old_height:
+            self.on_height_changed(message)
+
+    def set_char_width(self, char_width):
+        if char_width == self.char_width or char_width < 1:
+            return
+        self.char_width = char_width
+        for message in self.messages:
+            message.height_tracker.set_width(char_width)
+        for row in self.rows:
+            row.content_widget.configure(width=char_width, height=row.message.height_tracker.height)
+        for row in self.free_rows:
+            row.content_widget.configure(width=char_width)
+        self.invalidate_layout(0)
+
+    def set_frame_style(self, style):
+        self.frame_style = style
+        self.add_frame.configure(style=style)
+        for row in self.rows + self.free_rows:
+            row.frame.configure(style=style)
+
+    # Editing
+
+    def on_key_release(self, row):
+        message = row.message
+        if message is None:
+            return
+        message.edited = True
+        # Only re-measure the line being edited; fall back to a full re-measure if more changed
+        content_widget = row.content_widget
+        tracker = message.height_tracker
+        old_height = tracker.height
+        line_count = int(content_widget.index("end-1c").split(".")[0])
+        line = int(content_widget.index("insert").split(".")[0])
+        line_length = int(content_widget.index(f"{line}.end").split(".")[1])
+        char_count = (content_widget.count("1.0", "end-1c", "chars") or (0,))[0]
+        if not tracker.update_line(line - 1, line_length, line_count, char_count):
+            self.sync(message)
+            tracker.reset(message.content)
+        if tracker.height != old_height:
+            self.on_height_changed(message)
+        self.on_edit(message)
+
+    def on_height_changed(self, message):
+        if message.row is not None:
+            message.row.content_widget.configure(height=message.height_tracker.height)
+        self.invalidate_layout(message.index)
+
+    def show_message_menu(self, message, event):
+        if message is None:
+            return
+        self.menu_message = message
+        last = len(self.messages) - 1
+        self.message_menu.entryconfigure("Move up", state="normal" if message.index > 0 else "disabled")
+        self.message_menu.entryconfigure("Move down", state="normal" if message.index < last else "disabled")
+        try:
+            self.message_menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            self.message_menu.grab_release()
+
+    # Layout
+
+    def measure(self):
+        """Work out the pixel height of a message row from a sample row's fonts and padding."""
+        if not self.free_rows:
+            self.free_rows.append(self.new_row())
+        row = self.free_rows[-1]
+        content_widget = row.content_widget
+        font = tkfont.Font(font=content_widget.cget("font"))
+        self.line_height = font.metrics("linespace")
+        self.text_padding = 2 * (int(content_widget.cget("borderwidth")) + int(content_widget.cget("highlightthickness")) + int(content_widget.cget("pady")))
+        self.canvas.update_idletasks()
+        self.min_row_height = max(row.role_button.winfo_reqheight(), row.delete_button.winfo_reqheight())
+
+    def row_height(self, message):
+        return max(self.min_row_height, self.text_padding + message.height_tracker.height * self.line_height)
+
+    def invalidate_layout(self, index):
+        self.layout_from = min(self.layout_from, index)
+        if self.refresh_id is None:
+            self.refresh_id = self.canvas.after_idle(self.refresh)
+
+    def update_layout(self):
+        if self.line_height is None:
+            self.measure()
+        offsets = self.offsets
+        for i in range(self.layout_from, len(self.messages)):
+            offsets[i + 1] = offsets[i] + self.row_height(self.messages[i])
+        self.layout_from = len(self.messages)
+        self.canvas.coords(self.add_item, 0, offsets[-1])
+        add_height = self.add_frame.winfo_reqheight()
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), offsets[-1] + add_height))
+
+    def refresh(self, *args):
+        """Lay out stale messages, then realize the rows in (and near) the viewport."""
+        if self.refresh_id is not None:
+            self.canvas.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        self.update_layout()
+        top = self.canvas.canvasy(0) - self.overscan_px
+        bottom = self.canvas.canvasy(self.canvas.winfo_height()) + self.overscan_px
+        first = max(0, bisect_right(self.offsets, top) - 1)
+        last = min(len(self.messages), bisect_right(self.offsets, bottom))
+        visible = set(map(id, self.messages[first:last]))
+
+        focused = self.canvas.focus_get()
+        for row in list(self.rows):
+            # Never recycle the row being typed into
+            if id(row.message) not in visible and row.content_widget != focused:
+                self.free_row(row)
+        width = self.canvas.winfo_width()
+        for index in range(first, last):
+            message = self.messages[index]
+            if message.row is None:
+                row = self.free_rows.pop() if self.free_rows else self.new_row()
+                row.bind(message)
+                self.rows.append(row)
+            self.canvas.coords(message.row.item, 0, self.offsets[index])
+            self.canvas.itemconfigure(message.row.item, width=width, state="normal")
+        for row in self.rows:
+            if id(row.message) not in visible:
+                # A focused row kept alive outside the window still has to follow its message
+                self.canvas.coords(row.item, 0, self.offsets[row.message.index])
+
+    def new_row(self):
+        return MessageRow(self)
+
+    def free_row(self, row):
+        row.release()
+        self.rows.remove(row)
+        self.free_rows.append(row)
+
+    def on_canvas_configure(self, event):
+        for row in self.rows:
+            self.canvas.itemconfigure(row.item, width=event.width)
+        self.canvas.itemconfigure(self.add_item, width=event.width)
+        self.on_scroll()
+
+    def on_scroll(self, *args):
+        if self.refresh_id is None:
+            self.refresh_id = self.canvas.after_idle(self.refresh)
+
+    # Scrolling
+
+    def scroll_to(self, index):
+        self.update_layout()
+        total = self.offsets[-1] + self.add_frame.winfo_reqheight()
+        if total > 0:
+            self.canvas.yview_moveto(self.offsets[index] / total)
+        self.refresh()
+
+    def scroll_to_end(self):
+        self.update_layout()
+        self.canvas.yview_moveto(1.0)
+        self.on_scroll()
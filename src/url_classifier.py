@@ -0,0 +1,101 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+class UrlClassifier:
+    """Looks up the content type of URLs in parallel, with a persistent TTL cache.
+
+    HEAD requests share one pooled requests.Session and run on a thread pool.
+    Results are kept in `cache_path` so a URL is only probed again once its
+    entry is older than `ttl_seconds`. Failed lookups are not cached.
+    """
+    def __init__(self, cache_path=os.path.join("temp", "url_cache.json"), ttl_seconds=7 * 24 * 3600, max_workers=8, timeout=5):
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.lock = Lock()
+        self.cache = None
+        self.session = None
+        self.probe_count = 0
+
+    def load_cache(self):
+        if self.cache is not None:
+            return
+        self.cache = {}
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "r", encoding='utf-8') as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: could not read URL cache '{self.cache_path}': {e}")
+
+    def save_cache(self):
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # Drop expired entries so the cache file doesn't grow forever
+        now = time.time()
+        self.cache = {url: entry for url, entry in self.cache.items() if now - entry[1] < self.ttl_seconds}
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "w", encoding='utf-8') as f:
+            json.dump(self.cache, f)
+        os.replace(temp_path, self.cache_path)
+
+    def get_session(self):
+        if self.session is None:
+            # requests is imported on first use, it is slow to load
+            import requests
+            from requests.adapters import HTTPAdapter
+            self.session = requests.Session()
+            self.session.headers.update({'User-Agent': 'Mozilla/5.0'})
+            adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        return self.session
+
+    def probe(self, url):
+        import requests
+        try:
+            response = self.get_session().head(url, timeout=self.timeout)
+            return response.headers.get('Content-Type', '')
+        except requests.RequestException:
+            return None
+
+    def content_types(self, urls):
+        """Return a dict of url -> content type (None if the lookup failed)."""
+        now = time.time()
+        results = {}
+        with self.lock:
+            self.load_cache()
+            for url in urls:
+                entry = self.cache.get(url)
+                if entry is not None and now - entry[1] < self.ttl_seconds:
+                    results[url] = entry[0]
+        missing = list(dict.fromkeys(url for url in urls if url not in results))
+        if not missing:
+            return results
+        if len(missing) == 1:
+            probed = [self.probe(missing[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                probed = list(executor.map(self.probe, missing))
+        with self.lock:
+            self.probe_count += len(missing)
+            for url, content_type in zip(missing, probed):
+                results[url] = content_type
+                if content_type is not None:
+                    self.cache[url] = [content_type, now]
+            self.save_cache()
+        return results
+
+    def image_urls(self, urls):
+        """Return the subset of `urls` that point at images."""
+        return {url for url, content_type in self.content_types(urls).items() if content_type and 'image' in content_type}
+
+# Shared by the whole application so every caller benefits from the same cache
+url_classifier = UrlClassifier()
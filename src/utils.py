@@ -1,48 +1,31 @@
-from constants import OPENAI_VISION_MODELS, ANTHROPIC_MODELS, GOOGLE_MODELS
+from constants import OPENAI_VISION_MODELS, ANTHROPIC_MODELS, GOOGLE_MODELS, ANTHROPIC_CACHE_MIN_CHARS, ANTHROPIC_PROMPT_CACHING_BETA
 import re
-import requests
-import tiktoken
+from functools import lru_cache
+from importlib.util import find_spec
+from types import SimpleNamespace
+from message_normalizer import AnthropicNormalizer, GoogleNormalizer
+from token_counter import token_counter
+from url_classifier import url_classifier
 
 def count_tokens(messages, model):
     """Return the number of tokens used by a list of messages."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: model not found for token counter. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if "gpt-3.5-turbo" in model:
-        tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        tokens_per_name = -1  # if there's a name, the role is omitted
-    else:
-        tokens_per_message = 3
-        tokens_per_name = 1
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
-    return num_tokens
+    return token_counter.count_messages(messages, model)
 
 def convert_text_to_tokens(text, model):
     """Converts some text to tokens using the appropriate encoding for the model."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: model not found for token counter. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    return encoding.encode(text)
+    return token_counter.encode(text, model)
 
 def convert_tokens_to_text(tokens, model):
     """Converts tokens to text using the appropriate decoding for the model."""
+    return token_counter.decode(tokens, model)
+
+@lru_cache(maxsize=None)
+def is_installed(module_name):
+    """Return True if `module_name` can be imported, without importing it."""
     try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: model not found for token counter. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    return encoding.decode(tokens)
+        return find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
 
 def is_url(str):
     url_pattern = r"https?://[^\s,\"\{\}]+"
@@ -51,21 +34,22 @@ def is_url(str):
 def is_image_url(url):
     if not is_url(url):
         return False
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.head(url, timeout=5, headers=headers)
-        content_type = response.headers.get('Content-Type', '')
-        return 'image' in content_type
-    except requests.RequestException as e:
-        return False
+    return url in url_classifier.image_urls([url])
+
+def find_urls(content):
+    url_pattern = r"(https?://[^\s,\"\{\}]+)"
+    return [part for part in re.split(url_pattern, content) if is_url(part)]
 
-def parse_and_create_image_messages(content, image_detail):
+def parse_and_create_image_messages(content, image_detail, image_urls=None):
     url_pattern = r"(https?://[^\s,\"\{\}]+)"
     parts = re.split(url_pattern, content)
+    if image_urls is None:
+        # Probe all of this message's URLs at once instead of one at a time
+        image_urls = url_classifier.image_urls([part for part in parts if is_url(part)])
 
     messages = []
     for text in parts:
-        if is_image_url(text):
+        if text in image_urls:
             messages.append({"type": "image_url", "image_url": {"url": text, "detail": image_detail}})
         elif messages and messages[-1].get("type") == "text":
             messages[-1]["text"] += text
@@ -73,53 +57,100 @@ def parse_and_create_image_messages(content, image_detail):
             messages.append({"type": "text", "text": text})
     return {"role": "user", "content": messages}
 
-def convert_messages_for_model(model, messages, image_detail="low"):
-    if model in OPENAI_VISION_MODELS:
-        # Update the messages to include image data if any image URLs are found in the user's input
-        new_messages = []
-        for message in messages:
-            if message["role"] == "user" and "content" in message:
-                # Check for image URLs and create a single message with a 'content' array
-                message_with_images = parse_and_create_image_messages(message["content"], image_detail)
-                new_messages.append(message_with_images)
-            else:
-                # System or assistant messages are added unchanged
-                new_messages.append(message)
-        return new_messages, None
-    elif model in ANTHROPIC_MODELS:
-        # Anthropic API has a bunch of extra requirements not present in OpenAI's API
-        anthropic_messages = []
-        system_content = ""
-        for message in messages:
-            if message["role"] == "system":
-                system_content += message["content"] + "\n"
-            elif message["content"]:
-                anthropic_messages.append({"role": message["role"], "content": message["content"]})
-        if len(anthropic_messages) == 0 or anthropic_messages[0]["role"] == "assistant":
-            anthropic_messages.insert(0, {"role": "user", "content": "<no message>"})
-        for i in range(len(anthropic_messages) - 1, 0, -1):
-            if anthropic_messages[i]["role"] == anthropic_messages[i - 1]["role"]:
-                anthropic_messages.insert(i, {"role": "user" if anthropic_messages[i]["role"] == "assistant" else "assistant", "content": "<no message>"})
-        if anthropic_messages[-1]["role"] == "assistant":
-            anthropic_messages.append({"role": "user", "content": "<no message>"})
-        return anthropic_messages, system_content
-    elif model in GOOGLE_MODELS:
-        # Google API also has a bunch of extra requirements not present in OpenAI's API
-        roles_mapping = {"user": "user", "assistant": "model", "system": "model"}
-        google_messages = []
-        for message in messages:
-            if not message["content"]:
-                continue
-            if message["role"] == "system":
-                google_messages.append({"role": "model", "parts": ["SYSTEM_PROMPT: " + message["content"]]})
-            else:
-                google_messages.append({"role": roles_mapping[message["role"]], "parts": [message["content"]]})
-        if len(google_messages) == 0 or google_messages[0]["role"] == "model":
-            google_messages.insert(0, {"role": "user", "parts": ["<no message>"]})
-        for i in range(len(google_messages) - 1, 0, -1):
-            if google_messages[i]["role"] == google_messages[i - 1]["role"]:
-                google_messages.insert(i, {"role": "user" if google_messages[i]["role"] == "model" else "model", "parts": ["<no message>"]})
-        if google_messages[-1]["role"] == "model":
-            google_messages.append({"role": "user", "parts": ["<no message>"]})
-        return google_messages, None
-    return messages, None
\ No newline at end of file
+def add_anthropic_cache_breakpoints(messages, system_content, max_breakpoints=4):
+    """Mark stable prefixes of an Anthropic request as cacheable with cache_control breakpoints.
+
+    Breakpoints go on the system message, on the oldest turn at which the
+    conversation becomes long enough to cache, on the last user turn of the
+    previous exchange (written to the cache by the previous request) and on
+    the last turn (read back by the next one). Prefixes shorter than
+    ANTHROPIC_CACHE_MIN_CHARS are left alone, the API wouldn't cache them.
+    Returns the messages and the system prompt, as a list of blocks if cached.
+    """
+    breakpoint = {"type": "ephemeral"}
+    system = system_content
+    if len(system_content) >= ANTHROPIC_CACHE_MIN_CHARS:
+        system = [{"type": "text", "text": system_content, "cache_control": breakpoint}]
+        max_breakpoints -= 1
+    prefix_chars = [0] * len(messages)
+    total = len(system_content)
+    for i, message in enumerate(messages):
+        total += len(message["content"])
+        prefix_chars[i] = total
+    oldest = next((i for i, chars in enumerate(prefix_chars) if chars >= ANTHROPIC_CACHE_MIN_CHARS), None)
+    if oldest is None:
+        return messages, system
+    last = len(messages) - 1
+    candidates = [oldest, last - 2, last]
+    indices = sorted({i for i in candidates if i >= oldest})[-max_breakpoints:] if max_breakpoints > 0 else []
+    messages = list(messages)
+    for i in indices:
+        messages[i] = {"role": messages[i]["role"], "content": [{"type": "text", "text": messages[i]["content"], "cache_control": breakpoint}]}
+    return messages, system
+
+def anthropic_extra_headers(messages, system):
+    """Headers needed to send a request built by convert_messages_for_model to Anthropic."""
+    cached = isinstance(system, list) or any(isinstance(message["content"], list) for message in messages)
+    return {"anthropic-beta": ANTHROPIC_PROMPT_CACHING_BETA} if cached else None
+
+def usage_to_dict(usage):
+    """Normalize the token usage reported by any provider.
+
+    Returns input_tokens (including cached ones), output_tokens,
+    cache_read_tokens and cache_write_tokens, or None if there is no usage.
+    """
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        # Older SDKs leave fields their models don't declare (like usage on stream chunks) as plain dicts
+        usage = SimpleNamespace(**usage)
+    def get(name):
+        return getattr(usage, name, None) or 0
+    if hasattr(usage, "prompt_tokens"):  # OpenAI
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", 0)) or 0
+        return {"input_tokens": get("prompt_tokens"), "output_tokens": get("completion_tokens"), "cache_read_tokens": cached, "cache_write_tokens": 0}
+    if hasattr(usage, "prompt_token_count"):  # Google
+        return {"input_tokens": get("prompt_token_count"), "output_tokens": get("candidates_token_count"),
+                "cache_read_tokens": get("cached_content_token_count"), "cache_write_tokens": 0}
+    # Anthropic counts cache reads and writes separately from input_tokens
+    cache_read = get("cache_read_input_tokens")
+    cache_write = get("cache_creation_input_tokens")
+    return {"input_tokens": get("input_tokens") + cache_read + cache_write, "output_tokens": get("output_tokens"),
+            "cache_read_tokens": cache_read, "cache_write_tokens": cache_write}
+
+def convert_messages_for_openai(messages, image_detail="low", vision=True):
+    if not vision:
+        return messages, None
+    # Update the messages to include image data if any image URLs are found in the user's input
+    image_urls = url_classifier.image_urls([url for message in messages if message["role"] == "user" and "content" in message
+                                            for url in find_urls(message["content"])])
+    new_messages = []
+    for message in messages:
+        if message["role"] == "user" and "content" in message:
+            # Check for image URLs and create a single message with a 'content' array
+            message_with_images = parse_and_create_image_messages(message["content"], image_detail, image_urls)
+            new_messages.append(message_with_images)
+        else:
+            # System or assistant messages are added unchanged
+            new_messages.append(message)
+    return new_messages, None
+
+def convert_messages_for_anthropic(messages, prompt_caching=True, normalizer=None):
+    # Anthropic API has a bunch of extra requirements not present in OpenAI's API, see message_normalizer.py
+    anthropic_messages, system_content = (normalizer or AnthropicNormalizer()).convert(messages)
+    if prompt_caching:
+        return add_anthropic_cache_breakpoints(anthropic_messages, system_content)
+    return anthropic_messages, system_content
+
+def convert_messages_for_google(messages, normalizer=None):
+    # Google API also has a bunch of extra requirements not present in OpenAI's API
+    return (normalizer or GoogleNormalizer()).convert(messages)
+
+def convert_messages_for_model(model, messages, image_detail="low", prompt_caching=True):
+    """Convert `messages` to the format of the built-in provider serving `model`. Returns (messages, system_message)."""
+    if model in ANTHROPIC_MODELS:
+        return convert_messages_for_anthropic(messages, prompt_caching)
+    if model in GOOGLE_MODELS:
+        return convert_messages_for_google(messages)
+    return convert_messages_for_openai(messages, image_detail, vision=model in OPENAI_VISION_MODELS)
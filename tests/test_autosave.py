@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+from autosave import Autosave, ACTIVE_SUFFIX, list_snapshots
+
+def chat(text):
+    return {"system_message": "", "chat_history": [{"role": "user", "content": text}], "model": "gpt-4o"}
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def test_snapshot_of_a_crashed_session_is_offered(tmp_path):
+    crashed = Autosave(None, None, backup_dir=str(tmp_path))
+    path = crashed.save(chat("Unsaved work"))
+    with open(crashed.marker_path(), "w") as f:
+        f.write(str(dead_pid()))
+
+    assert Autosave(None, None, backup_dir=str(tmp_path)).find_unclosed_session_snapshot() == path
+    assert not os.path.exists(crashed.marker_path())
+
+def test_running_session_is_left_alone(tmp_path):
+    running = Autosave(None, None, backup_dir=str(tmp_path))
+    running.save(chat("Still typing"))
+    with open(running.marker_path()) as f:
+        assert f.read() == str(os.getpid())
+
+    assert Autosave(None, None, backup_dir=str(tmp_path)).find_unclosed_session_snapshot() is None
+    assert os.path.exists(running.marker_path())
+
+def test_marker_without_a_pid_is_stale(tmp_path):
+    old = Autosave(None, None, backup_dir=str(tmp_path))
+    path = old.save(chat("From an older version"))
+    open(old.marker_path(), "w").close()
+    assert Autosave(None, None, backup_dir=str(tmp_path)).find_unclosed_session_snapshot() == path
+
+def test_deduplication_keeps_other_sessions_snapshots(tmp_path):
+    crashed = Autosave(None, None, backup_dir=str(tmp_path))
+    crashed_path = crashed.save(chat("Same text"))
+    current = Autosave(None, None, backup_dir=str(tmp_path))
+    current.save(chat("Same text"))
+    assert os.path.exists(crashed_path)
+    assert current.snapshots_written == 1 and current.snapshots_deduplicated == 0
+
+    # Back to content this session already saved: its own snapshot is renamed instead of written again
+    current.save(chat("Other text"))
+    current.save(chat("Same text"))
+    assert current.snapshots_written == 2 and current.snapshots_deduplicated == 1
+    assert os.path.exists(crashed_path)
+    assert len([name for name in list_snapshots(str(tmp_path)) if not name.endswith(ACTIVE_SUFFIX)]) == 3
@@ -0,0 +1,49 @@
+import json
+import pytest
+import batch
+from batch import CHARS_PER_TOKEN, estimate_tokens
+from mock_server import start_mock_server
+from token_counter import token_counter
+
+IMAGE_REQUEST = {
+    "id": "image", "model": "mock-model", "temperature": 0.7, "max_tokens": 50,
+    "messages": [
+        {"role": "system", "content": "Describe images."},
+        {"role": "user", "name": "alice", "content": [
+            {"type": "text", "text": "What is in this picture?"},
+            {"type": "image_url", "image_url": {"url": "https://example.com/cat.png", "detail": "low"}},
+        ]},
+    ],
+}
+
+def test_estimate_counts_text_parts_only(monkeypatch):
+    counted = []
+    def count_text(text, model):
+        counted.append(text)
+        return len(text.split())
+    monkeypatch.setattr(token_counter, "count_text", count_text)
+    # 3 + role + 2 words (system), 3 + role + 5 words (user, without the image or name), 3 for the reply priming, 50 max_tokens
+    assert estimate_tokens(IMAGE_REQUEST) == 68
+    assert "What is in this picture?" in counted
+    assert all(isinstance(text, str) for text in counted)
+
+def test_estimate_falls_back_to_characters(monkeypatch):
+    def fail(messages, model):
+        raise ConnectionError("no tokenizer data")
+    monkeypatch.setattr(token_counter, "count_messages", fail)
+    text_chars = len("Describe images.") + len("What is in this picture?")
+    assert estimate_tokens(IMAGE_REQUEST) == text_chars // CHARS_PER_TOKEN + 4 * 2 + 50
+
+def test_rate_limited_batch_sends_image_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(token_counter, "count_text", lambda text, model: len(text.split()))
+    server = start_mock_server(ttft=0.01, tokens_per_second=1000, reply_tokens=5)
+    input_path = tmp_path / "requests.jsonl"
+    output_path = tmp_path / "results.jsonl"
+    input_path.write_text(json.dumps(IMAGE_REQUEST) + "\n", encoding="utf-8")
+    try:
+        exit_code = batch.main([str(input_path), str(output_path), "--config", str(tmp_path / "missing.ini"), "--base-url", server.base_url,
+                                "--tpm", "100000", "--no-metrics", "--max-retries", "0"])
+    finally:
+        server.shutdown()
+    result = json.loads(output_path.read_text(encoding="utf-8"))
+    assert exit_code == 0 and result["status"] == "ok", result
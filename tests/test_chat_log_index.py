@@ -0,0 +1,32 @@
+import os
+from chat_log import AppendLog
+from chat_log_index import ChatLogIndex
+
+def test_appended_messages_are_searchable(tmp_path):
+    log_dir = tmp_path / "chat_logs"
+    log_dir.mkdir()
+    index = ChatLogIndex(str(log_dir), str(tmp_path / "index.sqlite"), count_tokens=False)
+    path = os.path.join(str(log_dir), "conversation.jsonl")
+    log = AppendLog.create(path, {"system_message": "", "chat_history": [{"role": "user", "content": "What is a quokka?"}], "model": "gpt-4o"})
+    index.update_file(path)
+    assert index.search("marsupial") == []
+
+    log.put(log.new_id(), "assistant", "A small marsupial from Western Australia.")
+    index.schedule_update(path, delay=0).join()
+    log.close()
+
+    results = index.search("marsupial")
+    assert [(result["name"], result["role"]) for result in results] == [("conversation.jsonl", "assistant")]
+    assert index.list_logs()[0]["message_count"] == 2
+    assert not index.pending_updates
+
+def test_scheduled_updates_are_batched(tmp_path):
+    index = ChatLogIndex(str(tmp_path), str(tmp_path / "index.sqlite"), count_tokens=False)
+    path = os.path.join(str(tmp_path), "conversation.jsonl")
+    AppendLog.create(path, {"chat_history": [{"role": "user", "content": "Hello"}]}).close()
+    timer = index.schedule_update(path, delay=60)
+    assert index.schedule_update(path, delay=60) is timer
+    # Closing the log re-indexes it right away
+    index.schedule_update(path, delay=0).join()
+    assert not timer.is_alive()
+    assert index.list_logs()[0]["title"] == "Hello"
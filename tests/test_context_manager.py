@@ -0,0 +1,11 @@
+from constants import MODEL_INFO, SUMMARY_MAX_TOKENS
+from context_manager import ContextManager
+from prompts import summary_prompt
+from token_counter import token_counter
+
+def test_summary_chunk_budget(monkeypatch):
+    prompt_tokens = 57
+    monkeypatch.setattr(token_counter, "count_text", lambda text, model: prompt_tokens if text == summary_prompt else 0)
+    manager = ContextManager(summarize=None)
+    model = "gpt-3.5-turbo"
+    assert manager.summary_chunk_budget(model) == MODEL_INFO[model]["max_tokens"] - SUMMARY_MAX_TOKENS - prompt_tokens
@@ -0,0 +1,20 @@
+import json
+from load_test import read_corpus
+
+def write_log(path, chat_history, system_message="Be brief."):
+    path.write_text(json.dumps({"system_message": system_message, "chat_history": chat_history, "model": "gpt-4o"}), encoding="utf-8")
+
+def test_chat_logs_with_image_messages_are_replayed(tmp_path):
+    write_log(tmp_path / "a_images.json", [
+        {"role": "user", "content": [{"type": "text", "text": "What is this?"}, {"type": "image_url", "image_url": {"url": "https://example.com/cat.png"}}]},
+        {"role": "assistant", "content": "A cat."},
+        {"role": "user", "content": [{"type": "image_url", "image_url": {"url": "https://example.com/dog.png"}}]},
+        {"role": "user", "content": "And now?"},
+    ])
+    write_log(tmp_path / "b_text.json", [{"role": "user", "content": "Hello"}])
+    (tmp_path / "c_broken.json").write_text("{", encoding="utf-8")
+
+    corpus = read_corpus(str(tmp_path))
+    assert [conversation[-1]["content"] for conversation in corpus] == ["What is this?", "And now?", "Hello"]
+    assert all(isinstance(message["content"], str) for conversation in corpus for message in conversation)
+    assert corpus[1][0] == {"role": "system", "content": "Be brief."}
@@ -0,0 +1,96 @@
+import random
+import pytest
+from message_normalizer import AnthropicNormalizer, GoogleNormalizer, NormalizerCache
+from utils import add_anthropic_cache_breakpoints
+
+def reference_anthropic_messages(messages):
+    """The Anthropic conversion as it was before message_normalizer.py, inserting fillers in the middle of the list."""
+    anthropic_messages = []
+    system_content = ""
+    for message in messages:
+        if message["role"] == "system":
+            system_content += message["content"] + "\n"
+        elif message["content"]:
+            anthropic_messages.append({"role": message["role"], "content": message["content"]})
+    if len(anthropic_messages) == 0 or anthropic_messages[0]["role"] == "assistant":
+        anthropic_messages.insert(0, {"role": "user", "content": "<no message>"})
+    for i in range(len(anthropic_messages) - 1, 0, -1):
+        if anthropic_messages[i]["role"] == anthropic_messages[i - 1]["role"]:
+            anthropic_messages.insert(i, {"role": "user" if anthropic_messages[i]["role"] == "assistant" else "assistant", "content": "<no message>"})
+    if anthropic_messages[-1]["role"] == "assistant":
+        anthropic_messages.append({"role": "user", "content": "<no message>"})
+    return anthropic_messages, system_content.strip()
+
+def reference_google_messages(messages):
+    """The Google conversion as it was before message_normalizer.py."""
+    roles_mapping = {"user": "user", "assistant": "model", "system": "model"}
+    google_messages = []
+    for message in messages:
+        if not message["content"]:
+            continue
+        if message["role"] == "system":
+            google_messages.append({"role": "model", "parts": ["SYSTEM_PROMPT: " + message["content"]]})
+        else:
+            google_messages.append({"role": roles_mapping[message["role"]], "parts": [message["content"]]})
+    if len(google_messages) == 0 or google_messages[0]["role"] == "model":
+        google_messages.insert(0, {"role": "user", "parts": ["<no message>"]})
+    for i in range(len(google_messages) - 1, 0, -1):
+        if google_messages[i]["role"] == google_messages[i - 1]["role"]:
+            google_messages.insert(i, {"role": "user" if google_messages[i]["role"] == "model" else "model", "parts": ["<no message>"]})
+    if google_messages[-1]["role"] == "model":
+        google_messages.append({"role": "user", "parts": ["<no message>"]})
+    return google_messages, None
+
+FORMATS = [("anthropic", reference_anthropic_messages, AnthropicNormalizer), ("google", reference_google_messages, GoogleNormalizer)]
+
+def random_history(rng, num_messages, long_runs=False):
+    """Random roles (in runs of the same role if `long_runs`) and contents, some empty."""
+    messages = []
+    while len(messages) < num_messages:
+        role = rng.choice(["user", "assistant", "assistant", "user", "system"])
+        for _ in range(rng.randint(1, 6) if long_runs else 1):
+            content = rng.choice(["", "hi", "a longer message", "x" * rng.randint(0, 3000)])
+            messages.append({"role": role, "content": content})
+    return messages[:num_messages]
+
+def random_cases(seed, count=100):
+    rng = random.Random(seed)
+    for _ in range(count):
+        messages = random_history(rng, rng.randint(0, 30), long_runs=rng.random() < 0.5)
+        yield rng, messages, rng.randint(0, len(messages))
+
+@pytest.mark.parametrize("name, reference, normalizer_class", FORMATS)
+@pytest.mark.parametrize("seed", range(20))
+def test_same_output_as_the_old_conversion(seed, name, reference, normalizer_class):
+    for rng, messages, cut in random_cases(seed):
+        expected = reference(messages)
+        assert normalizer_class().convert(messages) == expected, messages
+        # Extended from a conversion of a prefix
+        normalizer = normalizer_class()
+        assert normalizer.convert(messages[:cut]) == reference(messages[:cut]), messages[:cut]
+        assert normalizer.convert(messages) == expected, (cut, messages)
+        # An edited prefix starts over instead of extending stale turns
+        edited = [dict(message) for message in messages]
+        if edited:
+            edited[rng.randrange(len(edited))]["content"] += " edited"
+        assert normalizer.convert(edited) == reference(edited), edited
+        if name == "anthropic":
+            assert add_anthropic_cache_breakpoints(*normalizer.convert(messages)) == add_anthropic_cache_breakpoints(*expected)
+
+@pytest.mark.parametrize("name, reference, normalizer_class", FORMATS)
+def test_cache_keeps_interleaved_conversations_apart(name, reference, normalizer_class):
+    rng = random.Random(1)
+    conversations = [random_history(rng, 40, long_runs=True) for _ in range(3)]
+    cache = NormalizerCache(normalizer_class, size=2)
+    for length in range(0, 41, 5):
+        for messages in conversations:
+            assert cache.convert(messages[:length]) == reference(messages[:length])
+
+@pytest.mark.parametrize("name, reference, normalizer_class", FORMATS)
+def test_failed_conversion_starts_over(name, reference, normalizer_class):
+    normalizer = normalizer_class()
+    messages = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    normalizer.convert(messages)
+    with pytest.raises(KeyError):
+        normalizer.convert(messages + [{"role": "user"}])
+    assert normalizer.convert(messages) == reference(messages)
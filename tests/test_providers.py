@@ -0,0 +1,68 @@
+import asyncio
+from async_worker import AsyncWorker
+from mock_server import start_mock_server
+from providers import CustomServerAdapter, OpenAIAdapter
+
+def test_replaced_client_is_closed():
+    credentials = {"api_key": "first"}
+    adapter = OpenAIAdapter("openai", ["gpt-4o"], lambda: (credentials["api_key"], None, None))
+
+    async def rotate_key():
+        first = adapter.get_client()
+        assert adapter.get_client() is first
+        credentials["api_key"] = "second"
+        second = adapter.get_client()
+        assert second is not first
+        await asyncio.gather(*adapter.closing)
+        return first, second
+
+    first, second = asyncio.run(rotate_key())
+    assert first.is_closed()
+    assert not second.is_closed()
+    assert not adapter.closing
+
+def test_replaced_client_finishes_its_streams_first():
+    server = start_mock_server(ttft=0.01, tokens_per_second=200, reply_tokens=10)
+    credentials = {"api_key": "first"}
+    adapter = CustomServerAdapter("mock", ["mock-model"], lambda: (credentials["api_key"], server.base_url, None))
+    messages = [{"role": "user", "content": "Hello"}]
+
+    async def rotate_key_mid_reply():
+        first = adapter.get_client()
+        chunks = []
+        async for text in adapter.stream("mock-model", messages, None, 0.7, 100):
+            chunks.append(text)
+            if len(chunks) == 2:
+                credentials["api_key"] = "second"
+                assert adapter.get_client() is not first
+                assert not first.is_closed()
+        await asyncio.gather(*adapter.closing)
+        return first, chunks
+
+    try:
+        first, chunks = asyncio.run(rotate_key_mid_reply())
+    finally:
+        server.shutdown()
+    assert len(chunks) == 10
+    assert first.is_closed()
+    assert not adapter.active_streams and not adapter.retired
+
+def test_client_replaced_off_the_loop_is_closed_on_it():
+    server = start_mock_server(ttft=0.01, tokens_per_second=1000, reply_tokens=3)
+    credentials = {"api_key": "first"}
+    adapter = CustomServerAdapter("mock", ["mock-model"], lambda: (credentials["api_key"], server.base_url, None))
+    worker = AsyncWorker()
+
+    async def reply():
+        return [text async for text in adapter.stream("mock-model", [{"role": "user", "content": "Hello"}], None, 0.7, 100)]
+
+    try:
+        assert len(worker.submit(reply()).result(10)) == 3
+        first = adapter.get_client()
+        credentials["api_key"] = "second"
+        adapter.get_client()  # from this thread, where no event loop runs
+        worker.submit(asyncio.sleep(0.1)).result(10)
+        assert first.is_closed()
+    finally:
+        worker.shutdown()
+        server.shutdown()
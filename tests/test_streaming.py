@@ -0,0 +1,124 @@
+import asyncio
+from types import SimpleNamespace
+import httpx
+import pytest
+from mock_server import start_mock_server
+from streaming import STREAMERS
+
+TOKENS = 20
+
+@pytest.fixture(scope="module")
+def server():
+    server = start_mock_server(ttft=0.01, tokens_per_second=400, reply_tokens=TOKENS)
+    yield server
+    server.shutdown()
+
+def make_client(kind, server):
+    http_client = httpx.AsyncClient(timeout=httpx.Timeout(60, connect=5))
+    if kind == "anthropic":
+        import anthropic
+        return anthropic.AsyncAnthropic(api_key="mock", base_url=server.base_url[:-len("v1/")], max_retries=0, http_client=http_client)
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key="mock", base_url=server.base_url, max_retries=0, http_client=http_client)
+
+class FakeGenai:
+    """Stands in for the google.generativeai module: replies stream as chunks of parts, some of them empty."""
+    def __init__(self, tokens=TOKENS, delay=0.002):
+        self.tokens = tokens
+        self.delay = delay
+        self.closed = 0
+        genai = self
+
+        class GenerativeModel:
+            def __init__(self, model, generation_config=None):
+                pass
+
+            async def generate_content_async(self, messages, stream=False):
+                return FakeResponse(genai)
+
+        self.GenerativeModel = GenerativeModel
+
+class FakeResponse:
+    def __init__(self, genai):
+        self.genai = genai
+        self.usage_metadata = SimpleNamespace(prompt_token_count=5, candidates_token_count=genai.tokens, cached_content_token_count=0)
+
+    async def __aiter__(self):
+        try:
+            for i in range(self.genai.tokens):
+                await asyncio.sleep(self.genai.delay)
+                if i % 5 == 0:
+                    yield SimpleNamespace(parts=[])  # safety ratings or finish reason only
+                yield SimpleNamespace(parts=[SimpleNamespace(text=f"token{i} ")])
+            yield SimpleNamespace(parts=[SimpleNamespace(text="")])
+        finally:
+            self.genai.closed += 1
+
+def client_for(kind, server):
+    return FakeGenai() if kind == "google" else make_client(kind, server)
+
+async def consume(kind, client, tag, arrivals, max_tokens, usage=None):
+    messages = [{"role": "user", "content": f"stream {tag}"}]
+    async for text in STREAMERS[kind](client, "mock-model", messages, "", 0.7, max_tokens, usage):
+        assert text
+        arrivals.append(tag)
+
+@pytest.mark.parametrize("kind", ["openai", "anthropic", "google"])
+def test_concurrent_streams_interleave(kind, server):
+    async def run():
+        client = client_for(kind, server)
+        arrivals = []
+        await asyncio.gather(consume(kind, client, "a", arrivals, TOKENS), consume(kind, client, "b", arrivals, TOKENS))
+        return arrivals
+
+    arrivals = asyncio.run(run())
+    assert arrivals.count("a") == arrivals.count("b") == TOKENS
+    switches = sum(1 for previous, current in zip(arrivals, arrivals[1:]) if previous != current)
+    assert switches >= TOKENS // 2, "".join(arrivals)
+
+@pytest.mark.parametrize("kind", ["openai", "anthropic"])
+def test_cancelling_closes_the_connection(kind, server):
+    async def run():
+        client = make_client(kind, server)
+        arrivals = []
+        task = asyncio.ensure_future(consume(kind, client, "a", arrivals, 100000))
+        while len(arrivals) < 3:
+            await asyncio.sleep(0.005)
+        disconnects = server.stats.snapshot()["disconnects"]
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The server notices the closed socket the next time it writes a token
+        for _ in range(1000):
+            if server.stats.snapshot()["disconnects"] > disconnects:
+                return True
+            await asyncio.sleep(0.005)
+        return False
+
+    assert asyncio.run(run())
+
+def test_google_skips_chunks_without_parts():
+    async def run():
+        genai = FakeGenai(tokens=6, delay=0)
+        usage = {}
+        chunks = [text async for text in STREAMERS["google"](genai, "gemini-pro", [], None, 0.7, 100, usage)]
+        return chunks, usage, genai
+
+    chunks, usage, genai = asyncio.run(run())
+    assert chunks == [f"token{i} " for i in range(6)]
+    assert usage["input_tokens"] == 5 and usage["output_tokens"] == 6
+    assert genai.closed == 1
+
+def test_google_cancellation_stops_the_response():
+    async def run():
+        genai = FakeGenai(tokens=100000, delay=0.001)
+        arrivals = []
+        task = asyncio.ensure_future(consume("google", genai, "a", arrivals, 100000))
+        while len(arrivals) < 3:
+            await asyncio.sleep(0.005)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return genai
+
+    assert asyncio.run(run()).closed == 1
@@ -0,0 +1,61 @@
+from token_meter import TokenMeter
+
+class FakeRoot:
+    """Just enough of a Tk root for the meter's scheduling."""
+    def __init__(self):
+        self.scheduled = {}
+        self.next_id = 0
+
+    def after(self, ms, callback, *args):
+        self.next_id += 1
+        self.scheduled[self.next_id] = (callback, args)
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        del self.scheduled[after_id]
+
+class FakeVar:
+    def set(self, value):
+        self.value = value
+
+def test_shutdown_cancels_the_pending_refresh():
+    root = FakeRoot()
+    meter = TokenMeter(root, FakeVar(), lambda: "gpt-4o", lambda: "100")
+    meter.update("message", lambda: {"role": "user", "content": "Hello"})
+    assert root.scheduled
+    meter.shutdown()
+    assert meter.refresh_id is None
+    assert not root.scheduled
+    assert meter.executor._shutdown
+
+def test_late_count_of_a_deleted_message_is_dropped(monkeypatch):
+    from concurrent.futures import Future
+    from transcript import ChatMessage
+    root = FakeRoot()
+    meter = TokenMeter(root, FakeVar(), lambda: "gpt-4o", lambda: "100")
+    monkeypatch.setattr(meter, "render", lambda: None)
+    deleted = ChatMessage("user", "x" * meter.background_threshold_chars, 80)
+    deleted_key = deleted.key
+    meter.update(deleted_key, lambda: {"role": "user", "content": "x" * meter.background_threshold_chars})
+    pending = Future()
+    monkeypatch.setattr(meter.executor, "submit", lambda *args: pending)
+    meter.refresh()
+
+    # The message is deleted and a new one created while the large count is still running
+    meter.remove(deleted_key)
+    del deleted
+    added = ChatMessage("user", "short", 80)
+    meter.update(added.key, lambda: {"role": "user", "content": added.content})
+    pending.set_result({deleted_key: 5000})
+    meter.poll_pending(meter.generation)
+    assert added.key not in meter.message_tokens
+    assert not meter.message_tokens
+
+def test_message_keys_are_never_reused():
+    from transcript import ChatMessage
+    keys = set()
+    for _ in range(1000):
+        message = ChatMessage("user", "", 80)
+        assert message.key not in keys
+        keys.add(message.key)
+        del message
@@ -0,0 +1,76 @@
+import socket
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+import pytest
+from url_classifier import UrlClassifier
+
+DELAY = 0.2
+
+class ContentTypeHandler(BaseHTTPRequestHandler):
+    """Answers HEAD requests with an image or HTML content type after DELAY, counting them."""
+    lock = Lock()
+    requests = 0
+
+    def do_HEAD(self):
+        with self.lock:
+            ContentTypeHandler.requests += 1
+        time.sleep(DELAY)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png" if self.path.endswith(".png") else "text/html")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ContentTypeHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+@pytest.fixture
+def urls(base_url):
+    return [f"{base_url}/file{i}.{'png' if i % 2 else 'html'}" for i in range(8)]
+
+def unreachable_url():
+    # A port that was just free, so nothing listens on it
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/image.png"
+
+def test_cold_cache_probes_in_parallel(tmp_path, urls):
+    classifier = UrlClassifier(cache_path=str(tmp_path / "url_cache.json"))
+    start = time.perf_counter()
+    assert classifier.image_urls(urls) == {url for url in urls if url.endswith(".png")}
+    assert time.perf_counter() - start < len(urls) * DELAY / 2
+    assert classifier.probe_count == len(urls)
+
+def test_warm_cache_is_not_probed_again(tmp_path, urls):
+    classifier = UrlClassifier(cache_path=str(tmp_path / "url_cache.json"))
+    expected = classifier.image_urls(urls)
+    requests = ContentTypeHandler.requests
+    assert classifier.image_urls(urls) == expected
+    assert classifier.probe_count == len(urls)
+    # The results are persisted for the next start
+    reloaded = UrlClassifier(cache_path=classifier.cache_path)
+    assert reloaded.image_urls(urls) == expected
+    assert reloaded.probe_count == 0
+    assert ContentTypeHandler.requests == requests
+
+def test_expired_entries_are_probed_again(tmp_path, urls):
+    classifier = UrlClassifier(cache_path=str(tmp_path / "url_cache.json"), ttl_seconds=0.1)
+    classifier.image_urls(urls[:2])
+    time.sleep(0.2)
+    classifier.image_urls(urls[:2])
+    assert classifier.probe_count == 4
+
+def test_unreachable_hosts_are_not_images_and_not_cached(tmp_path, urls):
+    classifier = UrlClassifier(cache_path=str(tmp_path / "url_cache.json"), timeout=2)
+    url = unreachable_url()
+    assert classifier.content_types([url]) == {url: None}
+    assert classifier.image_urls([url, urls[1]]) == {urls[1]}
+    assert url not in classifier.cache
+    assert classifier.probe_count == 3
@@ -0,0 +1,18 @@
+from types import SimpleNamespace
+from utils import usage_to_dict
+
+def test_openai_usage_as_a_dict():
+    # openai 1.x releases that predate stream_options hand the usage of a stream chunk over as a plain dict
+    usage = {"prompt_tokens": 1200, "completion_tokens": 35, "total_tokens": 1235, "prompt_tokens_details": {"cached_tokens": 1024}}
+    assert usage_to_dict(usage) == {"input_tokens": 1200, "output_tokens": 35, "cache_read_tokens": 1024, "cache_write_tokens": 0}
+
+def test_openai_usage_as_an_object():
+    usage = SimpleNamespace(prompt_tokens=12, completion_tokens=3, prompt_tokens_details=None)
+    assert usage_to_dict(usage) == {"input_tokens": 12, "output_tokens": 3, "cache_read_tokens": 0, "cache_write_tokens": 0}
+
+def test_anthropic_usage_as_a_dict():
+    usage = {"input_tokens": 10, "output_tokens": 5, "cache_read_input_tokens": 2000, "cache_creation_input_tokens": 0}
+    assert usage_to_dict(usage) == {"input_tokens": 2010, "output_tokens": 5, "cache_read_tokens": 2000, "cache_write_tokens": 0}
+
+def test_no_usage():
+    assert usage_to_dict(None) is None